@@ -0,0 +1,134 @@
+"""
+CLIP Vision Policy Benchmark - End-to-end latency of the basic workflow for each CLIP vision residency policy
+
+For every VRAM budget and policy a ComfyUI server is started with IPADAPTER_CLIPVISION_DEVICE set to the
+policy and --reserve-vram set so that only the budget is usable, then the basic workflow is run several
+times. The IP-Adapter weight changes slightly between runs so that the image is encoded every time.
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+import torch
+
+from workflow_loader import WorkflowLoader
+from comfyui_client import ComfyUIClient
+
+POLICIES = ["gpu", "cpu", "auto"]
+BUDGETS_GB = [8, 12, 24]
+
+
+def start_server(comfyui_path: str, port: int, policy: str, reserve_gb: float) -> subprocess.Popen:
+    """
+    Start a ComfyUI server and wait until it answers
+    
+    Args:
+        comfyui_path: ComfyUI installation directory
+        port: Port to listen on
+        policy: CLIP vision policy (gpu, cpu or auto)
+        reserve_gb: VRAM kept free for other uses in GB
+        
+    Returns:
+        Server process
+    """
+    env = dict(os.environ, IPADAPTER_CLIPVISION_DEVICE=policy)
+    process = subprocess.Popen(
+        [sys.executable, "main.py", "--listen", "127.0.0.1", "--port", str(port), "--reserve-vram", f"{reserve_gb:.2f}"],
+        cwd=comfyui_path, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    
+    client = ComfyUIClient(f"127.0.0.1:{port}")
+    for _ in range(120):
+        if client.is_server_running():
+            return process
+        time.sleep(1)
+    
+    process.terminate()
+    raise Exception("ComfyUI server did not start")
+
+
+def run_workflow(client: ComfyUIClient, loader: WorkflowLoader, image_filename: str, runs: int) -> List[float]:
+    """
+    Run the basic workflow several times
+    
+    Args:
+        client: ComfyUI client
+        loader: Workflow loader
+        image_filename: Product image in the ComfyUI input directory
+        runs: Number of runs
+        
+    Returns:
+        Latency of each run in seconds
+    """
+    latencies = []
+    for i in range(runs):
+        workflow = loader.load_workflow("basic.json")
+        workflow = loader.update_image(workflow, image_filename)
+        workflow = loader.update_settings(workflow, ipadapter_weight=0.9 - i * 1e-4)
+        
+        start = time.time()
+        client.generate_image(loader.workflow_to_api_format(workflow), "")
+        latencies.append(time.time() - start)
+    
+    return latencies
+
+
+def benchmark(comfyui_path: str, image_path: str, runs: int = 5, port: int = 8190,
+              policies: List[str] = POLICIES, budgets: List[int] = BUDGETS_GB) -> Dict[tuple, List[float]]:
+    """
+    Benchmark every policy at every VRAM budget
+    
+    Args:
+        comfyui_path: ComfyUI installation directory
+        image_path: Product image used as IP-Adapter reference
+        runs: Number of runs per configuration, the first one includes the model loading
+        port: Port of the benchmark servers
+        policies: CLIP vision policies to compare
+        budgets: VRAM budgets in GB
+        
+    Returns:
+        Dictionary mapping (budget, policy) to the latencies of each run
+    """
+    total_gb = torch.cuda.get_device_properties(0).total_memory / 1024**3
+    image_filename = "benchmark_" + os.path.basename(image_path)
+    shutil.copyfile(image_path, os.path.join(comfyui_path, "input", image_filename))
+    loader = WorkflowLoader(workflows_dir="workflows")
+    
+    results = {}
+    for budget in budgets:
+        if budget > total_gb:
+            print(f"⚠️ Skipping {budget}GB, the GPU only has {total_gb:.1f}GB")
+            continue
+        
+        for policy in policies:
+            process = start_server(comfyui_path, port, policy, total_gb - budget)
+            try:
+                results[(budget, policy)] = run_workflow(ComfyUIClient(f"127.0.0.1:{port}"), loader, image_filename, runs)
+            finally:
+                process.terminate()
+                process.wait()
+    
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the CLIP vision residency policies on the basic workflow")
+    parser.add_argument("image", help="Product image used as IP-Adapter reference")
+    parser.add_argument("--comfyui-path", default=os.getenv("COMFYUI_PATH", "/app/ComfyUI"))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8190)
+    parser.add_argument("--policies", nargs="+", default=POLICIES, choices=POLICIES)
+    parser.add_argument("--budgets", nargs="+", type=int, default=BUDGETS_GB, help="VRAM budgets in GB")
+    args = parser.parse_args()
+    
+    results = benchmark(args.comfyui_path, args.image, args.runs, args.port, args.policies, args.budgets)
+    
+    print("\n| VRAM | Policy | First run (s) | Steady state (s) |")
+    print("|------|--------|---------------|------------------|")
+    for (budget, policy), latencies in results.items():
+        steady = latencies[1:] or latencies
+        print(f"| {budget}GB | {policy} | {latencies[0]:.2f} | {sum(steady) / len(steady):.2f} |")
@@ -0,0 +1,215 @@
+"""
+Encode Benchmark - Frames/s and memory per image of the IPAdapter CLIP vision encoder
+
+utils.encode_image_masked copies each chunk into outputs allocated once and, on CUDA, uploads the next chunk
+on a side stream while the current one is encoded. legacy_encode_image_masked is the loop it replaced, which
+grew the outputs with torch.cat and emptied the CUDA cache at the end.
+
+The memory per image is what one more image adds to the peak memory of a chunk, the figure auto_batch_size
+divides the free memory by (utils.ENCODE_MEMORY_PER_IMAGE). CUDA reports it from the caching allocator, on the
+CPU the live tensors of the encode are followed op by op. Without --clip-vision the encoder is a random weight
+CLIP vision model with the ViT-L, ViT-H or ViT-bigG configuration: the same work and activations as the real
+checkpoints. Needs ComfyUI at COMFYUI_PATH and transformers for the random weight models.
+"""
+import argparse
+import time
+import weakref
+from typing import Callable, List
+
+import torch
+from torch.utils._python_dispatch import TorchDispatchMode
+from torch.utils._pytree import tree_leaves
+
+from ipadapter_modules import load_ipadapter_module
+
+FRAME_COUNTS = [16, 64, 256]
+CLIP_VISION_CONFIGS = {
+    "vit-l": dict(hidden_size=1024, intermediate_size=4096, num_hidden_layers=24, num_attention_heads=16, projection_dim=768),
+    "vit-h": dict(hidden_size=1280, intermediate_size=5120, num_hidden_layers=32, num_attention_heads=16, projection_dim=1024),
+    "vit-g": dict(hidden_size=1664, intermediate_size=8192, num_hidden_layers=48, num_attention_heads=16, projection_dim=1280),
+}
+
+
+class PenultimateCLIPVision(torch.nn.Module):
+    """transformers CLIP vision model with the outputs of ComfyUI's: last and intermediate hidden states, image embeds"""
+
+    def __init__(self, config: str):
+        super().__init__()
+        from transformers import CLIPVisionConfig, CLIPVisionModelWithProjection
+        self.clip = CLIPVisionModelWithProjection(CLIPVisionConfig(image_size=224, patch_size=14, **CLIP_VISION_CONFIGS[config]))
+
+    def forward(self, pixel_values, intermediate_output=-2):
+        vision_model = self.clip.vision_model
+        # only the intermediate layer is kept, like ComfyUI's encoder, instead of every hidden state
+        intermediate = []
+        hook = vision_model.encoder.layers[intermediate_output].register_forward_hook(
+            lambda module, args, output: intermediate.append((output[0] if isinstance(output, tuple) else output).clone()))
+        try:
+            x = vision_model.encoder(vision_model.pre_layrnorm(vision_model.embeddings(pixel_values)))[0]
+        finally:
+            hook.remove()
+        return x, intermediate[0], self.clip.visual_projection(vision_model.post_layernorm(x[:, 0, :]))
+
+
+class StandInCLIPVision:
+    """The attributes of ComfyUI's ClipVisionModel used by encode_image_masked"""
+
+    def __init__(self, config: str, device: torch.device, dtype: torch.dtype):
+        from comfy.model_patcher import ModelPatcher
+        self.load_device = device
+        self.model = PenultimateCLIPVision(config).eval().to(device, dtype)
+        self.patcher = ModelPatcher(self.model, load_device=device, offload_device=torch.device("cpu"))
+
+
+def legacy_encode_image_masked(clip_vision, image, mask=None, batch_size=0):
+    """encode_image_masked before the outputs were preallocated, for reference"""
+    utils = load_ipadapter_module("utils")
+    utils.model_management.load_model_gpu(clip_vision.patcher)
+    outputs = utils.Output()
+
+    if batch_size == 0 or batch_size > image.shape[0]:
+        batch_size = image.shape[0]
+
+    for img in torch.split(image, batch_size, dim=0):
+        pixel_values = utils.clip_preprocess(img.to(clip_vision.load_device)).float()
+        if mask is not None:
+            pixel_values = pixel_values * mask.to(clip_vision.load_device)
+        out = clip_vision.model(pixel_values=pixel_values, intermediate_output=-2)
+        out = {"last_hidden_state": out[0], "image_embeds": out[2], "penultimate_hidden_states": out[1]}
+        for key, value in out.items():
+            value = value.to(utils.model_management.intermediate_device())
+            outputs[key] = torch.cat((outputs[key], value), dim=0) if hasattr(outputs, key) else value
+
+    del img, pixel_values, out
+    torch.cuda.empty_cache()
+    return outputs
+
+
+class LiveTensorMemory(TorchDispatchMode):
+    """Peak bytes of the CPU tensors created while active, checked after every op"""
+
+    def __init__(self):
+        super().__init__()
+        self.live = {}
+        self.current = 0
+        self.peak = 0
+
+    def free(self, key):
+        self.current -= self.live.pop(key)
+
+    def __torch_dispatch__(self, func, types, args=(), kwargs=None):
+        out = func(*args, **(kwargs or {}))
+        for tensor in tree_leaves(out):
+            if isinstance(tensor, torch.Tensor) and tensor.device.type == "cpu":
+                # torch keeps the storage object alive as long as any view of it, the finalizer runs when it is freed
+                storage = tensor.untyped_storage()
+                if id(storage) not in self.live:
+                    self.live[id(storage)] = storage.nbytes()
+                    self.current += storage.nbytes()
+                    weakref.finalize(storage, self.free, id(storage))
+        self.peak = max(self.peak, self.current)
+        return out
+
+
+def peak_memory(run: Callable[[], object], device: torch.device) -> int:
+    """
+    Peak memory allocated by run on device, the model weights and the inputs excluded
+
+    Args:
+        run: Function to measure
+        device: Device the encode runs on
+
+    Returns:
+        Bytes
+    """
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+        torch.cuda.reset_peak_memory_stats(device)
+        baseline = torch.cuda.memory_allocated(device)
+        run()
+        torch.cuda.synchronize(device)
+        return torch.cuda.max_memory_allocated(device) - baseline
+    with LiveTensorMemory() as memory:
+        run()
+    return memory.peak
+
+
+def measure(run: Callable[[], object], device: torch.device, iterations: int) -> float:
+    """
+    Average time of run in seconds, after one warm up call
+
+    Args:
+        run: Function to time
+        device: Device to synchronize
+        iterations: Number of timed calls
+
+    Returns:
+        Seconds per call
+    """
+    run()
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        run()
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+    return (time.perf_counter() - start) / iterations
+
+
+def benchmark(clip_vision, size: int, frame_counts: List[int], batch_size: int, iterations: int) -> None:
+    """
+    Print the frames/s of both encoders, then the memory per image of the streaming one
+
+    Args:
+        clip_vision: ComfyUI ClipVisionModel or StandInCLIPVision
+        size: Side of the square input frames
+        frame_counts: Number of frames to encode
+        batch_size: Chunk size of both encoders
+        iterations: Number of timed calls per configuration
+    """
+    utils = load_ipadapter_module("utils")
+    device, _ = utils.get_clip_vision_device(clip_vision)
+
+    with torch.inference_mode():
+        print(f"\n| Frames | Legacy (frames/s) | Streaming (frames/s) | Max difference |")
+        print("|--------|-------------------|----------------------|----------------|")
+        for frames in frame_counts:
+            image = torch.rand(frames, size, size, 3)
+            legacy = measure(lambda: legacy_encode_image_masked(clip_vision, image, batch_size=batch_size), device, iterations)
+            streaming = measure(lambda: utils.encode_image_masked(clip_vision, image, batch_size=batch_size), device, iterations)
+            expected = legacy_encode_image_masked(clip_vision, image, batch_size=batch_size)
+            out = utils.encode_image_masked(clip_vision, image, batch_size=batch_size)
+            difference = max((out[key] - expected[key]).abs().max().item() for key in ("last_hidden_state", "image_embeds", "penultimate_hidden_states"))
+            print(f"| {frames} | {frames / legacy:.2f} | {frames / streaming:.2f} | {difference:.2e} |")
+
+        # one chunk of 1 and one of batch_size frames, the difference is what every image adds
+        peaks = []
+        for frames in (1, batch_size):
+            image = torch.rand(frames, size, size, 3)
+            peaks.append(peak_memory(lambda: utils.encode_image_masked(clip_vision, image, batch_size=frames), device))
+    per_image = (peaks[1] - peaks[0]) / max(1, batch_size - 1)
+    print(f"\npeak memory of one image: {peaks[0] / 2**20:.1f} MiB, of {batch_size}: {peaks[1] / 2**20:.1f} MiB")
+    print(f"memory per image: {per_image / 2**20:.1f} MiB (ENCODE_MEMORY_PER_IMAGE {utils.ENCODE_MEMORY_PER_IMAGE / 2**20:.0f} MiB)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the streaming CLIP vision encoder with the torch.cat one")
+    parser.add_argument("--clip-vision", help="CLIP vision checkpoint, loaded with ComfyUI")
+    parser.add_argument("--config", default="vit-h", choices=list(CLIP_VISION_CONFIGS), help="random weight model without --clip-vision")
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--dtype", default="float16" if torch.cuda.is_available() else "float32", choices=["float32", "float16", "bfloat16"])
+    parser.add_argument("--size", type=int, default=224)
+    parser.add_argument("--frames", nargs="+", type=int, default=FRAME_COUNTS)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--iterations", type=int, default=1)
+    args = parser.parse_args()
+
+    # puts COMFYUI_PATH on sys.path for comfy
+    load_ipadapter_module("utils")
+    if args.clip_vision:
+        import comfy.clip_vision
+        clip_vision = comfy.clip_vision.load(args.clip_vision)
+    else:
+        clip_vision = StandInCLIPVision(args.config, torch.device(args.device), getattr(torch, args.dtype))
+    benchmark(clip_vision, args.size, args.frames, args.batch_size, args.iterations)
@@ -0,0 +1,94 @@
+"""
+Resampler Benchmark - Frames/s of the IPAdapter plus Resampler with SDPA and with the manual attention
+
+PerceiverAttention uses torch's scaled_dot_product_attention in float32 and the fp16-stable manual
+attention otherwise (image_proj_models.use_sdpa). Both are forced here to compare them on 1 to 256 frames,
+half precision is only measured on CUDA. test_ipadapter_image_proj_models.py checks that the outputs match.
+"""
+import argparse
+import time
+from typing import List
+
+import torch
+
+from ipadapter_modules import load_ipadapter_module
+
+FRAME_COUNTS = [1, 4, 16, 64, 256]
+# init_proj_plus of the SD1.5 and SDXL plus models
+RESAMPLER_CONFIGS = {
+    "sd15": dict(dim=768, depth=4, dim_head=64, heads=12, num_queries=16, embedding_dim=1280, output_dim=768, ff_mult=4),
+    "sdxl": dict(dim=1280, depth=4, dim_head=64, heads=20, num_queries=16, embedding_dim=1280, output_dim=2048, ff_mult=4),
+}
+
+
+def measure(model: torch.nn.Module, x: torch.Tensor, iterations: int) -> float:
+    """
+    Average time of a Resampler forward in seconds, after one warm up call
+
+    Args:
+        model: Resampler
+        x: CLIP Vision penultimate hidden states [frames, 257, 1280]
+        iterations: Number of timed calls
+
+    Returns:
+        Seconds per call
+    """
+    with torch.inference_mode():
+        model(x)
+        if x.device.type == "cuda":
+            torch.cuda.synchronize(x.device)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            model(x)
+        if x.device.type == "cuda":
+            torch.cuda.synchronize(x.device)
+    return (time.perf_counter() - start) / iterations
+
+
+def benchmark(config: str, frame_counts: List[int], iterations: int) -> None:
+    """
+    Print the frames/s of the manual attention and of SDPA for every available device and dtype
+
+    Args:
+        config: Key of RESAMPLER_CONFIGS
+        frame_counts: Batch sizes to measure
+        iterations: Number of timed calls per configuration
+    """
+    image_proj_models = load_ipadapter_module("image_proj_models")
+    use_sdpa = image_proj_models.use_sdpa
+    setups = [(torch.device("cpu"), torch.float32)]
+    if torch.cuda.is_available():
+        setups += [(torch.device("cuda"), torch.float32), (torch.device("cuda"), torch.float16)]
+
+    torch.manual_seed(0)
+    model = image_proj_models.Resampler(**RESAMPLER_CONFIGS[config]).eval()
+
+    print(f"\n| Device | Dtype | Frames | Manual (frames/s) | SDPA (frames/s) | Speedup | Max difference |")
+    print("|--------|-------|--------|-------------------|-----------------|---------|----------------|")
+    try:
+        for device, dtype in setups:
+            model.to(device, dtype)
+            for frames in frame_counts:
+                x = torch.randn(frames, 257, 1280, device=device, dtype=dtype)
+                image_proj_models.use_sdpa = lambda _: False
+                manual = measure(model, x, iterations)
+                with torch.inference_mode():
+                    expected = model(x)
+                image_proj_models.use_sdpa = lambda _: True
+                sdpa = measure(model, x, iterations)
+                with torch.inference_mode():
+                    difference = (model(x) - expected).abs().max().item()
+                dtype_name = str(dtype).replace("torch.", "")
+                print(f"| {device.type} | {dtype_name} | {frames} | {frames / manual:.1f} | {frames / sdpa:.1f} | {manual / sdpa:.2f}x | {difference:.2e} |")
+    finally:
+        image_proj_models.use_sdpa = use_sdpa
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare SDPA with the manual attention in the IPAdapter plus Resampler")
+    parser.add_argument("--config", default="sdxl", choices=list(RESAMPLER_CONFIGS))
+    parser.add_argument("--frames", nargs="+", type=int, default=FRAME_COUNTS)
+    parser.add_argument("--iterations", type=int, default=3)
+    args = parser.parse_args()
+
+    benchmark(args.config, args.frames, args.iterations)
@@ -0,0 +1,96 @@
+"""
+Resize Benchmark - Images/s of the IPAdapter resize_image against the PIL loop it replaced
+
+PrepImageForClipVision and IPAdapterTiled used to convert every image to PIL, resize it and convert it back.
+utils.resize_image applies the same filters to the whole batch with two matmuls on the torch device.
+Needs ComfyUI at COMFYUI_PATH for the IPAdapter utils; test_ipadapter_utils.py checks the pixel error.
+"""
+import argparse
+import time
+from typing import Callable, List
+
+import torch
+from PIL import Image
+
+try:
+    import torchvision.transforms.v2 as T
+except ImportError:
+    import torchvision.transforms as T
+
+from ipadapter_modules import load_ipadapter_module
+
+BATCH_SIZES = [1, 4, 16, 64, 256]
+
+
+def pil_resize(image: torch.Tensor, size: tuple, interpolation: str) -> torch.Tensor:
+    """The PIL path before resize_image, [B, C, H, W] in [0, 1]"""
+    imgs = []
+    for img in image:
+        img = T.ToPILImage()(img)
+        img = img.resize(size, resample=Image.Resampling[interpolation])
+        imgs.append(T.ToTensor()(img))
+    return torch.stack(imgs)
+
+
+def measure(run: Callable[[], torch.Tensor], device: torch.device, iterations: int) -> float:
+    """
+    Average time of run in seconds, after one warm up call
+
+    Args:
+        run: Function to time
+        device: Device to synchronize
+        iterations: Number of timed calls
+
+    Returns:
+        Seconds per call
+    """
+    run()
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        run()
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+    return (time.perf_counter() - start) / iterations
+
+
+def benchmark(input_size: int, size: int, interpolation: str, batch_sizes: List[int], iterations: int) -> None:
+    """
+    Print the images/s of the PIL loop and of resize_image on every available device
+
+    Args:
+        input_size: Side of the square input images
+        size: Side of the resized images
+        interpolation: PIL filter name
+        batch_sizes: Batch sizes to measure
+        iterations: Number of timed calls per configuration
+    """
+    utils = load_ipadapter_module("utils")
+    devices = [torch.device("cpu")] + ([torch.device("cuda")] if torch.cuda.is_available() else [])
+
+    print(f"\n| Batch | PIL (img/s) | " + " | ".join(f"torch {device.type} (img/s)" for device in devices) + " | Max error (/255) |")
+    print("|-------|-------------|" + "|".join("-" * 20 for _ in devices) + "|------------------|")
+    for batch_size in batch_sizes:
+        image = torch.rand(batch_size, 3, input_size, input_size)
+        row = [f"{batch_size / measure(lambda: pil_resize(image, (size, size), interpolation), torch.device('cpu'), iterations):.1f}"]
+        for device in devices:
+            device_image = image.to(device)
+            seconds = measure(lambda: utils.resize_image(device_image, (size, size), interpolation), device, iterations)
+            row.append(f"{batch_size / seconds:.1f}")
+        # the PIL path truncates the input to 8 bit, resize_image gets the same pixels for the comparison
+        quantized = image.mul(255).byte().float() / 255
+        error = (utils.resize_image(quantized, (size, size), interpolation) - pil_resize(image, (size, size), interpolation)).abs().max().item() * 255
+        print(f"| {batch_size} | " + " | ".join(row) + f" | {error:.2f} |")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the batched torch resize with the PIL loop")
+    parser.add_argument("--input-size", type=int, default=512)
+    parser.add_argument("--size", type=int, default=224)
+    parser.add_argument("--interpolation", default="LANCZOS", choices=["LANCZOS", "BICUBIC", "HAMMING", "BILINEAR", "BOX", "NEAREST"])
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=BATCH_SIZES)
+    parser.add_argument("--iterations", type=int, default=3)
+    args = parser.parse_args()
+
+    benchmark(args.input_size, args.size, args.interpolation, args.batch_sizes, args.iterations)
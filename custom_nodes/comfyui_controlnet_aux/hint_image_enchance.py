@@ -1,9 +1,11 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 from .log import log
-from .utils import ResizeMode, safe_numpy
+from .utils import ResizeMode
 import numpy as np
 import torch
 import cv2
-from .utils import get_unique_axis0
 from .lvminthin import nake_nms, lvmin_thin
 
 MAX_IMAGEGEN_RESOLUTION = 8192 #https://github.com/comfyanonymous/ComfyUI/blob/c910b4a01ca58b04e5d4ab4c747680b996ada02b/nodes.py#L42
@@ -68,52 +70,45 @@ class HintImageEnchance:
 
     CATEGORY = "ControlNet Preprocessors"
     def execute(self, hint_image, image_gen_width, image_gen_height, resize_mode):
-        outs = []
-        for single_hint_image in hint_image:
-            np_hint_image = np.asarray(single_hint_image * 255., dtype=np.uint8)
-
-            if resize_mode == ResizeMode.RESIZE.value:
-                np_hint_image = self.execute_resize(np_hint_image, image_gen_width, image_gen_height)
-            elif resize_mode == ResizeMode.OUTER_FIT.value:
-                np_hint_image = self.execute_outer_fit(np_hint_image, image_gen_width, image_gen_height)
-            else:
-                np_hint_image = self.execute_inner_fit(np_hint_image, image_gen_width, image_gen_height)
-            
-            outs.append(torch.from_numpy(np_hint_image.astype(np.float32) / 255.0))
-        
-        return (torch.stack(outs, dim=0),)
-    
-    def execute_resize(self, detected_map, w, h):
-        detected_map = self.high_quality_resize(detected_map, (w, h))
-        detected_map = safe_numpy(detected_map)
-        return detected_map
-    
-    def execute_outer_fit(self, detected_map, w, h):
-        old_h, old_w, _ = detected_map.shape
+        np_hint_images = np.asarray(hint_image * 255., dtype=np.uint8)
+
+        if resize_mode == ResizeMode.RESIZE.value:
+            np_hint_images = self.execute_resize(np_hint_images, image_gen_width, image_gen_height)
+        elif resize_mode == ResizeMode.OUTER_FIT.value:
+            np_hint_images = self.execute_outer_fit(np_hint_images, image_gen_width, image_gen_height)
+        else:
+            np_hint_images = self.execute_inner_fit(np_hint_images, image_gen_width, image_gen_height)
+
+        return (torch.from_numpy(np_hint_images.astype(np.float32) / 255.0),)
+
+    # All execute_* methods take and return a [B, H, W, C] uint8 batch
+    def execute_resize(self, detected_maps, w, h):
+        return self.high_quality_resize_batch(detected_maps, (w, h))
+
+    def execute_outer_fit(self, detected_maps, w, h):
+        _, old_h, old_w, _ = detected_maps.shape
         old_w = float(old_w)
         old_h = float(old_h)
         k0 = float(h) / old_h
         k1 = float(w) / old_w
         safeint = lambda x: int(np.round(x))
         k = min(k0, k1)
-        
-        borders = np.concatenate([detected_map[0, :, :], detected_map[-1, :, :], detected_map[:, 0, :], detected_map[:, -1, :]], axis=0)
-        high_quality_border_color = np.median(borders, axis=0).astype(detected_map.dtype)
-        if len(high_quality_border_color) == 4:
+
+        borders = np.concatenate([detected_maps[:, 0, :, :], detected_maps[:, -1, :, :], detected_maps[:, :, 0, :], detected_maps[:, :, -1, :]], axis=1)
+        high_quality_border_colors = np.median(borders, axis=1).astype(detected_maps.dtype)
+        if high_quality_border_colors.shape[1] == 4:
             # Inpaint hijack
-            high_quality_border_color[3] = 255
-        high_quality_background = np.tile(high_quality_border_color[None, None], [h, w, 1])
-        detected_map = self.high_quality_resize(detected_map, (safeint(old_w * k), safeint(old_h * k)))
-        new_h, new_w, _ = detected_map.shape
+            high_quality_border_colors[:, 3] = 255
+        high_quality_backgrounds = np.tile(high_quality_border_colors[:, None, None], [1, h, w, 1])
+        detected_maps = self.high_quality_resize_batch(detected_maps, (safeint(old_w * k), safeint(old_h * k)))
+        _, new_h, new_w, _ = detected_maps.shape
         pad_h = max(0, (h - new_h) // 2)
         pad_w = max(0, (w - new_w) // 2)
-        high_quality_background[pad_h:pad_h + new_h, pad_w:pad_w + new_w] = detected_map
-        detected_map = high_quality_background
-        detected_map = safe_numpy(detected_map)
-        return detected_map
-    
-    def execute_inner_fit(self, detected_map, w, h):
-        old_h, old_w, _ = detected_map.shape
+        high_quality_backgrounds[:, pad_h:pad_h + new_h, pad_w:pad_w + new_w] = detected_maps
+        return high_quality_backgrounds
+
+    def execute_inner_fit(self, detected_maps, w, h):
+        _, old_h, old_w, _ = detected_maps.shape
         old_w = float(old_w)
         old_h = float(old_h)
         k0 = float(h) / old_h
@@ -121,70 +116,97 @@ class HintImageEnchance:
         safeint = lambda x: int(np.round(x))
         k = max(k0, k1)
 
-        detected_map = self.high_quality_resize(detected_map, (safeint(old_w * k), safeint(old_h * k)))
-        new_h, new_w, _ = detected_map.shape
+        detected_maps = self.high_quality_resize_batch(detected_maps, (safeint(old_w * k), safeint(old_h * k)))
+        _, new_h, new_w, _ = detected_maps.shape
         pad_h = max(0, (new_h - h) // 2)
         pad_w = max(0, (new_w - w) // 2)
-        detected_map = detected_map[pad_h:pad_h+h, pad_w:pad_w+w]
-        detected_map = safe_numpy(detected_map)
-        return detected_map
+        return np.ascontiguousarray(detected_maps[:, pad_h:pad_h+h, pad_w:pad_w+w])
 
     def high_quality_resize(self, x, size):
+        return self.high_quality_resize_batch(x[None], size)[0]
+
+    def high_quality_resize_batch(self, x, size):
         # Written by lvmin
         # Super high-quality control map up-scaling, considering binary, seg, and one-pixel edges
-
-        inpaint_mask = None
-        if x.ndim == 3 and x.shape[2] == 4:
-            inpaint_mask = x[:, :, 3]
-            x = x[:, :, 0:3]
-
-        if x.shape[0] != size[1] or x.shape[1] != size[0]:
-            new_size_is_smaller = (size[0] * size[1]) < (x.shape[0] * x.shape[1])
-            new_size_is_bigger = (size[0] * size[1]) > (x.shape[0] * x.shape[1])
-            unique_color_count = len(get_unique_axis0(x.reshape(-1, x.shape[2])))
-            is_one_pixel_edge = False
-            is_binary = False
-            if unique_color_count == 2:
-                is_binary = np.min(x) < 16 and np.max(x) > 240
+        # Batched: the classification and the cv2 work of each frame run in a thread pool (cv2 and numpy release the GIL)
+
+        inpaint_masks = None
+        if x.shape[3] == 4:
+            inpaint_masks = x[..., 3]
+            x = x[..., 0:3]
+
+        if x.shape[1] != size[1] or x.shape[2] != size[0]:
+            new_size_is_smaller = (size[0] * size[1]) < (x.shape[1] * x.shape[2])
+            new_size_is_bigger = (size[0] * size[1]) > (x.shape[1] * x.shape[2])
+            # a frame can only be binary if it has both a near black and a near white pixel
+            maybe_binary = (x.min(axis=(1, 2, 3)) < 16) & (x.max(axis=(1, 2, 3)) > 240)
+
+            def resize_frame(i):
+                unique_color_count = count_unique_colors(x[i])
+                is_one_pixel_edge = False
+                is_binary = unique_color_count == 2 and maybe_binary[i]
                 if is_binary:
-                    xc = x
+                    xc = x[i]
                     xc = cv2.erode(xc, np.ones(shape=(3, 3), dtype=np.uint8), iterations=1)
                     xc = cv2.dilate(xc, np.ones(shape=(3, 3), dtype=np.uint8), iterations=1)
-                    one_pixel_edge_count = np.where(xc < x)[0].shape[0]
-                    all_edge_count = np.where(x > 127)[0].shape[0]
+                    one_pixel_edge_count = np.count_nonzero(xc < x[i])
+                    all_edge_count = np.count_nonzero(x[i] > 127)
                     is_one_pixel_edge = one_pixel_edge_count * 2 > all_edge_count
 
-            if 2 < unique_color_count < 200:
-                interpolation = cv2.INTER_NEAREST
-            elif new_size_is_smaller:
-                interpolation = cv2.INTER_AREA
-            else:
-                interpolation = cv2.INTER_CUBIC  # Must be CUBIC because we now use nms. NEVER CHANGE THIS
-
-            y = cv2.resize(x, size, interpolation=interpolation)
-            if inpaint_mask is not None:
-                inpaint_mask = cv2.resize(inpaint_mask, size, interpolation=interpolation)
-
-            if is_binary:
-                y = np.mean(y.astype(np.float32), axis=2).clip(0, 255).astype(np.uint8)
-                if is_one_pixel_edge:
-                    y = nake_nms(y)
-                    _, y = cv2.threshold(y, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-                    y = lvmin_thin(y, prunings=new_size_is_bigger)
+                if 2 < unique_color_count < 200:
+                    interpolation = cv2.INTER_NEAREST
+                elif new_size_is_smaller:
+                    interpolation = cv2.INTER_AREA
                 else:
-                    _, y = cv2.threshold(y, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-                y = np.stack([y] * 3, axis=2)
+                    interpolation = cv2.INTER_CUBIC  # Must be CUBIC because we now use nms. NEVER CHANGE THIS
+
+                y = cv2.resize(x[i], size, interpolation=interpolation)
+                mask = None
+                if inpaint_masks is not None:
+                    mask = cv2.resize(inpaint_masks[i], size, interpolation=interpolation)
+
+                if is_binary:
+                    y = np.mean(y.astype(np.float32), axis=2).clip(0, 255).astype(np.uint8)
+                    if is_one_pixel_edge:
+                        y = nake_nms(y)
+                        _, y = cv2.threshold(y, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+                        y = lvmin_thin(y, prunings=new_size_is_bigger)
+                    else:
+                        _, y = cv2.threshold(y, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+                    y = np.stack([y] * 3, axis=2)
+                return y, mask
+
+            results = map_frames(resize_frame, len(x))
+            y = np.stack([frame for frame, _ in results])
+            if inpaint_masks is not None:
+                inpaint_masks = np.stack([mask for _, mask in results])
         else:
             y = x
 
-        if inpaint_mask is not None:
-            inpaint_mask = (inpaint_mask > 127).astype(np.float32) * 255.0
-            inpaint_mask = inpaint_mask[:, :, None].clip(0, 255).astype(np.uint8)
-            y = np.concatenate([y, inpaint_mask], axis=2)
+        if inpaint_masks is not None:
+            inpaint_masks = np.where(inpaint_masks > 127, np.uint8(255), np.uint8(0))
+            y = np.concatenate([y, inpaint_masks[..., None]], axis=3)
 
         return y
 
 
+def count_unique_colors(x):
+    """Number of distinct colours of a [H, W, C <= 3] uint8 image, marked in a 2^(8C) presence table instead of sorted"""
+    codes = x[..., 0].astype(np.uint32)
+    for c in range(1, x.shape[2]):
+        codes = (codes << 8) | x[..., c]
+    # calloc'd, untouched pages are never really written
+    seen = np.zeros(1 << (8 * x.shape[2]), dtype=np.bool_)
+    seen[codes.reshape(-1)] = True
+    return int(np.count_nonzero(seen))
+
+def map_frames(fn, count):
+    if count == 1:
+        return [fn(0)]
+    with ThreadPoolExecutor(max_workers=min(count, os.cpu_count() or 1)) as pool:
+        return list(pool.map(fn, range(count)))
+
+
 class ImageGenResolutionFromLatent:
     @classmethod
     def INPUT_TYPES(s):
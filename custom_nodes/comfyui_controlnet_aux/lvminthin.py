@@ -5,8 +5,11 @@
 # If you use this, please Cite "High Quality Edge Thinning using Pure Python", Lvmin Zhang, In Mikubill/sd-webui-controlnet.
 
 
+from collections import deque
+
 import cv2
 import numpy as np
+import torch
 
 
 lvmin_kernels_raw = [
@@ -65,7 +68,7 @@ def thin_one_time(x, kernels):
     return y, is_done
 
 
-def lvmin_thin(x, prunings=True):
+def lvmin_thin_hitmiss(x, prunings=True):
     y = x
     for i in range(32):
         y, is_done = thin_one_time(y, lvmin_kernels)
@@ -76,6 +79,103 @@ def lvmin_thin(x, prunings=True):
     return y
 
 
+# LUT engine. Every pixel of the 3x3 neighbourhood is 0 (<= 127), 1 (> 127) or 2 (outside the image),
+# packed in base 3 (row-major, top-left is the lowest digit). MORPH_HITMISS thresholded at 127 is exactly
+# "every 1 of the kernel is > 127 and every -1 is <= 127", and its constant 255 border satisfies both,
+# so a table over the 3^9 codes gives the same matches as cv2 for any uint8 image.
+LVMIN_POWERS = 3 ** np.arange(9)
+
+def make_hitmiss_lut(kernel):
+    digits = (np.arange(3 ** 9)[:, None] // LVMIN_POWERS) % 3
+    kernel = kernel.reshape(-1)
+    hit = np.all((digits != 0) | (kernel != 1), axis=1)
+    miss = np.all((digits != 1) | (kernel != -1), axis=1)
+    return hit & miss
+
+lvmin_kernel_luts = [make_hitmiss_lut(k) for k in lvmin_kernels]
+lvmin_pruning_luts = [make_hitmiss_lut(k) for k in lvmin_prunings]
+
+
+def remove_pattern_lut(states, candidates, lut, offsets):
+    # codes of all candidates are read before any is removed, like one MORPH_HITMISS pass
+    code = np.zeros(candidates.shape, dtype=np.int16)
+    for offset in offsets[::-1]:
+        code = code * 3 + states[candidates + offset]
+    removed = candidates[lut[code]]
+    states[removed] = 0
+    return removed
+
+
+def lvmin_thin(x, prunings=True):
+    """
+    Same result as lvmin_thin_hitmiss (and, like it, x is modified in place), but each pass only looks at the
+    foreground pixels whose neighbourhood changed since the same kernel last ran, through lookup tables.
+    """
+    H, W = x.shape
+    states = np.full((H + 2, W + 2), 2, dtype=np.uint8)
+    states[1:-1, 1:-1] = x > 127
+    states = states.reshape(-1)
+    offsets = ((np.arange(3)[:, None] - 1) * (W + 2) + np.arange(3)[None, :] - 1).reshape(-1)
+
+    # removals of the last len(kernels) passes, i.e. since the current kernel last ran
+    history = deque(maxlen=len(lvmin_kernel_luts))
+    dirty = np.zeros_like(states, dtype=bool)
+    removed_all = []
+    for i in range(32):
+        is_done = True
+        for lut in lvmin_kernel_luts:
+            if len(history) == history.maxlen:
+                # a mask instead of np.unique, sorting the neighbours costs more than the pass itself
+                dirty[:] = False
+                changed = np.concatenate(history)
+                for offset in offsets:
+                    dirty[changed + offset] = True
+                dirty &= states == 1
+                candidates = np.flatnonzero(dirty)
+            else:
+                candidates = np.flatnonzero(states == 1)
+            removed = remove_pattern_lut(states, candidates, lut, offsets)
+            history.append(removed)
+            removed_all.append(removed)
+            if removed.shape[0] > 0:
+                is_done = False
+        if is_done:
+            break
+    if prunings:
+        for lut in lvmin_pruning_luts:
+            removed_all.append(remove_pattern_lut(states, np.flatnonzero(states == 1), lut, offsets))
+
+    removed_all = np.concatenate(removed_all)
+    x[removed_all // (W + 2) - 1, removed_all % (W + 2) - 1] = 0
+    return x
+
+
+def lvmin_thin_torch(x, prunings=True):
+    """Batched lvmin_thin for a [B, H, W] uint8 tensor on any device, with the same lookup tables. Returns a new tensor."""
+    B, H, W = x.shape
+    foreground = x > 127
+    powers = torch.from_numpy(LVMIN_POWERS).to(device=x.device, dtype=torch.int16)
+    kernel_luts = [torch.from_numpy(lut).to(x.device) for lut in lvmin_kernel_luts]
+    pruning_luts = [torch.from_numpy(lut).to(x.device) for lut in lvmin_pruning_luts]
+
+    def remove_pattern(foreground, lut):
+        states = torch.nn.functional.pad(foreground.to(torch.int16), (1, 1, 1, 1), value=2)
+        code = sum(states[:, dy:dy + H, dx:dx + W] * powers[dy * 3 + dx] for dy in range(3) for dx in range(3))
+        return foreground & ~lut[code.long()]
+
+    for i in range(32):
+        previous = foreground
+        for lut in kernel_luts:
+            foreground = remove_pattern(foreground, lut)
+        # a converged image never changes again, so the batch can go on until all have converged
+        if torch.equal(foreground, previous):
+            break
+    if prunings:
+        for lut in pruning_luts:
+            foreground = remove_pattern(foreground, lut)
+    return torch.where(foreground | (x <= 127), x, torch.zeros_like(x))
+
+
 def nake_nms(x):
     f1 = np.array([[0, 0, 0], [1, 1, 1], [0, 0, 0]], dtype=np.uint8)
     f2 = np.array([[0, 1, 0], [0, 1, 0], [0, 1, 0]], dtype=np.uint8)
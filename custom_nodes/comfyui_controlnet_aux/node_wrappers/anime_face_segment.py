@@ -1,5 +1,4 @@
-from ..utils import common_annotator_call, define_preprocessor_inputs, INPUT
-import comfy.model_management as model_management
+from ..utils import common_annotator_call, define_preprocessor_inputs, INPUT, load_detector
 import torch
 from einops import rearrange
 
@@ -22,7 +21,7 @@ class AnimeFace_SemSegPreprocessor:
     def execute(self, image, remove_background_using_abg=True, resolution=512, **kwargs):
         from custom_controlnet_aux.anime_face_segment import AnimeFaceSegmentor
 
-        model = AnimeFaceSegmentor.from_pretrained().to(model_management.get_torch_device())
+        model = load_detector(AnimeFaceSegmentor)
         if remove_background_using_abg:
             out_image_with_mask = common_annotator_call(model, image, resolution=resolution, remove_background=True)
             out_image = out_image_with_mask[..., :3]
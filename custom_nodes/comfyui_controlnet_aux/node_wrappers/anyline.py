@@ -4,7 +4,7 @@ import comfy.model_management as model_management
 import comfy.utils
 
 # Requires comfyui_controlnet_aux funcsions and classes
-from ..utils import common_annotator_call, INPUT, define_preprocessor_inputs
+from ..utils import common_annotator_call, INPUT, define_preprocessor_inputs, load_detector
 
 def get_intensity_mask(image_array, lower_bound, upper_bound):
     mask = image_array[:, :, 0]
@@ -45,7 +45,7 @@ class AnyLinePreprocessor:
         pbar = comfy.utils.ProgressBar(3)
 
         # Process the image with MTEED model
-        mteed_model = TEDDetector.from_pretrained("TheMistoAI/MistoLine", "MTEED.pth", subfolder="Anyline").to(self.device)
+        mteed_model = load_detector(TEDDetector, "TheMistoAI/MistoLine", "MTEED.pth", subfolder="Anyline", device=self.device)
         mteed_result = common_annotator_call(mteed_model, image, resolution=resolution, show_pbar=False)
         mteed_result = mteed_result.numpy()
         del mteed_model
@@ -62,7 +62,7 @@ class AnyLinePreprocessor:
             from custom_controlnet_aux.lineart_anime import LineartAnimeDetector
             from custom_controlnet_aux.manga_line import LineartMangaDetector
             lineart_detector = dict(lineart_realisitic=LineartDetector, lineart_anime=LineartAnimeDetector, manga_line=LineartMangaDetector)[merge_with_lineart]
-            lineart_detector = lineart_detector.from_pretrained().to(self.device)
+            lineart_detector = load_detector(lineart_detector, device=self.device)
             lineart_result = common_annotator_call(lineart_detector, image, resolution=resolution, show_pbar=False).numpy()
             del lineart_detector
         pbar.update(1)
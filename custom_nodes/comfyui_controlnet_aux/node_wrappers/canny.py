@@ -7,7 +7,8 @@ class Canny_Edge_Preprocessor:
         return define_preprocessor_inputs(
             low_threshold=INPUT.INT(default=100, max=255),
             high_threshold=INPUT.INT(default=200, max=255),
-            resolution=INPUT.RESOLUTION()
+            resolution=INPUT.RESOLUTION(),
+            backend=INPUT.COMBO(["OpenCV", "torch"])
         )
 
     RETURN_TYPES = ("IMAGE",)
@@ -15,10 +16,12 @@ class Canny_Edge_Preprocessor:
 
     CATEGORY = "ControlNet Preprocessors/Line Extractors"
 
-    def execute(self, image, low_threshold=100, high_threshold=200, resolution=512, **kwargs):
-        from custom_controlnet_aux.canny import CannyDetector
+    def execute(self, image, low_threshold=100, high_threshold=200, resolution=512, backend="OpenCV", **kwargs):
+        from custom_controlnet_aux.canny import CannyDetector, TorchCannyDetector
 
-        return (common_annotator_call(CannyDetector(), image, low_threshold=low_threshold, high_threshold=high_threshold, resolution=resolution), )
+        # the torch backend runs the whole batch on the GPU, same edges as OpenCV on the same resized image
+        model = TorchCannyDetector(model_management.get_torch_device()) if backend == "torch" else CannyDetector()
+        return (common_annotator_call(model, image, low_threshold=low_threshold, high_threshold=high_threshold, resolution=resolution), )
 
 
 
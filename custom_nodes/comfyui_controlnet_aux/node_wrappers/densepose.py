@@ -1,5 +1,4 @@
-from ..utils import common_annotator_call, INPUT, define_preprocessor_inputs
-import comfy.model_management as model_management
+from ..utils import common_annotator_call, INPUT, define_preprocessor_inputs, load_detector
 
 class DensePose_Preprocessor:
     @classmethod
@@ -17,9 +16,7 @@ class DensePose_Preprocessor:
 
     def execute(self, image, model="densepose_r50_fpn_dl.torchscript", cmap="Viridis (MagicAnimate)", resolution=512):
         from custom_controlnet_aux.densepose import DenseposeDetector
-        model = DenseposeDetector \
-                    .from_pretrained(filename=model) \
-                    .to(model_management.get_torch_device())
+        model = load_detector(DenseposeDetector, filename=model)
         return (common_annotator_call(model, image, cmap="viridis" if "Viridis" in cmap else "parula", resolution=resolution), )
 
 
@@ -1,5 +1,4 @@
-from ..utils import common_annotator_call, define_preprocessor_inputs, INPUT
-import comfy.model_management as model_management
+from ..utils import common_annotator_call, define_preprocessor_inputs, INPUT, load_detector
 
 class Depth_Anything_Preprocessor:
     @classmethod
@@ -19,7 +18,7 @@ class Depth_Anything_Preprocessor:
     def execute(self, image, ckpt_name="depth_anything_vitl14.pth", resolution=512, **kwargs):
         from custom_controlnet_aux.depth_anything import DepthAnythingDetector
 
-        model = DepthAnythingDetector.from_pretrained(filename=ckpt_name).to(model_management.get_torch_device())
+        model = load_detector(DepthAnythingDetector, filename=ckpt_name)
         out = common_annotator_call(model, image, resolution=resolution)
         del model
         return (out, )
@@ -40,7 +39,7 @@ class Zoe_Depth_Anything_Preprocessor:
     def execute(self, image, environment="indoor", resolution=512, **kwargs):
         from custom_controlnet_aux.zoe import ZoeDepthAnythingDetector
         ckpt_name = "depth_anything_metric_depth_indoor.pt" if environment == "indoor" else "depth_anything_metric_depth_outdoor.pt"
-        model = ZoeDepthAnythingDetector.from_pretrained(filename=ckpt_name).to(model_management.get_torch_device())
+        model = load_detector(ZoeDepthAnythingDetector, filename=ckpt_name)
         out = common_annotator_call(model, image, resolution=resolution)
         del model
         return (out, )
@@ -1,5 +1,4 @@
-from ..utils import common_annotator_call, INPUT, define_preprocessor_inputs
-import comfy.model_management as model_management
+from ..utils import common_annotator_call, INPUT, define_preprocessor_inputs, load_detector
 
 class Depth_Anything_V2_Preprocessor:
     @classmethod
@@ -20,7 +19,7 @@ class Depth_Anything_V2_Preprocessor:
     def execute(self, image, ckpt_name="depth_anything_v2_vitl.pth", resolution=512, **kwargs):
         from custom_controlnet_aux.depth_anything_v2 import DepthAnythingV2Detector
 
-        model = DepthAnythingV2Detector.from_pretrained(filename=ckpt_name).to(model_management.get_torch_device())
+        model = load_detector(DepthAnythingV2Detector, filename=ckpt_name)
         out = common_annotator_call(model, image, resolution=resolution, max_depth=1)
         del model
         return (out, )
@@ -41,7 +40,7 @@ class Depth_Anything_V2_Preprocessor:
     def execute(self, image, environment, resolution=512, max_depth=20.0, **kwargs):
         from custom_controlnet_aux.depth_anything_v2 import DepthAnythingV2Detector
         filename = dict(indoor="depth_anything_v2_metric_hypersim_vitl.pth", outdoor="depth_anything_v2_metric_vkitti_vitl.pth")[environment]
-        model = DepthAnythingV2Detector.from_pretrained(filename=filename).to(model_management.get_torch_device())
+        model = load_detector(DepthAnythingV2Detector, filename=filename)
         out = common_annotator_call(model, image, resolution=resolution, max_depth=max_depth)
         del model
         return (out, ) """
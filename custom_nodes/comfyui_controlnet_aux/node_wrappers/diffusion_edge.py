@@ -1,5 +1,4 @@
-from ..utils import common_annotator_call, define_preprocessor_inputs, INPUT, run_script
-import comfy.model_management as model_management
+from ..utils import common_annotator_call, define_preprocessor_inputs, INPUT, run_script, load_detector
 import sys
 
 def install_deps():
@@ -26,9 +25,7 @@ class DiffusionEdge_Preprocessor:
         install_deps()
         from custom_controlnet_aux.diffusion_edge import DiffusionEdgeDetector
 
-        model = DiffusionEdgeDetector \
-            .from_pretrained(filename = f"diffusion_edge_{environment}.pt") \
-            .to(model_management.get_torch_device())
+        model = load_detector(DiffusionEdgeDetector, filename = f"diffusion_edge_{environment}.pt")
         out = common_annotator_call(model, image, resolution=resolution, patch_batch_size=patch_batch_size)
         del model
         return (out, )
@@ -1,12 +1,16 @@
-from ..utils import common_annotator_call, define_preprocessor_inputs, INPUT
+from ..utils import common_annotator_call, define_preprocessor_inputs, INPUT, load_detector
 import comfy.model_management as model_management
+import comfy.utils
 import numpy as np
+import torch
 import warnings
 from ..src.custom_controlnet_aux.dwpose import DwposeDetector, AnimalposeDetector
 import os
 import json
 
 DWPOSE_MODEL_NAME = "yzd-v/DWPose"
+#Frames per batched detector/pose run of a multi-frame input, bounds the memory of the stacked inputs and person crops
+DWPOSE_FRAMES_PER_BATCH = 16
 #Trigger startup caching for onnxruntime
 GPU_PROVIDERS = ["CUDAExecutionProvider", "DirectMLExecutionProvider", "OpenVINOExecutionProvider", "ROCMExecutionProvider", "CoreMLExecutionProvider"]
 def check_ort_gpu():
@@ -43,7 +47,9 @@ class DWPose_Preprocessor:
                 ["dw-ll_ucoco_384_bs5.torchscript.pt", "dw-ll_ucoco_384.onnx", "dw-ll_ucoco.onnx"],
                 default="dw-ll_ucoco_384_bs5.torchscript.pt"
             ),
-            scale_stick_for_xinsr_cn=INPUT.COMBO(["disable", "enable"])
+            scale_stick_for_xinsr_cn=INPUT.COMBO(["disable", "enable"]),
+            #Longer side of the image YOLOX and DWPose see, 0 = full input size
+            pose_detect_resolution=INPUT.INT(default=0, step=64)
         )
 
     RETURN_TYPES = ("IMAGE", "POSE_KEYPOINT")
@@ -51,7 +57,7 @@ class DWPose_Preprocessor:
 
     CATEGORY = "ControlNet Preprocessors/Faces and Poses Estimators"
 
-    def estimate_pose(self, image, detect_hand="enable", detect_body="enable", detect_face="enable", resolution=512, bbox_detector="yolox_l.onnx", pose_estimator="dw-ll_ucoco_384.onnx", scale_stick_for_xinsr_cn="disable", **kwargs):
+    def estimate_pose(self, image, detect_hand="enable", detect_body="enable", detect_face="enable", resolution=512, bbox_detector="yolox_l.onnx", pose_estimator="dw-ll_ucoco_384.onnx", scale_stick_for_xinsr_cn="disable", pose_detect_resolution=0, **kwargs):
         if bbox_detector == "None":
             yolo_repo = DWPOSE_MODEL_NAME 
         elif bbox_detector == "yolox_l.onnx":
@@ -72,7 +78,8 @@ class DWPose_Preprocessor:
         else:
             raise NotImplementedError(f"Download mechanism for {pose_estimator}")
 
-        model = DwposeDetector.from_pretrained(
+        model = load_detector(
+            DwposeDetector,
             pose_repo,
             yolo_repo,
             det_filename=(None if bbox_detector == "None" else bbox_detector), pose_filename=pose_estimator,
@@ -88,13 +95,33 @@ class DWPose_Preprocessor:
             self.openpose_dicts.append(openpose_dict)
             return pose_img
 
-        out = common_annotator_call(func, image, include_hand=detect_hand, include_face=detect_face, include_body=detect_body, image_and_json=True, resolution=resolution, xinsr_stick_scaling=scale_stick_for_xinsr_cn)
+        if image.shape[0] > 1:
+            out = self.estimate_pose_batch(model, image, include_hand=detect_hand, include_face=detect_face, include_body=detect_body, resolution=resolution, xinsr_stick_scaling=scale_stick_for_xinsr_cn, pose_detect_resolution=pose_detect_resolution)
+        else:
+            out = common_annotator_call(func, image, include_hand=detect_hand, include_face=detect_face, include_body=detect_body, image_and_json=True, resolution=resolution, xinsr_stick_scaling=scale_stick_for_xinsr_cn, pose_detect_resolution=pose_detect_resolution)
         del model
         return {
             'ui': { "openpose_json": [json.dumps(self.openpose_dicts, indent=4)] },
             "result": (out, self.openpose_dicts)
         }
 
+    def estimate_pose_batch(self, model, image, resolution=512, **kwargs):
+        #Video input: detector and pose model run batched over chunks of frames, drawing runs in a thread pool (DwposeDetector.call_batch)
+        detect_resolution = resolution if type(resolution) == int and resolution >= 64 else 512
+        batch_size = image.shape[0]
+        pbar = comfy.utils.ProgressBar(batch_size)
+        out_tensor = None
+        for start in range(0, batch_size, DWPOSE_FRAMES_PER_BATCH):
+            np_images = [np.asarray(frame.cpu() * 255., dtype=np.uint8) for frame in image[start:start + DWPOSE_FRAMES_PER_BATCH]]
+            for i, (pose_img, openpose_dict) in enumerate(model.call_batch(np_images, detect_resolution=detect_resolution, **kwargs), start):
+                out = torch.from_numpy(pose_img.astype(np.float32) / 255.0)
+                if out_tensor is None:
+                    out_tensor = torch.zeros(batch_size, *out.shape, dtype=torch.float32)
+                out_tensor[i] = out
+                self.openpose_dicts.append(openpose_dict)
+            pbar.update(len(np_images))
+        return out_tensor
+
 class AnimalPose_Preprocessor:
     @classmethod
     def INPUT_TYPES(s):
@@ -136,7 +163,8 @@ class AnimalPose_Preprocessor:
         else:
             raise NotImplementedError(f"Download mechanism for {pose_estimator}")
 
-        model = AnimalposeDetector.from_pretrained(
+        model = load_detector(
+            AnimalposeDetector,
             pose_repo,
             yolo_repo,
             det_filename=(None if bbox_detector == "None" else bbox_detector), pose_filename=pose_estimator,
@@ -1,5 +1,4 @@
-from ..utils import common_annotator_call, define_preprocessor_inputs, INPUT
-import comfy.model_management as model_management
+from ..utils import common_annotator_call, define_preprocessor_inputs, INPUT, load_detector
 
 class HED_Preprocessor:
     @classmethod
@@ -17,7 +16,7 @@ class HED_Preprocessor:
     def execute(self, image, resolution=512, **kwargs):
         from custom_controlnet_aux.hed import HEDdetector
 
-        model = HEDdetector.from_pretrained().to(model_management.get_torch_device())
+        model = load_detector(HEDdetector)
         out = common_annotator_call(model, image, resolution=resolution, safe = kwargs["safe"] == "enable")
         del model
         return (out, )
@@ -38,7 +37,7 @@ class Fake_Scribble_Preprocessor:
     def execute(self, image, resolution=512, **kwargs):
         from custom_controlnet_aux.hed import HEDdetector
         
-        model = HEDdetector.from_pretrained().to(model_management.get_torch_device())
+        model = load_detector(HEDdetector)
         out = common_annotator_call(model, image, resolution=resolution, scribble=True, safe=kwargs["safe"]=="enable")
         del model
         return (out, )
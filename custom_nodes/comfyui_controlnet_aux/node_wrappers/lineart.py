@@ -1,5 +1,4 @@
-from ..utils import common_annotator_call, define_preprocessor_inputs, INPUT
-import comfy.model_management as model_management
+from ..utils import common_annotator_call, define_preprocessor_inputs, INPUT, load_detector
 
 class LineArt_Preprocessor:
     @classmethod
@@ -17,7 +16,7 @@ class LineArt_Preprocessor:
     def execute(self, image, resolution=512, **kwargs):
         from custom_controlnet_aux.lineart import LineartDetector
 
-        model = LineartDetector.from_pretrained().to(model_management.get_torch_device())
+        model = load_detector(LineartDetector)
         out = common_annotator_call(model, image, resolution=resolution, coarse = kwargs["coarse"] == "enable")
         del model
         return (out, )
@@ -1,5 +1,4 @@
-from ..utils import common_annotator_call, define_preprocessor_inputs, INPUT, MAX_RESOLUTION, run_script
-import comfy.model_management as model_management
+from ..utils import common_annotator_call, define_preprocessor_inputs, INPUT, MAX_RESOLUTION, run_script, load_detector
 import numpy as np
 import torch
 from einops import rearrange
@@ -63,7 +62,7 @@ class Mesh_Graphormer_Depth_Map_Preprocessor:
         install_deps()
         from custom_controlnet_aux.mesh_graphormer import MeshGraphormerDetector
         model = kwargs["model"] if "model" in kwargs \
-            else MeshGraphormerDetector.from_pretrained(detect_thr=detect_thr, presence_thr=presence_thr).to(model_management.get_torch_device())
+            else load_detector(MeshGraphormerDetector, detect_thr=detect_thr, presence_thr=presence_thr)
         
         depth_map_list = []
         mask_list = []
@@ -122,7 +121,7 @@ class Mesh_Graphormer_With_ImpactDetector_Depth_Map_Preprocessor:
         install_deps()
         from custom_controlnet_aux.mesh_graphormer import MeshGraphormerDetector
         mesh_graphormer_node = Mesh_Graphormer_Depth_Map_Preprocessor()
-        model = MeshGraphormerDetector.from_pretrained(detect_thr=0.6, presence_thr=0.6).to(model_management.get_torch_device())
+        model = load_detector(MeshGraphormerDetector, detect_thr=0.6, presence_thr=0.6)
         mesh_graphormer_kwargs["model"] = model
 
         frames = image
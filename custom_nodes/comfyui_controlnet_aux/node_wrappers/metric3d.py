@@ -3,8 +3,7 @@ import os
 os.environ['NPU_DEVICE_COUNT'] = '0'
 os.environ['MMCV_WITH_OPS'] = '0'
 
-from ..utils import common_annotator_call, define_preprocessor_inputs, INPUT, MAX_RESOLUTION
-import comfy.model_management as model_management
+from ..utils import common_annotator_call, define_preprocessor_inputs, INPUT, MAX_RESOLUTION, load_detector
 
 class Metric3D_Depth_Map_Preprocessor:
     @classmethod
@@ -23,7 +22,7 @@ class Metric3D_Depth_Map_Preprocessor:
 
     def execute(self, image, backbone="vit-small", fx=1000, fy=1000, resolution=512):
         from custom_controlnet_aux.metric3d import Metric3DDetector
-        model = Metric3DDetector.from_pretrained(filename=f"metric_depth_{backbone.replace('-', '_')}_800k.pth").to(model_management.get_torch_device())
+        model = load_detector(Metric3DDetector, filename=f"metric_depth_{backbone.replace('-', '_')}_800k.pth")
         cb = lambda image, **kwargs: model(image, **kwargs)[0]
         out = common_annotator_call(cb, image, resolution=resolution, fx=fx, fy=fy, depth_and_normal=True)
         del model
@@ -46,7 +45,7 @@ class Metric3D_Normal_Map_Preprocessor:
 
     def execute(self, image, backbone="vit-small", fx=1000, fy=1000, resolution=512):
         from custom_controlnet_aux.metric3d import Metric3DDetector
-        model = Metric3DDetector.from_pretrained(filename=f"metric_depth_{backbone.replace('-', '_')}_800k.pth").to(model_management.get_torch_device())
+        model = load_detector(Metric3DDetector, filename=f"metric_depth_{backbone.replace('-', '_')}_800k.pth")
         cb = lambda image, **kwargs: model(image, **kwargs)[1]
         out = common_annotator_call(cb, image, resolution=resolution, fx=fx, fy=fy, depth_and_normal=True)
         del model
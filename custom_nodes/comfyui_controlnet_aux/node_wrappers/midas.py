@@ -1,5 +1,4 @@
-from ..utils import common_annotator_call, define_preprocessor_inputs, INPUT
-import comfy.model_management as model_management
+from ..utils import common_annotator_call, define_preprocessor_inputs, INPUT, load_detector
 import numpy as np
 
 class MIDAS_Normal_Map_Preprocessor:
@@ -19,7 +18,7 @@ class MIDAS_Normal_Map_Preprocessor:
     def execute(self, image, a=np.pi * 2.0, bg_threshold=0.1, resolution=512, **kwargs):
         from custom_controlnet_aux.midas import MidasDetector
 
-        model = MidasDetector.from_pretrained().to(model_management.get_torch_device())
+        model = load_detector(MidasDetector)
         #Dirty hack :))
         cb = lambda image, **kargs: model(image, **kargs)[1]
         out = common_annotator_call(cb, image, resolution=resolution, a=a, bg_th=bg_threshold, depth_and_normal=True)
@@ -44,7 +43,7 @@ class MIDAS_Depth_Map_Preprocessor:
         from custom_controlnet_aux.midas import MidasDetector
 
         # Ref: https://github.com/lllyasviel/ControlNet/blob/main/gradio_depth2image.py
-        model = MidasDetector.from_pretrained().to(model_management.get_torch_device())
+        model = load_detector(MidasDetector)
         out = common_annotator_call(model, image, resolution=resolution, a=a, bg_th=bg_threshold)
         del model
         return (out, )
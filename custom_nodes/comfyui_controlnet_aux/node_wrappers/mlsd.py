@@ -1,5 +1,4 @@
-from ..utils import common_annotator_call, define_preprocessor_inputs, INPUT
-import comfy.model_management as model_management
+from ..utils import common_annotator_call, define_preprocessor_inputs, INPUT, load_detector
 import numpy as np
 
 class MLSD_Preprocessor:
@@ -19,7 +18,7 @@ class MLSD_Preprocessor:
     def execute(self, image, score_threshold, dist_threshold, resolution=512, **kwargs):
         from custom_controlnet_aux.mlsd import MLSDdetector
 
-        model = MLSDdetector.from_pretrained().to(model_management.get_torch_device())
+        model = load_detector(MLSDdetector)
         out = common_annotator_call(model, image, resolution=resolution, thr_v=score_threshold, thr_d=dist_threshold)
         return (out, )
 
@@ -1,5 +1,4 @@
-from ..utils import common_annotator_call, define_preprocessor_inputs, INPUT
-import comfy.model_management as model_management
+from ..utils import common_annotator_call, define_preprocessor_inputs, INPUT, load_detector
 
 class BAE_Normal_Map_Preprocessor:
     @classmethod
@@ -14,7 +13,7 @@ class BAE_Normal_Map_Preprocessor:
     def execute(self, image, resolution=512, **kwargs):
         from custom_controlnet_aux.normalbae import NormalBaeDetector
 
-        model = NormalBaeDetector.from_pretrained().to(model_management.get_torch_device())
+        model = load_detector(NormalBaeDetector)
         out = common_annotator_call(model, image, resolution=resolution)
         del model
         return (out,)
@@ -1,5 +1,4 @@
-from ..utils import common_annotator_call, define_preprocessor_inputs, INPUT
-import comfy.model_management as model_management
+from ..utils import common_annotator_call, define_preprocessor_inputs, INPUT, load_detector
 
 class OneFormer_COCO_SemSegPreprocessor:
     @classmethod
@@ -14,8 +13,7 @@ class OneFormer_COCO_SemSegPreprocessor:
     def semantic_segmentate(self, image, resolution=512):
         from custom_controlnet_aux.oneformer import OneformerSegmentor
 
-        model = OneformerSegmentor.from_pretrained(filename="150_16_swin_l_oneformer_coco_100ep.pth")
-        model = model.to(model_management.get_torch_device())
+        model = load_detector(OneformerSegmentor, filename="150_16_swin_l_oneformer_coco_100ep.pth")
         out = common_annotator_call(model, image, resolution=resolution)
         del model
         return (out,)
@@ -33,8 +31,7 @@ class OneFormer_ADE20K_SemSegPreprocessor:
     def semantic_segmentate(self, image, resolution=512):
         from custom_controlnet_aux.oneformer import OneformerSegmentor
 
-        model = OneformerSegmentor.from_pretrained(filename="250_16_swin_l_oneformer_ade20k_160k.pth")
-        model = model.to(model_management.get_torch_device())
+        model = load_detector(OneformerSegmentor, filename="250_16_swin_l_oneformer_ade20k_160k.pth")
         out = common_annotator_call(model, image, resolution=resolution)
         del model
         return (out,)
@@ -1,5 +1,4 @@
-from ..utils import common_annotator_call, define_preprocessor_inputs, INPUT
-import comfy.model_management as model_management
+from ..utils import common_annotator_call, define_preprocessor_inputs, INPUT, load_detector
 import json
 
 class OpenPose_Preprocessor:
@@ -26,7 +25,7 @@ class OpenPose_Preprocessor:
         detect_face = detect_face == "enable"
         scale_stick_for_xinsr_cn = scale_stick_for_xinsr_cn == "enable"
 
-        model = OpenposeDetector.from_pretrained().to(model_management.get_torch_device())        
+        model = load_detector(OpenposeDetector)        
         self.openpose_dicts = []
         def func(image, **kwargs):
             pose_img, openpose_dict = model(image, **kwargs)
@@ -1,5 +1,4 @@
-from ..utils import common_annotator_call, define_preprocessor_inputs, INPUT
-import comfy.model_management as model_management
+from ..utils import common_annotator_call, define_preprocessor_inputs, INPUT, load_detector
 
 class PIDINET_Preprocessor:
     @classmethod
@@ -17,7 +16,7 @@ class PIDINET_Preprocessor:
     def execute(self, image, safe, resolution=512, **kwargs):
         from custom_controlnet_aux.pidi import PidiNetDetector
 
-        model = PidiNetDetector.from_pretrained().to(model_management.get_torch_device())
+        model = load_detector(PidiNetDetector)
         out = common_annotator_call(model, image, resolution=resolution, safe = safe == "enable")
         del model
         return (out, )
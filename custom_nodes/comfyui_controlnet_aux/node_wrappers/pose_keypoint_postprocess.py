@@ -8,7 +8,7 @@ from einops import rearrange
 import torch
 import itertools
 
-from ..src.custom_controlnet_aux.dwpose import draw_poses, draw_animalposes, decode_json_as_poses
+from ..src.custom_controlnet_aux.dwpose import draw_poses_batch, draw_animalposes, decode_json_as_poses
 
 
 """
@@ -288,19 +288,21 @@ class RenderPeopleKps:
     CATEGORY = "ControlNet Preprocessors/Pose Keypoint Postprocess"
 
     def render(self, kps, render_body, render_hand, render_face) -> tuple[np.ndarray]:
-        if isinstance(kps, list):
-            kps = kps[0]
-
-        poses, _, height, width = decode_json_as_poses(kps)
-        np_image = draw_poses(
-            poses,
+        if not isinstance(kps, list):
+            kps = [kps]
+
+        # Frames of a POSE_KEYPOINT batch come from one IMAGE batch, draw all of them on the first frame's canvas size
+        decoded = [decode_json_as_poses(frame) for frame in kps]
+        _, _, height, width = decoded[0]
+        np_images = draw_poses_batch(
+            [poses for poses, _, _, _ in decoded],
             height,
             width,
             render_body,
             render_hand,
             render_face,
         )
-        return (numpy2torch(np_image),)
+        return (torch.from_numpy(np_images.astype(np.float32) / 255),)
 
 class RenderAnimalKps:
     @classmethod
@@ -1,5 +1,4 @@
-from ..utils import common_annotator_call, define_preprocessor_inputs, INPUT, nms
-import comfy.model_management as model_management
+from ..utils import common_annotator_call, define_preprocessor_inputs, INPUT, nms, load_detector
 import cv2
 
 class Scribble_Preprocessor:
@@ -53,7 +52,7 @@ class Scribble_PiDiNet_Preprocessor:
     def execute(self, image, safe="enable", resolution=512):
         def model(img, **kwargs):
             from custom_controlnet_aux.pidi import PidiNetDetector
-            pidinet = PidiNetDetector.from_pretrained().to(model_management.get_torch_device())
+            pidinet = load_detector(PidiNetDetector)
             result = pidinet(img, scribble=True, **kwargs)
             result = nms(result, 127, 3.0)
             result = cv2.GaussianBlur(result, (0, 0), 3.0)
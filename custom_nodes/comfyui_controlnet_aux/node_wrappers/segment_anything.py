@@ -1,5 +1,4 @@
-from ..utils import common_annotator_call, define_preprocessor_inputs, INPUT
-import comfy.model_management as model_management
+from ..utils import common_annotator_call, define_preprocessor_inputs, INPUT, load_detector
 
 class SAM_Preprocessor:
     @classmethod
@@ -14,7 +13,7 @@ class SAM_Preprocessor:
     def execute(self, image, resolution=512, **kwargs):
         from custom_controlnet_aux.sam import SamDetector
 
-        mobile_sam = SamDetector.from_pretrained().to(model_management.get_torch_device())
+        mobile_sam = load_detector(SamDetector)
         out = common_annotator_call(mobile_sam, image, resolution=resolution)
         del mobile_sam
         return (out, )
@@ -3,8 +3,7 @@ import os
 os.environ['NPU_DEVICE_COUNT'] = '0'
 os.environ['MMCV_WITH_OPS'] = '0'
 
-from ..utils import common_annotator_call, define_preprocessor_inputs, INPUT
-import comfy.model_management as model_management
+from ..utils import common_annotator_call, define_preprocessor_inputs, INPUT, load_detector
 
 class Uniformer_SemSegPreprocessor:
     @classmethod
@@ -19,7 +18,7 @@ class Uniformer_SemSegPreprocessor:
     def semantic_segmentate(self, image, resolution=512):
         from custom_controlnet_aux.uniformer import UniformerSegmentor
 
-        model = UniformerSegmentor.from_pretrained().to(model_management.get_torch_device())
+        model = load_detector(UniformerSegmentor)
         out = common_annotator_call(model, image, resolution=resolution)
         del model
         return (out, )
@@ -1,5 +1,4 @@
-from ..utils import common_annotator_call
-import comfy.model_management as model_management
+from ..utils import common_annotator_call, load_detector
 import torch
 import numpy as np
 from einops import rearrange
@@ -30,7 +29,7 @@ class Unimatch_OptFlowPreprocessor:
         assert len(image) > 1, "[Unimatch] Requiring as least two frames as an optical flow estimator. Only use this node on video input."    
         from custom_controlnet_aux.unimatch import UnimatchDetector
         tensor_images = image
-        model = UnimatchDetector.from_pretrained(filename=ckpt_name).to(model_management.get_torch_device())
+        model = load_detector(UnimatchDetector, filename=ckpt_name)
         flows, vis_flows = [], []
         for i in range(len(tensor_images) - 1):
             image0, image1 = np.asarray(image[i:i+2].cpu() * 255., dtype=np.uint8)
@@ -1,8 +1,9 @@
 import warnings
 import cv2
 import numpy as np
+import torch
 from PIL import Image
-from custom_controlnet_aux.util import resize_image_with_pad, common_input_validate, HWC3
+from custom_controlnet_aux.util import resize_image_with_pad, resize_image_with_pad_torch, common_input_validate, HWC3
 
 class CannyDetector:
     def __call__(self, input_image=None, low_threshold=100, high_threshold=200, detect_resolution=512, output_type=None, upscale_method="INTER_CUBIC", **kwargs):
@@ -15,3 +16,95 @@ class CannyDetector:
             detected_map = Image.fromarray(detected_map)
             
         return detected_map
+
+#Same integer tangent test as cv2.Canny's non-maximum suppression
+CANNY_SHIFT = 15
+TG22 = int(0.4142135623730950488016887242097 * (1 << CANNY_SHIFT) + 0.5)
+
+def canny_torch(images, low_threshold=100, high_threshold=200, blur_sigma=0.0, hysteresis_check_every=8):
+    """
+    cv2.Canny (aperture 3, L1 gradient) on a [B, C, H, W] tensor of 0-255 values, batched on the tensor's device.
+    cv2.Canny does not smooth, set blur_sigma > 0 to Gaussian blur first. Returns a [B, 1, H, W] bool edge map.
+    """
+    B, C, H, W = images.shape
+    x = images.float().reshape(B * C, 1, H, W)
+    if blur_sigma > 0:
+        radius = max(1, int(blur_sigma * 3 + 0.5))
+        kernel = torch.exp(-(torch.arange(-radius, radius + 1, device=x.device, dtype=x.dtype) ** 2) / (2 * blur_sigma ** 2))
+        kernel = kernel / kernel.sum()
+        x = torch.nn.functional.pad(x, (radius, radius, radius, radius), mode="reflect")
+        x = torch.nn.functional.conv2d(x, kernel.view(1, 1, 1, -1))
+        x = torch.nn.functional.conv2d(x, kernel.view(1, 1, -1, 1))
+
+    # separable 3x3 Sobel in integer arithmetic, exact for the 0-255 inputs
+    x = torch.nn.functional.pad(x.round(), (1, 1, 1, 1), mode="replicate").to(torch.int32).reshape(B, C, H + 2, W + 2)
+    smooth_x = x[..., :, :-2] + 2 * x[..., :, 1:-1] + x[..., :, 2:]
+    diff_x = x[..., :, 2:] - x[..., :, :-2]
+    dxs = diff_x[..., :-2, :] + 2 * diff_x[..., 1:-1, :] + diff_x[..., 2:, :]
+    dys = smooth_x[..., 2:, :] - smooth_x[..., :-2, :]
+    mags = dxs.abs() + dys.abs()
+    # like OpenCV, keep the gradient of the first channel with the largest magnitude
+    mag, dx, dy = mags[:, :1], dxs[:, :1], dys[:, :1]
+    for k in range(1, C):
+        larger = mags[:, k:k + 1] > mag
+        mag = torch.where(larger, mags[:, k:k + 1], mag)
+        dx = torch.where(larger, dxs[:, k:k + 1], dx)
+        dy = torch.where(larger, dys[:, k:k + 1], dy)
+
+    low, high = sorted((int(np.floor(low_threshold)), int(np.floor(high_threshold))))
+    padded = torch.nn.functional.pad(mag, (1, 1, 1, 1))
+    neighbour = lambda oy, ox: padded[..., 1 + oy:1 + oy + H, 1 + ox:1 + ox + W]
+
+    ax, ay = dx.abs(), dy.abs() << CANNY_SHIFT
+    tg22x = ax * TG22
+    tg67x = tg22x + (ax << (CANNY_SHIFT + 1))
+    s = torch.where((dx ^ dy) < 0, -1, 1)
+    horizontal = (mag > neighbour(0, -1)) & (mag >= neighbour(0, 1))
+    vertical = (mag > neighbour(-1, 0)) & (mag >= neighbour(1, 0))
+    # diagonal neighbours are (y - 1, x - s) and (y + 1, x + s)
+    diagonal = torch.where(s < 0, (mag > neighbour(-1, 1)) & (mag > neighbour(1, -1)), (mag > neighbour(-1, -1)) & (mag > neighbour(1, 1)))
+    maximum = torch.where(ay < tg22x, horizontal, torch.where(ay > tg67x, vertical, diagonal))
+
+    weak = maximum & (mag > low)
+    edges = weak & (mag > high)
+    # hysteresis: grow the strong edges through 8-connected weak ones until nothing changes.
+    # 3x3 dilation as ORs of shifted bool views, much cheaper than max_pool2d
+    def dilate(x):
+        x = torch.nn.functional.pad(x, (1, 1, 1, 1))
+        x = x[..., :, :-2] | x[..., :, 1:-1] | x[..., :, 2:]
+        return x[..., :-2, :] | x[..., 1:-1, :] | x[..., 2:, :]
+
+    while True:
+        previous = edges
+        for _ in range(hysteresis_check_every):
+            edges = dilate(edges) & weak
+        if torch.equal(edges, previous):
+            return edges
+
+class TorchCannyDetector:
+    """Canny on torch tensors, one batched pass per chunk on the detector's device (see common_annotator_call)."""
+    def __init__(self, device="cpu"):
+        self.device = device
+        self.batch_bytes_per_pixel = 256
+
+    def to(self, device):
+        self.device = device
+        return self
+
+    def __call__(self, input_image=None, low_threshold=100, high_threshold=200, detect_resolution=512, output_type=None, upscale_method="INTER_CUBIC", **kwargs):
+        input_image, output_type = common_input_validate(input_image, output_type, **kwargs)
+        images = torch.from_numpy(HWC3(input_image)).unsqueeze(0).float() / 255.0
+        detected_map = self.batch_call(images, low_threshold, high_threshold, detect_resolution, upscale_method, **kwargs)
+        detected_map = (detected_map[0] * 255.0).to(torch.uint8).cpu().numpy()
+
+        if output_type == "pil":
+            detected_map = Image.fromarray(detected_map)
+
+        return detected_map
+
+    def batch_call(self, input_images, low_threshold=100, high_threshold=200, detect_resolution=512, upscale_method="INTER_CUBIC", blur_sigma=0.0, **kwargs):
+        with torch.no_grad():
+            images, remove_pad = resize_image_with_pad_torch(input_images.to(self.device), detect_resolution, upscale_method)
+            # the OpenCV path sees uint8 images, quantize the same way
+            edges = canny_torch((images * 255.0).round(), low_threshold, high_threshold, blur_sigma)
+        return remove_pad(edges).float().expand(-1, 3, -1, -1).movedim(1, -1)
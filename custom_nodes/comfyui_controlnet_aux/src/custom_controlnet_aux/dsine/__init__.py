@@ -1,4 +1,5 @@
 import os
+import sys
 import types
 import warnings
 from pathlib import Path
@@ -40,7 +41,10 @@ def pad64(x):
     return int(np.ceil(float(x) / 64.0) * 64 - x)
 
 def safer_memory(x):
-    return np.ascontiguousarray(x.copy()).copy()
+    # The extra copies are only needed on Mac
+    if sys.platform == "darwin":
+        return np.ascontiguousarray(x.copy()).copy()
+    return np.ascontiguousarray(x)
 
 def resize_image_with_pad(input_image, resolution, upscale_method="INTER_CUBIC", skip_hwc3=False, mode='edge'):
     if skip_hwc3:
@@ -11,6 +11,7 @@ os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
 
 import json
 import torch
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from . import util
 from .body import Body, BodyResult, Keypoint
@@ -106,20 +107,39 @@ def draw_poses(poses: List[PoseResult], H, W, draw_body=True, draw_hand=True, dr
     Returns:
         numpy.ndarray: A 3D numpy array representing the canvas with the drawn poses.
     """
-    canvas = np.zeros(shape=(H, W, 3), dtype=np.uint8)
+    return draw_poses_batch([poses], H, W, draw_body, draw_hand, draw_face, xinsr_stick_scaling)[0]
 
-    for pose in poses:
-        if draw_body:
-            canvas = util.draw_bodypose(canvas, pose.body.keypoints, xinsr_stick_scaling)
 
-        if draw_hand:
-            canvas = util.draw_handpose(canvas, pose.left_hand)
-            canvas = util.draw_handpose(canvas, pose.right_hand)
+def draw_poses_batch(poses_batch: List[List[PoseResult]], H, W, draw_body=True, draw_hand=True, draw_face=True, xinsr_stick_scaling=False):
+    """
+    draw_poses for many frames of the same size, see util.draw_pose_keypoints.
 
-        if draw_face:
-            canvas = util.draw_facepose(canvas, pose.face)
+    Returns:
+        numpy.ndarray: A [B, H, W, 3] uint8 array with the drawn poses of each frame.
+    """
+    keypoints_batch = [
+        np.array([util.pose_keypoints_array(pose.body.keypoints, pose.left_hand, pose.right_hand, pose.face, H, W) for pose in poses]).reshape(-1, util.POSE_KEYPOINT_COUNT, 2)
+        for poses in poses_batch
+    ]
+    return util.draw_pose_keypoints_batch(keypoints_batch, H, W, draw_body, draw_hand, draw_face, xinsr_stick_scaling)
 
-    return canvas
+
+def rescale_poses(poses: List[PoseResult], scale_x: float, scale_y: float) -> List[PoseResult]:
+    """
+    Map pixel keypoints to the same image resized by (scale_x, scale_y), keeping pixel centres aligned like cv2.resize.
+    """
+    def rescale(keypoints: Optional[List[Optional[Keypoint]]]) -> Optional[List[Optional[Keypoint]]]:
+        if keypoints is None:
+            return None
+        return [
+            None if keypoint is None else keypoint._replace(x=(keypoint.x + 0.5) * scale_x - 0.5, y=(keypoint.y + 0.5) * scale_y - 0.5)
+            for keypoint in keypoints
+        ]
+
+    return [
+        PoseResult(pose.body._replace(keypoints=rescale(pose.body.keypoints)), rescale(pose.left_hand), rescale(pose.right_hand), rescale(pose.face))
+        for pose in poses
+    ]
 
 
 def decode_json_as_poses(
@@ -250,12 +270,42 @@ class DwposeDetector:
             global_cached_dwpose = t
         return cls(global_cached_dwpose)
 
+    def to(self, device):
+        self.dw_pose_estimation.to(device)
+        return self
+
     def detect_poses(self, oriImg) -> List[PoseResult]:
         with torch.no_grad():
             keypoints_info = self.dw_pose_estimation(oriImg.copy())
             return Wholebody.format_result(keypoints_info)
     
-    def __call__(self, input_image, detect_resolution=512, include_body=True, include_hand=False, include_face=False, hand_and_face=None, output_type="pil", image_and_json=False, upscale_method="INTER_CUBIC", xinsr_stick_scaling=False, **kwargs):
+    def get_detect_image(self, input_image, pose_detect_resolution=0):
+        H, W = input_image.shape[:2]
+        k = min(1.0, float(pose_detect_resolution) / float(max(H, W))) if pose_detect_resolution > 0 else 1.0
+        H_detect, W_detect = int(np.round(H * k)), int(np.round(W * k))
+        if (H_detect, W_detect) == (H, W):
+            return input_image
+        return cv2.resize(input_image, (W_detect, H_detect), interpolation=cv2.INTER_AREA)
+
+    def render_poses(self, poses, input_image, detect_image, detect_resolution=512, upscale_method="INTER_CUBIC", pose_detect_resolution=0, **draw_kwargs):
+        """Returns the pose map at the detect_resolution size and the poses in input image pixels."""
+        H, W = input_image.shape[:2]
+        if pose_detect_resolution > 0:
+            poses = rescale_poses(poses, W / detect_image.shape[1], H / detect_image.shape[0])
+            k = float(detect_resolution) / float(min(H, W))
+            H_target, W_target = int(np.round(H * k)), int(np.round(W * k))
+            return draw_poses(rescale_poses(poses, W_target / W, H_target / H), H_target, W_target, **draw_kwargs), poses
+
+        canvas = draw_poses(poses, H, W, **draw_kwargs)
+        canvas, remove_pad = resize_image_with_pad(canvas, detect_resolution, upscale_method)
+        return HWC3(remove_pad(canvas)), poses
+
+    def __call__(self, input_image, detect_resolution=512, include_body=True, include_hand=False, include_face=False, hand_and_face=None, output_type="pil", image_and_json=False, upscale_method="INTER_CUBIC", xinsr_stick_scaling=False, pose_detect_resolution=0, **kwargs):
+        """
+        pose_detect_resolution > 0 caps the longer side of the image the bbox detector and pose model see, the
+        keypoints are mapped back to the input and the pose map is drawn directly at the detect_resolution size.
+        0 keeps detecting on the full input and downscaling a full size drawing.
+        """
         if hand_and_face is not None:
             warnings.warn("hand_and_face is deprecated. Use include_hand and include_face instead.", DeprecationWarning)
             include_hand = hand_and_face
@@ -263,11 +313,12 @@ class DwposeDetector:
 
         input_image, output_type = common_input_validate(input_image, output_type, **kwargs)
         input_image, _ = resize_image_with_pad(input_image, 0, upscale_method)
-        poses = self.detect_poses(input_image)
-        
-        canvas = draw_poses(poses, input_image.shape[0], input_image.shape[1], draw_body=include_body, draw_hand=include_hand, draw_face=include_face, xinsr_stick_scaling=xinsr_stick_scaling)
-        canvas, remove_pad = resize_image_with_pad(canvas, detect_resolution, upscale_method)
-        detected_map = HWC3(remove_pad(canvas))
+        detect_image = self.get_detect_image(input_image, pose_detect_resolution)
+        poses = self.detect_poses(detect_image)
+        detected_map, poses = self.render_poses(
+            poses, input_image, detect_image, detect_resolution, upscale_method, pose_detect_resolution,
+            draw_body=include_body, draw_hand=include_hand, draw_face=include_face, xinsr_stick_scaling=xinsr_stick_scaling
+        )
 
         if output_type == "pil":
             detected_map = Image.fromarray(detected_map)
@@ -277,6 +328,27 @@ class DwposeDetector:
         
         return detected_map
 
+    def call_batch(self, input_images, detect_resolution=512, include_body=True, include_hand=False, include_face=False, upscale_method="INTER_CUBIC", xinsr_stick_scaling=False, pose_detect_resolution=0, max_workers=None):
+        """
+        Same as __call__(..., output_type="np", image_and_json=True) for each of a list of uint8 images, in order.
+        The bbox detector runs once over all images and the pose model once over the people of all images
+        (Wholebody.call_batch), then the maps are drawn and the JSON encoded in a thread pool.
+        """
+        input_images = [HWC3(input_image) for input_image in input_images]
+        detect_images = [self.get_detect_image(input_image, pose_detect_resolution) for input_image in input_images]
+        with torch.no_grad():
+            keypoints_infos = self.dw_pose_estimation.call_batch(detect_images)
+
+        def render(i):
+            detected_map, poses = self.render_poses(
+                Wholebody.format_result(keypoints_infos[i]), input_images[i], detect_images[i], detect_resolution, upscale_method, pose_detect_resolution,
+                draw_body=include_body, draw_hand=include_hand, draw_face=include_face, xinsr_stick_scaling=xinsr_stick_scaling
+            )
+            return detected_map, encode_poses_as_dict(poses, input_images[i].shape[0], input_images[i].shape[1])
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return list(pool.map(render, range(len(input_images))))
+
 global_cached_animalpose = AnimalPoseImage()
 class AnimalposeDetector:
     """
@@ -307,6 +379,10 @@ class AnimalposeDetector:
             t.det_filename = global_cached_animalpose.det_filename
             global_cached_animalpose = t
         return cls(global_cached_animalpose)
+
+    def to(self, device):
+        self.animal_pose_estimation.to(device)
+        return self
     
     def __call__(self, input_image, detect_resolution=512, output_type="pil", image_and_json=False, upscale_method="INTER_CUBIC", **kwargs):
         input_image, output_type = common_input_validate(input_image, output_type, **kwargs)
@@ -5,6 +5,7 @@ import cv2
 from .dw_onnx.cv_ox_det import inference_detector as inference_onnx_yolox
 from .dw_onnx.cv_ox_yolo_nas import inference_detector as inference_onnx_yolo_nas
 from .dw_onnx.cv_ox_pose import inference_pose as inference_onnx_pose
+from .dw_onnx.session import get_onnx_session
 
 from .dw_torchscript.jit_det import inference_detector as inference_jit_yolox
 from .dw_torchscript.jit_pose import inference_pose as inference_jit_pose
@@ -139,57 +140,33 @@ class AnimalPoseImage:
         # return type: None ort cv2 torchscript
         self.det_model_type = get_model_type("AnimalPose",self.det_filename)
         self.pose_model_type = get_model_type("AnimalPose",self.pose_filename)
-        # Always loads to CPU to avoid building OpenCV.
-        cv2_device = 'cpu'
-        cv2_backend = cv2.dnn.DNN_BACKEND_OPENCV if cv2_device == 'cpu' else cv2.dnn.DNN_BACKEND_CUDA
-        # You need to manually build OpenCV through cmake to work with your GPU.
-        cv2_providers = cv2.dnn.DNN_TARGET_CPU if cv2_device == 'cpu' else cv2.dnn.DNN_TARGET_CUDA
         ort_providers = get_ort_providers()
 
         if self.det_model_type is None:
             pass
-        elif self.det_model_type == "ort":
-            try:
-                import onnxruntime as ort
-                self.det = ort.InferenceSession(det_model_path, providers=ort_providers)
-            except:
-                print(f"Failed to load onnxruntime with {self.det.get_providers()}.\nPlease change EP_list in the config.yaml and restart ComfyUI")
-                self.det = ort.InferenceSession(det_model_path, providers=["CPUExecutionProvider"])
-        elif self.det_model_type == "cv2":
-            try:
-                self.det = cv2.dnn.readNetFromONNX(det_model_path)
-                self.det.setPreferableBackend(cv2_backend)
-                self.det.setPreferableTarget(cv2_providers)
-            except:
-                print("TopK operators may not work on your OpenCV, try use onnxruntime with CPUExecutionProvider")
-                try:
-                    import onnxruntime as ort
-                    self.det = ort.InferenceSession(det_model_path, providers=["CPUExecutionProvider"])
-                except:
-                    print(f"Failed to load {det_model_path}, you can use other models instead")
+        elif self.det_model_type in ("ort", "cv2"):
+            self.det = get_onnx_session(det_model_path, self.det_model_type, ort_providers)
         else:
             self.det = torch.jit.load(det_model_path)
             self.det.to(torchscript_device)
 
         if self.pose_model_type is None:
             pass
-        elif self.pose_model_type == "ort":
-            try:
-                import onnxruntime as ort
-                self.pose = ort.InferenceSession(pose_model_path, providers=ort_providers)
-            except:
-                print(f"Failed to load onnxruntime with {self.pose.get_providers()}.\nPlease change EP_list in the config.yaml and restart ComfyUI")
-                self.pose = ort.InferenceSession(pose_model_path, providers=["CPUExecutionProvider"])
-        elif self.pose_model_type == "cv2":
-            self.pose = cv2.dnn.readNetFromONNX(pose_model_path)
-            self.pose.setPreferableBackend(cv2_backend)
-            self.pose.setPreferableTarget(cv2_providers)
+        elif self.pose_model_type in ("ort", "cv2"):
+            self.pose = get_onnx_session(pose_model_path, self.pose_model_type, ort_providers)
         else:
             self.pose = torch.jit.load(pose_model_path)
             self.pose.to(torchscript_device)
-
+        
         if self.pose_filename is not None:
             self.pose_input_size, _ = guess_onnx_input_shape_dtype(self.pose_filename)
+
+    def to(self, device):
+        # only the TorchScript models live on a torch device, the onnx sessions keep their providers
+        for model in (self.det, self.pose):
+            if is_model_torchscript(model):
+                model.to(device)
+        return self
     
     def __call__(self, oriImg):
         detect_classes = list(range(14, 23 + 1)) #https://github.com/ultralytics/ultralytics/blob/main/ultralytics/cfg/datasets/coco.yaml
@@ -1,5 +1,6 @@
 import cv2
 import numpy as np
+from .session import run_session
 
 def nms(boxes, scores, nms_thr):
     """Single class NMS implemented in Numpy."""
@@ -93,21 +94,8 @@ def preprocess(img, input_size, swap=(2, 0, 1)):
     padded_img = np.ascontiguousarray(padded_img, dtype=np.float32)
     return padded_img, r
 
-def inference_detector(session, oriImg, detect_classes=[0], dtype=np.float32):
-    input_shape = (640,640)
-    img, ratio = preprocess(oriImg, input_shape)
-
-    input = img[None, :, :, :]
-    input = input.astype(dtype)
-    if "InferenceSession" in type(session).__name__:
-        input_name = session.get_inputs()[0].name
-        output = session.run(None, {input_name: input})
-    else:
-        outNames = session.getUnconnectedOutLayersNames()
-        session.setInput(input)
-        output = session.forward(outNames)
-
-    predictions = demo_postprocess(output[0], input_shape)[0]
+def decode_detections(output, ratio, input_shape, detect_classes):
+    predictions = demo_postprocess(output, input_shape)[0]
 
     boxes = predictions[:, :4]
     scores = predictions[:, 4:5] * predictions[:, 5:]
@@ -126,4 +114,29 @@ def inference_detector(session, oriImg, detect_classes=[0], dtype=np.float32):
     iscat = np.isin(final_cls_inds, detect_classes)
     isbbox = [ i and j for (i, j) in zip(isscore, iscat)]
     final_boxes = final_boxes[isbbox]
-    return final_boxes
\ No newline at end of file
+    return final_boxes
+
+def inference_detector(session, oriImg, detect_classes=[0], dtype=np.float32):
+    input_shape = (640,640)
+    img, ratio = preprocess(oriImg, input_shape)
+
+    input = img[None, :, :, :]
+    input = input.astype(dtype)
+    output = run_session(session, input)
+
+    return decode_detections(output[0], ratio, input_shape, detect_classes)
+
+def inference_detector_batch(session, oriImgs, detect_classes=[0], dtype=np.float32):
+    """inference_detector on several images with one session run, returns the boxes of each image"""
+    input_shape = (640,640)
+    preprocessed = [preprocess(oriImg, input_shape) for oriImg in oriImgs]
+    input = np.stack([img for img, _ in preprocessed]).astype(dtype)
+    try:
+        output = run_session(session, input)[0]
+    except Exception:
+        output = None
+    if output is None or output.shape[0] != input.shape[0]:
+        #Models exported with a fixed batch size of 1
+        output = np.concatenate([run_session(session, input[i:i+1])[0] for i in range(len(input))])
+
+    return [decode_detections(output[i:i+1], ratio, input_shape, detect_classes) for i, (_, ratio) in enumerate(preprocessed)]
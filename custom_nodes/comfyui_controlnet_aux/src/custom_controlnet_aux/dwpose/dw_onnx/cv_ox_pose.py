@@ -3,6 +3,8 @@ from typing import List, Tuple
 import cv2
 import numpy as np
 
+from .session import run_session
+
 def preprocess(
     img: np.ndarray, out_bbox, input_size: Tuple[int, int] = (192, 256)
 ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
@@ -49,37 +51,28 @@ def preprocess(
 
 
 def inference(sess, img, dtype=np.float32):
-    """Inference DWPose model. Processing all image segments at once to take advantage of GPU's parallelism ability if onnxruntime is installed
+    """Inference DWPose model. Processing all image segments at once to take advantage of GPU's parallelism ability
 
     Args:
-        sess : ONNXRuntime session.
+        sess : ONNXRuntime session or OpenCV DNN net.
         img : Input image in shape.
 
     Returns:
         outputs : Output of DWPose model.
     """
-    all_out = []
     # build input
     input = np.stack(img, axis=0).transpose(0, 3, 1, 2)
     input = input.astype(dtype)
-    if "InferenceSession" in type(sess).__name__:
-        input_name = sess.get_inputs()[0].name
-        all_outputs = sess.run(None, {input_name: input})
-        for batch_idx in range(len(all_outputs[0])):
-            outputs = [all_outputs[i][batch_idx:batch_idx+1,...] for i in range(len(all_outputs))]
-            all_out.append(outputs)
-        return all_out
-
-    #OpenCV doesn't support batch processing sadly
-    for i in range(len(img)):
-        input = img[i].transpose(2, 0, 1)
-        input = input[None, :, :, :]
-
-        outNames = sess.getUnconnectedOutLayersNames()
-        sess.setInput(input)
-        outputs = sess.forward(outNames)
-        all_out.append(outputs)
+    try:
+        all_outputs = run_session(sess, input)
+    except cv2.error:
+        #Some OpenCV versions can't import the dynamic batch size of the model, run the crops one by one
+        all_outputs = [np.concatenate(outputs, axis=0) for outputs in zip(*[run_session(sess, input[i:i+1]) for i in range(len(input))])]
 
+    all_out = []
+    for batch_idx in range(len(all_outputs[0])):
+        outputs = [all_outputs[i][batch_idx:batch_idx+1,...] for i in range(len(all_outputs))]
+        all_out.append(outputs)
     return all_out
 
 def postprocess(outputs: List[np.ndarray],
@@ -360,4 +353,19 @@ def inference_pose(session, out_bbox, oriImg, model_input_size=(288, 384), dtype
     outputs = inference(session, resized_img, dtype)
     keypoints, scores = postprocess(outputs, model_input_size, center, scale)
 
-    return keypoints, scores
\ No newline at end of file
+    return keypoints, scores
+
+def inference_pose_batch(session, out_bboxes, oriImgs, model_input_size=(288, 384), dtype=np.float32):
+    """inference_pose on several images, the person crops of all of them go through a single inference call"""
+    resized_imgs, centers, scales, counts = [], [], [], []
+    for out_bbox, oriImg in zip(out_bboxes, oriImgs):
+        resized_img, center, scale = preprocess(oriImg, out_bbox, model_input_size)
+        resized_imgs += resized_img
+        centers += center
+        scales += scale
+        counts.append(len(resized_img))
+    outputs = inference(session, resized_imgs, dtype)
+    keypoints, scores = postprocess(outputs, model_input_size, centers, scales)
+
+    splits = np.cumsum(counts)[:-1]
+    return list(zip(np.split(keypoints, splits), np.split(scores, splits)))
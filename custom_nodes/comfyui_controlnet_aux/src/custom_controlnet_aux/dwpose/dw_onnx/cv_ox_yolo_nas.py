@@ -3,6 +3,7 @@
 
 import numpy as np
 import cv2
+from .session import run_session
 
 def preprocess(img, input_size, swap=(2, 0, 1)):
     if len(img.shape) == 3:
@@ -43,13 +44,7 @@ def inference_detector(session, oriImg, detect_classes=[0], dtype=np.uint8):
     img, ratio = preprocess(oriImg, input_shape)
     input = img[None, :, :, :]
     input = input.astype(dtype)
-    if "InferenceSession" in type(session).__name__:
-        input_name = session.get_inputs()[0].name
-        output = session.run(None, {input_name: input})
-    else:
-        outNames = session.getUnconnectedOutLayersNames()
-        session.setInput(input)
-        output = session.forward(outNames)
+    output = run_session(session, input)
     num_preds, pred_boxes, pred_scores, pred_classes = output
     num_preds = num_preds[0,0]
     if num_preds == 0:
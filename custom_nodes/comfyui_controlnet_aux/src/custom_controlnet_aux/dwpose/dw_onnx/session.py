@@ -0,0 +1,116 @@
+import hashlib
+import os
+import platform
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+# Set by config.yaml through the node's utils.py, 0 lets onnxruntime decide
+ORT_INTRA_OP_THREADS = int(os.getenv("AUX_ORT_INTRA_OP_THREADS", "0") or 0)
+ORT_INTER_OP_THREADS = int(os.getenv("AUX_ORT_INTER_OP_THREADS", "0") or 0)
+ORT_GRAPH_OPTIMIZATION_LEVEL = os.getenv("AUX_ORT_GRAPH_OPTIMIZATION_LEVEL", "all")
+ORT_OPTIMIZED_MODEL_CACHE = os.getenv("AUX_ORT_OPTIMIZED_MODEL_CACHE", "True") == "True"
+ORT_SESSION_CACHE_SIZE = int(os.getenv("AUX_ORT_SESSION_CACHE_SIZE", "4") or 0)
+
+ORT_GRAPH_OPTIMIZATION_LEVELS = dict(disable="ORT_DISABLE_ALL", basic="ORT_ENABLE_BASIC", extended="ORT_ENABLE_EXTENDED", all="ORT_ENABLE_ALL")
+
+# LRU of the sessions per (model, runtime, providers) for the whole process, shared by DWPose and AnimalPose.
+# Emptied when ComfyUI unloads all its models, a size of 0 disables it
+onnx_sessions = OrderedDict()
+onnx_sessions_lock = threading.Lock()
+
+def get_session_options(ort, optimized_model_path=None):
+    options = ort.SessionOptions()
+    if ORT_INTRA_OP_THREADS > 0:
+        options.intra_op_num_threads = ORT_INTRA_OP_THREADS
+    if ORT_INTER_OP_THREADS > 0:
+        options.inter_op_num_threads = ORT_INTER_OP_THREADS
+        options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+    level = ORT_GRAPH_OPTIMIZATION_LEVELS.get(ORT_GRAPH_OPTIMIZATION_LEVEL, "ORT_ENABLE_ALL")
+    options.graph_optimization_level = getattr(ort.GraphOptimizationLevel, level)
+    if optimized_model_path is not None:
+        options.optimized_model_filepath = optimized_model_path
+    return options
+
+def create_ort_session(model_path, providers):
+    import onnxruntime as ort
+    if not ORT_OPTIMIZED_MODEL_CACHE or ORT_GRAPH_OPTIMIZATION_LEVEL == "disable":
+        return ort.InferenceSession(model_path, sess_options=get_session_options(ort), providers=providers)
+
+    # The optimized graph can contain provider and CPU specific nodes, only reuse it on the same machine, onnxruntime and providers
+    tag = hashlib.sha1(repr((platform.node(), platform.machine(), ort.__version__, providers, ORT_GRAPH_OPTIMIZATION_LEVEL)).encode()).hexdigest()[:10]
+    optimized_model_path = f"{os.path.splitext(model_path)[0]}.optimized-{tag}.onnx"
+    if os.path.exists(optimized_model_path):
+        options = get_session_options(ort)
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+        try:
+            return ort.InferenceSession(optimized_model_path, sess_options=options, providers=providers)
+        except Exception as e:
+            print(f"Failed to load the optimized model {optimized_model_path} ({e}), optimizing {model_path} again")
+            os.remove(optimized_model_path)
+    if not os.access(os.path.dirname(optimized_model_path) or ".", os.W_OK):
+        return ort.InferenceSession(model_path, sess_options=get_session_options(ort), providers=providers)
+    return ort.InferenceSession(model_path, sess_options=get_session_options(ort, optimized_model_path), providers=providers)
+
+def create_cv2_net(model_path):
+    # Always loads to CPU to avoid building OpenCV.
+    # You need to manually build OpenCV through cmake to work with your GPU (DNN_BACKEND_CUDA, DNN_TARGET_CUDA).
+    net = cv2.dnn.readNetFromONNX(model_path)
+    net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+    net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+    return net
+
+def get_onnx_session(model_path, model_type, providers):
+    """
+    Returns the cached onnxruntime session (model_type "ort") or OpenCV DNN net ("cv2") of model_path, creating it
+    on first use. Falls back to onnxruntime on the CPU when the providers or OpenCV can't load the model.
+    """
+    key = (os.path.realpath(model_path), model_type, tuple(providers) if model_type == "ort" else ())
+    with onnx_sessions_lock:
+        if key in onnx_sessions:
+            onnx_sessions.move_to_end(key)
+            return onnx_sessions[key]
+
+        session = None
+        if model_type == "ort":
+            try:
+                session = create_ort_session(model_path, providers)
+            except Exception:
+                print(f"Failed to load onnxruntime with {providers}.\nPlease change EP_list in the config.yaml and restart ComfyUI")
+                session = create_ort_session(model_path, ["CPUExecutionProvider"])
+        elif model_type == "cv2":
+            try:
+                session = create_cv2_net(model_path)
+            except Exception:
+                print("TopK operators may not work on your OpenCV, try use onnxruntime with CPUExecutionProvider")
+                try:
+                    session = create_ort_session(model_path, ["CPUExecutionProvider"])
+                except Exception:
+                    print(f"Failed to load {model_path}, you can use other models instead")
+        if ORT_SESSION_CACHE_SIZE <= 0:
+            return session
+        onnx_sessions[key] = session
+        while len(onnx_sessions) > ORT_SESSION_CACHE_SIZE:
+            onnx_sessions.popitem(last=False)
+        return session
+
+def clear_onnx_sessions():
+    with onnx_sessions_lock:
+        onnx_sessions.clear()
+
+def run_session(session, input):
+    """Runs an onnxruntime session or OpenCV DNN net on one (batched) input, returns the list of outputs."""
+    input = np.ascontiguousarray(input)
+    if "InferenceSession" in type(session).__name__:
+        # IO binding reads the input array in place instead of copying it into an OrtValue first
+        binding = session.io_binding()
+        binding.bind_cpu_input(session.get_inputs()[0].name, input)
+        for output in session.get_outputs():
+            binding.bind_output(output.name)
+        session.run_with_iobinding(binding)
+        return binding.copy_outputs_to_cpu()
+
+    session.setInput(input)
+    return session.forward(session.getUnconnectedOutLayersNames())
@@ -94,15 +94,7 @@ def preprocess(img, input_size, swap=(2, 0, 1)):
     padded_img = np.ascontiguousarray(padded_img, dtype=np.float32)
     return padded_img, r
 
-def inference_detector(model, oriImg, detect_classes=[0]):
-    input_shape = (640,640)
-    img, ratio = preprocess(oriImg, input_shape)
-
-    device, dtype = next(model.parameters()).device, next(model.parameters()).dtype
-    input = img[None, :, :, :]
-    input = torch.from_numpy(input).to(device, dtype)
-
-    output = model(input).float().cpu().detach().numpy()
+def decode_detections(output, ratio, input_shape, detect_classes):
     predictions = demo_postprocess(output[0], input_shape)
 
     boxes = predictions[:, :4]
@@ -122,4 +114,33 @@ def inference_detector(model, oriImg, detect_classes=[0]):
     iscat = np.isin(final_cls_inds, detect_classes)
     isbbox = [ i and j for (i, j) in zip(isscore, iscat)]
     final_boxes = final_boxes[isbbox]
-    return final_boxes
\ No newline at end of file
+    return final_boxes
+
+def inference_detector(model, oriImg, detect_classes=[0]):
+    input_shape = (640,640)
+    img, ratio = preprocess(oriImg, input_shape)
+
+    device, dtype = next(model.parameters()).device, next(model.parameters()).dtype
+    input = img[None, :, :, :]
+    input = torch.from_numpy(input).to(device, dtype)
+
+    output = model(input).float().cpu().detach().numpy()
+    return decode_detections(output, ratio, input_shape, detect_classes)
+
+def inference_detector_batch(model, oriImgs, detect_classes=[0]):
+    """inference_detector on several images with one forward pass, returns the boxes of each image"""
+    input_shape = (640,640)
+    preprocessed = [preprocess(oriImg, input_shape) for oriImg in oriImgs]
+
+    device, dtype = next(model.parameters()).device, next(model.parameters()).dtype
+    input = torch.from_numpy(np.stack([img for img, _ in preprocessed])).to(device, dtype)
+    try:
+        output = model(input)
+    except RuntimeError:
+        output = None
+    if output is None or output.shape[0] != input.shape[0]:
+        #Traced with a fixed batch size of 1
+        output = torch.cat([model(input[i:i+1]) for i in range(len(input))])
+    output = output.float().cpu().detach().numpy()
+
+    return [decode_detections(output[i:i+1], ratio, input_shape, detect_classes) for i, (_, ratio) in enumerate(preprocessed)]
@@ -360,4 +360,19 @@ def inference_pose(model, out_bbox, oriImg, model_input_size=(288, 384)):
 
     keypoints, scores = postprocess(outputs, model_input_size, center, scale)
 
-    return keypoints, scores
\ No newline at end of file
+    return keypoints, scores
+
+def inference_pose_batch(model, out_bboxes, oriImgs, model_input_size=(288, 384)):
+    """inference_pose on several images, the person crops of all of them go through a single inference call"""
+    resized_imgs, centers, scales, counts = [], [], [], []
+    for out_bbox, oriImg in zip(out_bboxes, oriImgs):
+        resized_img, center, scale = preprocess(oriImg, out_bbox, model_input_size)
+        resized_imgs += resized_img
+        centers += center
+        scales += scale
+        counts.append(len(resized_img))
+    outputs = inference(model, resized_imgs)
+    keypoints, scores = postprocess(outputs, model_input_size, centers, scales)
+
+    splits = np.cumsum(counts)[:-1]
+    return list(zip(np.split(keypoints, splits), np.split(scores, splits)))
@@ -235,6 +235,159 @@ def draw_facepose(canvas: np.ndarray, keypoints: Union[List[Keypoint], None]) ->
     return canvas
 
 
+# Batch renderer, draws the same shapes as draw_bodypose/draw_handpose/draw_facepose for the people of many frames.
+# Keypoints of a person are one [POSE_KEYPOINT_COUNT, 2] array of pixel coordinates (pose_keypoints_array), NaN if missing.
+POSE_KEYPOINT_PARTS = dict(body=(0, 18), left_hand=(18, 39), right_hand=(39, 60), face=(60, 130))
+POSE_KEYPOINT_COUNT = 130
+
+BODY_LIMB_SEQ = np.array([
+    [2, 3], [2, 6], [3, 4], [4, 5],
+    [6, 7], [7, 8], [2, 9], [9, 10],
+    [10, 11], [2, 12], [12, 13], [13, 14],
+    [2, 1], [1, 15], [15, 17], [1, 16],
+    [16, 18],
+]) - 1
+BODY_COLORS = np.array([
+    [255, 0, 0], [255, 85, 0], [255, 170, 0], [255, 255, 0], [170, 255, 0], [85, 255, 0], [0, 255, 0],
+    [0, 255, 85], [0, 255, 170], [0, 255, 255], [0, 170, 255], [0, 85, 255], [0, 0, 255], [85, 0, 255],
+    [170, 0, 255], [255, 0, 255], [255, 0, 170], [255, 0, 85]
+], dtype=np.uint8)
+HAND_EDGES = np.array([
+    [0, 1], [1, 2], [2, 3], [3, 4], [0, 5], [5, 6], [6, 7], [7, 8], [0, 9], [9, 10],
+    [10, 11], [11, 12], [0, 13], [13, 14], [14, 15], [15, 16], [0, 17], [17, 18], [18, 19], [19, 20]
+])
+
+
+def scalar_to_uint8(color) -> np.ndarray:
+    # Let OpenCV round the color, so that it is the exact value cv2.line/circle put on a uint8 canvas
+    pixel = np.zeros((1, 1, 3), dtype=np.uint8)
+    cv2.circle(pixel, (0, 0), 1, color, thickness=-1)
+    return pixel[0, 0]
+
+
+def disk_offsets(radius: int) -> Tuple[np.ndarray, np.ndarray]:
+    # Pixels of a filled cv2.circle around (0, 0)
+    disk = np.zeros((2 * radius + 1, 2 * radius + 1), dtype=np.uint8)
+    cv2.circle(disk, (radius, radius), radius, 1, thickness=-1)
+    dy, dx = np.nonzero(disk)
+    return dy - radius, dx - radius
+
+
+BODY_LIMB_COLORS = [[int(float(c) * 0.6) for c in color] for color in BODY_COLORS.tolist()]
+HAND_EDGE_COLORS = [
+    scalar_to_uint8(matplotlib.colors.hsv_to_rgb([ie / float(len(HAND_EDGES)), 1.0, 1.0]) * 255).tolist()
+    for ie in range(len(HAND_EDGES))
+]
+DISK_OFFSETS = {radius: disk_offsets(radius) for radius in (3, 4)}
+
+
+def pose_keypoints_array(body: List[Optional[Keypoint]], left_hand: Optional[List[Optional[Keypoint]]], right_hand: Optional[List[Optional[Keypoint]]], face: Optional[List[Optional[Keypoint]]], H: int, W: int) -> np.ndarray:
+    """
+    Pixel coordinates of a person's keypoints on a H x W canvas, each part is scaled by the canvas size only if it is
+    normalized, like draw_bodypose/draw_handpose/draw_facepose do. Returns a [POSE_KEYPOINT_COUNT, 2] array with NaN
+    for missing keypoints.
+    """
+    array = np.full((POSE_KEYPOINT_COUNT, 2), np.nan)
+    for keypoints, (start, end) in zip((body, left_hand, right_hand, face), POSE_KEYPOINT_PARTS.values()):
+        if not keypoints:
+            continue
+        scale = (float(W), float(H)) if is_normalized(keypoints) else (1.0, 1.0)
+        points = [(k.x, k.y) if k is not None else (np.nan, np.nan) for k in keypoints[:end - start]]
+        array[start:start + len(points)] = np.array(points, dtype=np.float64) * scale
+    return array
+
+
+def stamp_disks(canvas: np.ndarray, centers: np.ndarray, colors: np.ndarray, radius: int) -> None:
+    """Same as cv2.circle(canvas, center, radius, color, thickness=-1) for each of the [K, 2] int centers in turn."""
+    if len(centers) == 0:
+        return
+    CH, CW, _ = canvas.shape
+    dy, dx = DISK_OFFSETS[radius]
+    ys = (centers[:, 1:2] + dy).ravel()
+    xs = (centers[:, 0:1] + dx).ravel()
+    inside = (ys >= 0) & (ys < CH) & (xs >= 0) & (xs < CW)
+    ys, xs = ys[inside], xs[inside]
+    if colors.ndim == 1:
+        canvas[ys, xs] = colors
+        return
+
+    # Which of the repeated indices wins a fancy assignment is unspecified, keep the last circle like cv2 would
+    colors = np.repeat(colors, len(dy), axis=0)[inside]
+    _, last = np.unique((ys * CW + xs)[::-1], return_index=True)
+    canvas[ys[::-1][last], xs[::-1][last]] = colors[::-1][last]
+
+
+def draw_pose_keypoints(canvas: np.ndarray, keypoints: np.ndarray, draw_body: bool = True, draw_hand: bool = True, draw_face: bool = True, xinsr_stick_scaling: bool = False) -> np.ndarray:
+    """
+    Draw the people of a [N, POSE_KEYPOINT_COUNT, 2] keypoint array on canvas, the same as calling draw_bodypose,
+    draw_handpose (left then right) and draw_facepose for each person in turn.
+
+    Visibility, limb ellipses and colors are computed for all people at once, limbs and hand edges are still drawn
+    by OpenCV, the keypoints of a body, hand or face are stamped as precomputed disks in one go.
+    """
+    CH, CW, _ = canvas.shape
+    if len(keypoints) == 0:
+        return canvas
+
+    # Ref: https://huggingface.co/xinsir/controlnet-openpose-sdxl-1.0
+    max_side = max(CW, CH)
+    stick_scale = (1 if max_side < 500 else min(2 + (max_side // 1000), 7)) if xinsr_stick_scaling else 1
+    stickwidth = 4 * stick_scale
+
+    with np.errstate(invalid="ignore"):
+        visible = ~np.isnan(keypoints).any(-1)
+        points = np.trunc(np.where(visible[..., None], keypoints, 0)).astype(np.int64)
+        # draw_handpose and draw_facepose skip keypoints on the top and left borders
+        inside = visible & (points > eps).all(-1)
+
+        p1, p2 = keypoints[:, BODY_LIMB_SEQ[:, 0]], keypoints[:, BODY_LIMB_SEQ[:, 1]]
+        limb_visible = visible[:, BODY_LIMB_SEQ[:, 0]] & visible[:, BODY_LIMB_SEQ[:, 1]]
+        limbs = np.stack([
+            (p1[..., 0] + p2[..., 0]) / 2,
+            (p1[..., 1] + p2[..., 1]) / 2,
+            ((p1[..., 1] - p2[..., 1]) ** 2 + (p1[..., 0] - p2[..., 0]) ** 2) ** 0.5 / 2,
+            np.degrees(np.arctan2(p1[..., 1] - p2[..., 1], p1[..., 0] - p2[..., 0])),
+        ], axis=-1)
+        limbs = np.trunc(np.where(limb_visible[..., None], limbs, 0)).astype(np.int64)
+
+    body_start, body_end = POSE_KEYPOINT_PARTS["body"]
+    face_start, face_end = POSE_KEYPOINT_PARTS["face"]
+    for i in range(len(keypoints)):
+        if draw_body:
+            for j, (x, y, half_length, angle) in zip(np.flatnonzero(limb_visible[i]).tolist(), limbs[i][limb_visible[i]].tolist()):
+                polygon = cv2.ellipse2Poly((x, y), (half_length, stickwidth), angle, 0, 360, 1)
+                cv2.fillConvexPoly(canvas, polygon, BODY_LIMB_COLORS[j])
+            body_visible = visible[i, body_start:body_end]
+            stamp_disks(canvas, points[i, body_start:body_end][body_visible], BODY_COLORS[body_visible], 4)
+
+        if draw_hand:
+            for part in ("left_hand", "right_hand"):
+                start, end = POSE_KEYPOINT_PARTS[part]
+                hand, hand_visible = points[i, start:end], inside[i, start:end]
+                edge_visible = hand_visible[HAND_EDGES[:, 0]] & hand_visible[HAND_EDGES[:, 1]]
+                for j, (e1, e2) in zip(np.flatnonzero(edge_visible).tolist(), HAND_EDGES[edge_visible].tolist()):
+                    cv2.line(canvas, hand[e1].tolist(), hand[e2].tolist(), HAND_EDGE_COLORS[j], thickness=2)
+                stamp_disks(canvas, hand[hand_visible], np.array([0, 0, 255], dtype=np.uint8), 4)
+
+        if draw_face:
+            stamp_disks(canvas, points[i, face_start:face_end][inside[i, face_start:face_end]], np.array([255, 255, 255], dtype=np.uint8), 3)
+
+    return canvas
+
+
+def draw_pose_keypoints_batch(keypoints_batch: List[np.ndarray], H: int, W: int, draw_body: bool = True, draw_hand: bool = True, draw_face: bool = True, xinsr_stick_scaling: bool = False) -> np.ndarray:
+    """
+    Draw a list of [N, POSE_KEYPOINT_COUNT, 2] keypoint arrays (one per frame) on empty canvases.
+
+    Returns:
+        np.ndarray: A [B, H, W, 3] uint8 array.
+    """
+    canvas = np.zeros((len(keypoints_batch), H, W, 3), dtype=np.uint8)
+    for frame_canvas, keypoints in zip(canvas, keypoints_batch):
+        draw_pose_keypoints(frame_canvas, keypoints, draw_body, draw_hand, draw_face, xinsr_stick_scaling)
+    return canvas
+
+
 # detect hand according to body pose keypoints
 # please refer to https://github.com/CMU-Perceptual-Computing-Lab/openpose/blob/master/src/openpose/hand/handDetector.cpp
 def handDetect(body: BodyResult, oriImg) -> List[Tuple[int, int, int, bool]]:
@@ -1,13 +1,17 @@
 # Copyright (c) OpenMMLab. All rights reserved.
-import cv2
 import numpy as np
 
 from .dw_onnx.cv_ox_det import inference_detector as inference_onnx_yolox
+from .dw_onnx.cv_ox_det import inference_detector_batch as inference_onnx_yolox_batch
 from .dw_onnx.cv_ox_yolo_nas import inference_detector as inference_onnx_yolo_nas
 from .dw_onnx.cv_ox_pose import inference_pose as inference_onnx_pose
+from .dw_onnx.cv_ox_pose import inference_pose_batch as inference_onnx_pose_batch
+from .dw_onnx.session import get_onnx_session
 
 from .dw_torchscript.jit_det import inference_detector as inference_jit_yolox
+from .dw_torchscript.jit_det import inference_detector_batch as inference_jit_yolox_batch
 from .dw_torchscript.jit_pose import inference_pose as inference_jit_pose
+from .dw_torchscript.jit_pose import inference_pose_batch as inference_jit_pose_batch
 
 from typing import List, Optional
 from .types import PoseResult, BodyResult, Keypoint
@@ -24,51 +28,20 @@ class Wholebody:
         # return type: None ort cv2 torchscript
         self.det_model_type = get_model_type("DWPose",self.det_filename)
         self.pose_model_type = get_model_type("DWPose",self.pose_filename)
-        # Always loads to CPU to avoid building OpenCV.
-        cv2_device = 'cpu'
-        cv2_backend = cv2.dnn.DNN_BACKEND_OPENCV if cv2_device == 'cpu' else cv2.dnn.DNN_BACKEND_CUDA
-        # You need to manually build OpenCV through cmake to work with your GPU.
-        cv2_providers = cv2.dnn.DNN_TARGET_CPU if cv2_device == 'cpu' else cv2.dnn.DNN_TARGET_CUDA
         ort_providers = get_ort_providers()
 
         if self.det_model_type is None:
             pass
-        elif self.det_model_type == "ort":
-            try:
-                import onnxruntime as ort
-                self.det = ort.InferenceSession(det_model_path, providers=ort_providers)
-            except:
-                print(f"Failed to load onnxruntime with {self.det.get_providers()}.\nPlease change EP_list in the config.yaml and restart ComfyUI")
-                self.det = ort.InferenceSession(det_model_path, providers=["CPUExecutionProvider"])
-        elif self.det_model_type == "cv2":
-            try:
-                self.det = cv2.dnn.readNetFromONNX(det_model_path)
-                self.det.setPreferableBackend(cv2_backend)
-                self.det.setPreferableTarget(cv2_providers)
-            except:
-                print("TopK operators may not work on your OpenCV, try use onnxruntime with CPUExecutionProvider")
-                try:
-                    import onnxruntime as ort
-                    self.det = ort.InferenceSession(det_model_path, providers=["CPUExecutionProvider"])
-                except:
-                    print(f"Failed to load {det_model_path}, you can use other models instead")
+        elif self.det_model_type in ("ort", "cv2"):
+            self.det = get_onnx_session(det_model_path, self.det_model_type, ort_providers)
         else:
             self.det = torch.jit.load(det_model_path)
             self.det.to(torchscript_device)
 
         if self.pose_model_type is None:
             pass
-        elif self.pose_model_type == "ort":
-            try:
-                import onnxruntime as ort
-                self.pose = ort.InferenceSession(pose_model_path, providers=ort_providers)
-            except:
-                print(f"Failed to load onnxruntime with {self.pose.get_providers()}.\nPlease change EP_list in the config.yaml and restart ComfyUI")
-                self.pose = ort.InferenceSession(pose_model_path, providers=["CPUExecutionProvider"])
-        elif self.pose_model_type == "cv2":
-            self.pose = cv2.dnn.readNetFromONNX(pose_model_path)
-            self.pose.setPreferableBackend(cv2_backend)
-            self.pose.setPreferableTarget(cv2_providers)
+        elif self.pose_model_type in ("ort", "cv2"):
+            self.pose = get_onnx_session(pose_model_path, self.pose_model_type, ort_providers)
         else:
             self.pose = torch.jit.load(pose_model_path)
             self.pose.to(torchscript_device)
@@ -76,6 +49,13 @@ class Wholebody:
         if self.pose_filename is not None:
             self.pose_input_size, _ = guess_onnx_input_shape_dtype(self.pose_filename)
 
+    def to(self, device):
+        # only the TorchScript models live on a torch device, the onnx sessions keep their providers
+        for model in (self.det, self.pose):
+            if is_model_torchscript(model):
+                model.to(device)
+        return self
+
     def __call__(self, oriImg) -> Optional[np.ndarray]:
         #Sacrifice accurate time measurement for compatibility 
         
@@ -113,6 +93,44 @@ class Wholebody:
         
         print(f"DWPose: Pose {((default_timer() - pose_start) * 1000):.2f}ms on {num_subjects_log}\n")
 
+        return self.to_openpose_keypoints(keypoints, scores)
+
+    def call_batch(self, oriImgs) -> List[Optional[np.ndarray]]:
+        """
+        __call__ on a list of images: one detector run over all images (per image for YOLO-NAS, whose NMS is in
+        the graph) and one pose run over the person crops of all images.
+        """
+        if self.det is None:
+            det_results = [[] for _ in oriImgs]
+        else:
+            det_start = default_timer()
+            if is_model_torchscript(self.det):
+                det_results = inference_jit_yolox_batch(self.det, oriImgs, detect_classes=[0])
+            elif "yolox" in self.det_filename:
+                det_results = inference_onnx_yolox_batch(self.det, oriImgs, detect_classes=[0], dtype=np.float32)
+            else:
+                det_results = [inference_onnx_yolo_nas(self.det, oriImg, detect_classes=[0], dtype=np.uint8) for oriImg in oriImgs]
+            print(f"DWPose: Bbox {((default_timer() - det_start) * 1000):.2f}ms on {len(oriImgs)} images")
+
+        found = [i for i, det_result in enumerate(det_results) if self.det is None or (det_result is not None and len(det_result) > 0)]
+        keypoints_infos = [None] * len(oriImgs)
+        if not found:
+            return keypoints_infos
+
+        pose_start = default_timer()
+        if is_model_torchscript(self.pose):
+            results = inference_jit_pose_batch(self.pose, [det_results[i] for i in found], [oriImgs[i] for i in found], self.pose_input_size)
+        else:
+            _, pose_onnx_dtype = guess_onnx_input_shape_dtype(self.pose_filename)
+            results = inference_onnx_pose_batch(self.pose, [det_results[i] for i in found], [oriImgs[i] for i in found], self.pose_input_size, dtype=pose_onnx_dtype)
+        print(f"DWPose: Pose {((default_timer() - pose_start) * 1000):.2f}ms on {sum(len(keypoints) for keypoints, _ in results)} people in {len(found)} images\n")
+
+        for i, (keypoints, scores) in zip(found, results):
+            keypoints_infos[i] = self.to_openpose_keypoints(keypoints, scores)
+        return keypoints_infos
+
+    @staticmethod
+    def to_openpose_keypoints(keypoints: np.ndarray, scores: np.ndarray) -> np.ndarray:
         keypoints_info = np.concatenate(
             (keypoints, scores[..., None]), axis=-1)
         # compute neck joint
@@ -8,7 +8,7 @@ import torch.nn as nn
 from einops import rearrange
 from PIL import Image
 
-from custom_controlnet_aux.util import HWC3, resize_image_with_pad, common_input_validate, custom_hf_download, HF_MODEL_NAME
+from custom_controlnet_aux.util import HWC3, resize_image_with_pad, resize_image_with_pad_torch, common_input_validate, custom_hf_download, HF_MODEL_NAME
 
 norm_layer = nn.InstanceNorm2d
 
@@ -139,3 +139,10 @@ class LineartDetector:
             detected_map = Image.fromarray(detected_map)
             
         return detected_map
+
+    def batch_call(self, input_images, coarse=False, detect_resolution=512, upscale_method="INTER_CUBIC", **kwargs):
+        model = self.model_coarse if coarse else self.model
+        with torch.no_grad():
+            images, remove_pad = resize_image_with_pad_torch(input_images.to(self.device), detect_resolution, upscale_method)
+            line = model(images)[:, :1].clip(0, 1)
+        return remove_pad(1.0 - line).expand(-1, 3, -1, -1).movedim(1, -1)
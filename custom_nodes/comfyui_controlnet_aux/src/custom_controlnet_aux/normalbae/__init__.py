@@ -9,7 +9,7 @@ import torchvision.transforms as transforms
 from einops import rearrange
 from PIL import Image
 
-from custom_controlnet_aux.util import HWC3, common_input_validate, resize_image_with_pad, custom_hf_download, HF_MODEL_NAME
+from custom_controlnet_aux.util import HWC3, common_input_validate, resize_image_with_pad, resize_image_with_pad_torch, custom_hf_download, HF_MODEL_NAME
 from .nets.NNET import NNET
 
 
@@ -82,4 +82,11 @@ class NormalBaeDetector:
             detected_map = Image.fromarray(detected_map)
             
         return detected_map
-    
\ No newline at end of file
+    
+
+    def batch_call(self, input_images, detect_resolution=512, upscale_method="INTER_CUBIC", **kwargs):
+        with torch.no_grad():
+            images, remove_pad = resize_image_with_pad_torch(input_images.to(self.device), detect_resolution, upscale_method)
+            normal = self.model(self.norm(images))
+            normal = ((normal[0][-1][:, :3] + 1) * 0.5).clip(0, 1)
+        return remove_pad(normal).movedim(1, -1)
@@ -7,7 +7,7 @@ import torch
 from einops import rearrange
 from PIL import Image
 
-from custom_controlnet_aux.util import HWC3, nms, resize_image_with_pad, safe_step,common_input_validate, custom_hf_download, HF_MODEL_NAME
+from custom_controlnet_aux.util import HWC3, nms, resize_image_with_pad, resize_image_with_pad_torch, safe_step, safe_step_torch, common_input_validate, custom_hf_download, HF_MODEL_NAME
 from .model import pidinet
 
 
@@ -62,3 +62,16 @@ class PidiNetDetector:
             detected_map = Image.fromarray(detected_map)
 
         return detected_map
+
+    def batch_call(self, input_images, detect_resolution=512, safe=False, scribble=False, apply_filter=False, upscale_method="INTER_CUBIC", **kwargs):
+        if scribble:
+            raise NotImplementedError("scribble needs the per-image NMS")
+        with torch.no_grad():
+            images, remove_pad = resize_image_with_pad_torch(input_images.to(self.device), detect_resolution, upscale_method)
+            edge = self.netNetwork(images.flip(1))[-1]
+            if apply_filter:
+                edge = (edge > 0.5).float()
+            if safe:
+                edge = safe_step_torch(edge)
+            edge = edge.clip(0, 1)
+        return remove_pad(edge).expand(-1, 3, -1, -1).movedim(1, -1)
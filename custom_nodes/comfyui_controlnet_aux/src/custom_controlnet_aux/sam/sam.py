@@ -1,13 +1,16 @@
 """
 SAM implementation using HuggingFace transformers for PyTorch 2.7 compatibility.
 """
+import cv2
 import numpy as np
 import torch
 from PIL import Image
+from torchvision.ops.boxes import batched_nms
 from typing import Union
 
 # Import utilities
 from ..util import HWC3, common_input_validate, resize_image_with_pad
+from .utils.amg import batched_mask_to_box, calculate_stability_score
 
 
 class SamDetector:
@@ -19,6 +22,12 @@ class SamDetector:
         self.processor = SamProcessor.from_pretrained(model_name)
         self.model = SamModel.from_pretrained(model_name)
         self.device = "cpu"
+        # Prompts per mask decoder run, each one repeats the image embeddings
+        self.prompts_per_batch = 64
+        # Mask filtering, as in SamAutomaticMaskGenerator
+        self.stability_score_offset = 1.0
+        self.stability_score_thresh = 0.95
+        self.box_nms_thresh = 0.7
 
     @classmethod  
     def from_pretrained(cls, pretrained_model_or_path=None, model_type="vit_t", filename="mobile_sam.pt", subfolder=None):
@@ -70,87 +79,106 @@ class SamDetector:
                 y = max(5, min(height - 5, y + y_offset))
                 grid_points.append([x, y])
         
+        # Each prompt is a group of 16 points, decoded to one mask
         batch_size = 16
+        prompts = [grid_points[i:i + batch_size] for i in range(0, len(grid_points), batch_size)]
+
+        inputs = self.processor(images=pil_image, return_tensors="pt").to(self.device)
+        original_size = inputs["original_sizes"][0].tolist()
+        reshaped_size = inputs["reshaped_input_sizes"][0].tolist()
+
+        # Prompts are decoded together when they have the same number of points, only the last one can be shorter
+        full_prompts = len(grid_points) // batch_size
+        decode_batches = [prompts[i:min(i + self.prompts_per_batch, full_prompts)] for i in range(0, full_prompts, self.prompts_per_batch)]
+        if full_prompts < len(prompts):
+            decode_batches.append(prompts[full_prompts:])
+
+        with torch.no_grad():
+            # The ViT image encoder is the heavy part of SAM, run it once and decode every prompt against its embeddings
+            image_embeddings = self.model.get_image_embeddings(inputs["pixel_values"])
+            low_res_masks, iou_preds = map(torch.cat, zip(*[
+                self._decode_prompts(image_embeddings, decode_batch, original_size, reshaped_size)
+                for decode_batch in decode_batches
+            ]))
+            # One upsampling of all masks, on the model's device, keeping the logits for the stability score
+            mask_logits = self.processor.post_process_masks(low_res_masks[None, :, None], [original_size], [reshaped_size], binarize=False)[0][:, 0]
+
+        stability_scores = calculate_stability_score(mask_logits, 0.0, self.stability_score_offset)
+        masks = mask_logits > 0.0
+        del mask_logits
+
+        keep = (masks.flatten(1).sum(1) > 100) & (stability_scores >= self.stability_score_thresh)
+        keep = keep.nonzero()[:, 0]
+        # Drop the duplicate masks of neighbouring prompts
+        boxes = batched_mask_to_box(masks[keep])
+        keep_by_nms = batched_nms(boxes.float(), iou_preds[keep], torch.zeros_like(keep), iou_threshold=self.box_nms_thresh)
+        keep = keep[keep_by_nms.sort().values].tolist()
+        cleaned_masks = self._postprocess_masks(masks[keep])
+
         all_masks = []
-        
-        for i in range(0, len(grid_points), batch_size):
-            batch_points = grid_points[i:i + batch_size]
-            input_points = [batch_points]
-            
-            inputs = self.processor(
-                images=pil_image, 
-                input_points=input_points, 
-                return_tensors="pt"
-            ).to(self.device)
-            
-            with torch.no_grad():
-                outputs = self.model(**inputs)
-            
-            masks = self.processor.post_process_masks(
-                outputs.pred_masks, 
-                inputs["original_sizes"], 
-                inputs["reshaped_input_sizes"]
-            )[0]
-            
-            masks_np = masks.cpu().numpy()
-            
-            for j, mask in enumerate(masks_np):
-                mask_2d = mask[0] if len(mask.shape) > 2 else mask
-                area = int(mask_2d.sum())
-                
-                if area > 100:
-                    cleaned_mask = self._postprocess_mask(mask_2d)
-                    cleaned_area = int(cleaned_mask.sum())
-                    
-                    mask_dict = {
-                        'segmentation': cleaned_mask,
-                        'area': cleaned_area,
-                        'stability_score': 0.88,
-                        'point_coords': batch_points[j % len(batch_points)]
-                    }
-                    all_masks.append(mask_dict)
-        
+        for j, cleaned_mask in zip(keep, cleaned_masks):
+            mask_dict = {
+                'segmentation': cleaned_mask,
+                'area': int(cleaned_mask.sum()),
+                'predicted_iou': iou_preds[j].item(),
+                'stability_score': stability_scores[j].item(),
+                'point_coords': prompts[j][0]
+            }
+            all_masks.append(mask_dict)
+
         return all_masks
 
-    def _postprocess_mask(self, mask, min_region_area=100):
+    def _decode_prompts(self, image_embeddings, prompts, original_size, reshaped_size):
+        """
+        Low resolution masks [len(prompts), 256, 256] and predicted IoUs [len(prompts)] of point prompts that all
+        have the same number of points.
+        """
+        # Scale the points to the resized image like SamProcessor does
+        points = np.array(prompts, dtype=float)
+        points[..., 0] = points[..., 0] * (reshaped_size[1] / original_size[1])
+        points[..., 1] = points[..., 1] * (reshaped_size[0] / original_size[0])
+        outputs = self.model(image_embeddings=image_embeddings, input_points=torch.from_numpy(points)[None].to(self.device))
+        # First of the multimask outputs
+        return outputs.pred_masks[0, :, 0], outputs.iou_scores[0, :, 0]
+
+    def _postprocess_masks(self, masks):
+        """
+        Fill the holes of a [N, H, W] bool tensor of masks and smooth them like skimage.morphology's binary_closing
+        (disk(5)), binary_opening (disk(3)) and binary_closing (disk(5)), returns a [N, H, W] bool array.
+        """
         from scipy import ndimage
         from skimage import morphology
-        
-        binary_mask = mask.astype(bool)
-        
-        filled_mask = ndimage.binary_fill_holes(binary_mask)
-        
-        if filled_mask.any():
-            kernel_close = morphology.disk(5)
-            kernel_open = morphology.disk(3)
-            
-            smoothed_mask = morphology.binary_closing(filled_mask, kernel_close)
-            smoothed_mask = morphology.binary_opening(smoothed_mask, kernel_open)
-            smoothed_mask = morphology.binary_closing(smoothed_mask, kernel_close)
-        else:
-            smoothed_mask = filled_mask
-        
-        return smoothed_mask.astype(mask.dtype)
+
+        # No neighbours across masks, each one is filled on its own
+        structure = np.zeros((3, 3, 3), dtype=bool)
+        structure[1] = ndimage.generate_binary_structure(2, 1)
+        filled_masks = ndimage.binary_fill_holes(masks.cpu().numpy(), structure).astype(np.uint8)
+
+        # OpenCV's default borders match skimage: outside is False when dilating and True when eroding
+        kernel_close = morphology.disk(5).astype(np.uint8)
+        kernel_open = morphology.disk(3).astype(np.uint8)
+        smoothed_masks = np.empty_like(filled_masks)
+        for filled_mask, smoothed_mask in zip(filled_masks, smoothed_masks):
+            mask = cv2.morphologyEx(filled_mask, cv2.MORPH_CLOSE, kernel_close)
+            mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel_open)
+            smoothed_mask[:] = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel_close)
+        return smoothed_masks.astype(bool)
 
     def show_anns(self, anns):
         if len(anns) == 0:
             return None
         sorted_anns = sorted(anns, key=(lambda x: x['area']), reverse=True)
-        
-        h, w = anns[0]['segmentation'].shape
-        
-        final_img = Image.fromarray(np.zeros((h, w, 3), dtype=np.uint8), mode="RGB")
-        
-        for ann in sorted_anns:
-            m = ann['segmentation']
-            
-            img = np.empty((m.shape[0], m.shape[1], 3), dtype=np.uint8)
-            for i in range(3):
-                img[:,:,i] = np.random.randint(255, dtype=np.uint8)
-            
-            final_img.paste(Image.fromarray(img, mode="RGB"), (0, 0), Image.fromarray(np.uint8(m*255)))
-        
-        return np.array(final_img, dtype=np.uint8)
+
+        # Random colour of each mask, label 0 is the black background
+        palette = np.zeros((len(sorted_anns) + 1, 3), dtype=np.uint8)
+        for i in range(len(sorted_anns)):
+            for c in range(3):
+                palette[i + 1, c] = np.random.randint(255, dtype=np.uint8)
+
+        # Smaller masks are drawn over larger ones, so each pixel shows the last mask covering it
+        masks = torch.from_numpy(np.stack([ann['segmentation'] for ann in sorted_anns]))
+        labels = (masks * torch.arange(1, len(sorted_anns) + 1, dtype=torch.int16)[:, None, None]).amax(0)
+        return palette[labels.numpy()]
 
     def __call__(self, input_image: Union[np.ndarray, Image.Image]=None, detect_resolution=512, output_type="pil", upscale_method="INTER_CUBIC", **kwargs) -> Image.Image:
         input_image, output_type = common_input_validate(input_image, output_type, **kwargs)
@@ -117,20 +117,20 @@ def mask_to_rle_pytorch(tensor: torch.Tensor) -> List[Dict[str, Any]]:
     diff = tensor[:, 1:] ^ tensor[:, :-1]
     change_indices = diff.nonzero()
 
+    # Run boundaries of all masks in one sorted sequence: mask i starts at i*h*w,
+    # so consecutive differences are the run lengths of every mask in order
+    starts = torch.arange(b + 1, device=tensor.device) * (h * w)
+    changes = change_indices[:, 0] * (h * w) + change_indices[:, 1] + 1
+    boundaries = torch.cat([starts, changes]).sort().values
+    run_lengths = (boundaries[1:] - boundaries[:-1]).detach().cpu().tolist()
+    run_ends = (diff.sum(1) + 1).cumsum(0).detach().cpu().tolist()
+    first_values = tensor[:, 0].detach().cpu().tolist()
+
     # Encode run length
     out = []
     for i in range(b):
-        cur_idxs = change_indices[change_indices[:, 0] == i, 1]
-        cur_idxs = torch.cat(
-            [
-                torch.tensor([0], dtype=cur_idxs.dtype, device=cur_idxs.device),
-                cur_idxs + 1,
-                torch.tensor([h * w], dtype=cur_idxs.dtype, device=cur_idxs.device),
-            ]
-        )
-        btw_idxs = cur_idxs[1:] - cur_idxs[:-1]
-        counts = [] if tensor[i, 0] == 0 else [0]
-        counts.extend(btw_idxs.detach().cpu().tolist())
+        counts = [] if first_values[i] == 0 else [0]
+        counts.extend(run_lengths[run_ends[i - 1] if i > 0 else 0 : run_ends[i]])
         out.append({"size": [h, w], "counts": counts})
     return out
 
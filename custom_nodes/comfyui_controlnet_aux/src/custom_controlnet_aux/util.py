@@ -1,5 +1,6 @@
 import os
 import random
+import sys
 import tempfile
 import warnings
 from contextlib import suppress
@@ -79,6 +80,16 @@ def HWC3(x):
         return y
 
 
+def HWC3_torch(x):
+    """HWC3 for [..., H, W, C] float tensors in [0, 1]; 3 channels are returned as is and 1 channel as an expanded view."""
+    if x.shape[-1] == 3:
+        return x
+    if x.shape[-1] == 1:
+        return x.expand(*x.shape[:-1], 3)
+    assert x.shape[-1] == 4
+    return (x[..., :3] * x[..., 3:] + (1.0 - x[..., 3:])).clamp(0, 1)
+
+
 def make_noise_disk(H, W, C, F, rng=None):
     if rng:
         noise = rng.uniform(low=0, high=1, size=((H // F) + 2, (W // F) + 2, C))
@@ -138,9 +149,13 @@ def img2mask(img, H, W, low=10, high=90):
 
     return y < np.percentile(y, random.randrange(low, high))
 
+IS_MACOS = sys.platform == "darwin"
+
 def safer_memory(x):
     # Fix many MAC/AMD problems
-    return np.ascontiguousarray(x.copy()).copy()
+    if IS_MACOS:
+        return np.ascontiguousarray(x.copy()).copy()
+    return np.ascontiguousarray(x)
 
 UPSCALE_METHODS = ["INTER_NEAREST", "INTER_LINEAR", "INTER_AREA", "INTER_CUBIC", "INTER_LANCZOS4"]
 def get_upscale_method(method_str):
@@ -163,15 +178,86 @@ def resize_image_with_pad(input_image, resolution, upscale_method = "", skip_hwc
     k = float(resolution) / float(min(H_raw, W_raw))
     H_target = int(np.round(float(H_raw) * k))
     W_target = int(np.round(float(W_raw) * k))
-    img = cv2.resize(img, (W_target, H_target), interpolation=get_upscale_method(upscale_method) if k > 1 else cv2.INTER_AREA)
     H_pad, W_pad = pad64(H_target), pad64(W_target)
-    img_padded = np.pad(img, [[0, H_pad], [0, W_pad], [0, 0]], mode=mode)
+    # cv2.resize and np.pad both return new arrays, only copy when neither has to run
+    if (H_target, W_target) != (H_raw, W_raw):
+        img = cv2.resize(img, (W_target, H_target), interpolation=get_upscale_method(upscale_method) if k > 1 else cv2.INTER_AREA)
+    elif H_pad == 0 and W_pad == 0 and img is input_image:
+        img = img.copy()
+    if H_pad or W_pad:
+        img = np.pad(img, [[0, H_pad], [0, W_pad], [0, 0]], mode=mode)
 
     def remove_pad(x):
         return safer_memory(x[:H_target, :W_target, ...])
 
-    return safer_memory(img_padded), remove_pad
-    
+    return safer_memory(img), remove_pad
+
+#Closest torch interpolation for each cv2 flag. Downscaling always uses "area" like the NumPy path
+TORCH_UPSCALE_METHODS = dict(INTER_NEAREST="nearest-exact", INTER_LINEAR="bilinear", INTER_AREA="area", INTER_CUBIC="bicubic", INTER_LANCZOS4="bicubic")
+def resize_image_with_pad_torch(input_images, resolution, upscale_method="", skip_hwc3=False, mode='edge'):
+    """
+    Batched resize_image_with_pad for [B, H, W, C] float tensors in [0, 1] on any device.
+    Returns a padded [B, C, H, W] tensor and a remove_pad that slices (without copying) a [..., H, W] result.
+    Nothing is allocated when the images are already at the target size and a multiple of 64.
+    """
+    img = (input_images if skip_hwc3 else HWC3_torch(input_images)).movedim(-1, 1)
+    H_raw, W_raw = img.shape[-2:]
+    if resolution == 0:
+        return img, lambda x: x
+    k = float(resolution) / float(min(H_raw, W_raw))
+    H_target = int(np.round(float(H_raw) * k))
+    W_target = int(np.round(float(W_raw) * k))
+    if (H_target, W_target) != (H_raw, W_raw):
+        interpolation = TORCH_UPSCALE_METHODS.get(upscale_method, "bicubic") if k > 1 else "area"
+        img = torch.nn.functional.interpolate(img, size=(H_target, W_target), mode=interpolation, **({"align_corners": False} if interpolation in ("bilinear", "bicubic") else {}))
+        if interpolation == "bicubic":
+            img = img.clamp(0, 1)
+    H_pad, W_pad = pad64(H_target), pad64(W_target)
+    if H_pad or W_pad:
+        img = torch.nn.functional.pad(img, (0, W_pad, 0, H_pad), mode={"edge": "replicate"}.get(mode, mode))
+
+    def remove_pad(x):
+        return x[..., :H_target, :W_target]
+
+    return img, remove_pad
+
+def dpt_preprocess_torch(images, image_processor):
+    """
+    Batched equivalent of a transformers DPTImageProcessor on [B, C, H, W] tensors in [0, 1], on their device.
+    """
+    H, W = images.shape[-2:]
+    size = image_processor.size
+    multiple = getattr(image_processor, "ensure_multiple_of", 1)
+    scale_height, scale_width = size["height"] / H, size["width"] / W
+    if getattr(image_processor, "keep_aspect_ratio", False):
+        if abs(1 - scale_width) < abs(1 - scale_height):
+            scale_height = scale_width
+        else:
+            scale_width = scale_height
+
+    def constrain_to_multiple_of(val):
+        return max(round(val / multiple), 1) * multiple
+
+    if getattr(image_processor, "do_resize", True):
+        images = torch.nn.functional.interpolate(images, size=(constrain_to_multiple_of(scale_height * H), constrain_to_multiple_of(scale_width * W)), mode="bicubic", align_corners=False, antialias=True).clamp(0, 1)
+    if getattr(image_processor, "do_normalize", True):
+        mean = torch.tensor(image_processor.image_mean, dtype=images.dtype, device=images.device).view(1, -1, 1, 1)
+        std = torch.tensor(image_processor.image_std, dtype=images.dtype, device=images.device).view(1, -1, 1, 1)
+        images = (images - mean) / std
+    return images
+
+def min_max_norm_torch(x):
+    # like the per-image depth maps: no epsilon, a constant map is 0 like the uint8 cast of its NaNs
+    x = x - x.amin(dim=(-2, -1), keepdim=True)
+    return torch.nan_to_num(x / x.amax(dim=(-2, -1), keepdim=True), nan=0.0)
+
+def to_uint8_levels_torch(x):
+    # the .clip(0, 255).astype(np.uint8) of the per-image paths, as floats in [0, 1]
+    return torch.floor(x * 255.0).clip(0, 255) / 255.0
+
+def safe_step_torch(x, step=2):
+    return torch.floor(x * float(step + 1)) / float(step)
+
 def common_input_validate(input_image, output_type, **kwargs):
     if "img" in kwargs:
             warnings.warn("img is deprecated, please use `input_image=...` instead.", DeprecationWarning)
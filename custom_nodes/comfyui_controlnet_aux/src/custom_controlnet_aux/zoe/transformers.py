@@ -3,6 +3,8 @@ ZoeDepth implementation using HuggingFace transformers.
 Uses official Intel models for depth estimation.
 """
 
+import sys
+
 import numpy as np
 import torch
 from PIL import Image
@@ -31,7 +33,10 @@ def pad64(x):
     return int(np.ceil(float(x) / 64.0) * 64 - x)
 
 def safer_memory(x):
-    return np.ascontiguousarray(x.copy()).copy()
+    # The extra copies are only needed on Mac
+    if sys.platform == "darwin":
+        return np.ascontiguousarray(x.copy()).copy()
+    return np.ascontiguousarray(x)
 
 def resize_image_with_pad(input_image, resolution, upscale_method="INTER_CUBIC", skip_hwc3=False, mode='edge'):
     import cv2
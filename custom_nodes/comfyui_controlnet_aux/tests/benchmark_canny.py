@@ -0,0 +1,67 @@
+"""
+Throughput of the OpenCV Canny preprocessor (one cv2.Canny per frame) against the batched torch backend.
+
+    python tests/benchmark_canny.py [--device cuda] [--batches 1 8 64 512] [--sizes 512 1024] [--chunk 64]
+
+Frames are synthetic shapes. Both backends get the same uint8 frames at the detect resolution, so only the
+edge detection and the host/device transfers are timed. The torch backend runs --chunk frames per pass.
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+import torch
+
+from custom_controlnet_aux.canny import canny_torch
+
+def synthetic_frames(batch, size, seed=0):
+    rng = np.random.default_rng(seed)
+    frames = np.zeros((batch, size, size, 3), dtype=np.uint8)
+    for frame in frames:
+        for _ in range(20):
+            center = tuple(int(v) for v in rng.integers(0, size, 2))
+            cv2.circle(frame, center, int(rng.integers(size // 32, size // 4)), tuple(int(v) for v in rng.integers(0, 256, 3)), -1)
+    return frames
+
+def opencv_canny(frames, low_threshold, high_threshold):
+    return np.stack([cv2.Canny(frame, low_threshold, high_threshold) for frame in frames])
+
+def torch_canny(frames, low_threshold, high_threshold, device, chunk):
+    out = []
+    for i in range(0, len(frames), chunk):
+        images = torch.from_numpy(frames[i:i + chunk]).to(device).permute(0, 3, 1, 2)
+        out.append(canny_torch(images, low_threshold, high_threshold).cpu())
+    return torch.cat(out)
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--batches", type=int, nargs="+", default=[1, 8, 64, 512])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[512, 1024])
+    parser.add_argument("--chunk", type=int, default=64)
+    parser.add_argument("--low-threshold", type=int, default=100)
+    parser.add_argument("--high-threshold", type=int, default=200)
+    args = parser.parse_args()
+    device = torch.device(args.device)
+
+    print(f"{'size':>6}{'batch':>7}{'opencv fps':>12}{'torch fps':>12}{'speedup':>9}{'IoU':>8}")
+    for size in args.sizes:
+        for batch in args.batches:
+            frames = synthetic_frames(batch, size)
+            torch_canny(frames[:1], args.low_threshold, args.high_threshold, device, args.chunk) # warm up
+            expected, opencv_seconds = timed(lambda: opencv_canny(frames, args.low_threshold, args.high_threshold))
+            result, torch_seconds = timed(lambda: torch_canny(frames, args.low_threshold, args.high_threshold, device, args.chunk))
+            expected, result = expected > 0, result[:, 0].numpy()
+            iou = (expected & result).sum() / max((expected | result).sum(), 1)
+            print(f"{size:>6}{batch:>7}{batch / opencv_seconds:>12.1f}{batch / torch_seconds:>12.1f}{opencv_seconds / torch_seconds:>9.2f}{iou:>8.4f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Latency and keypoint accuracy of DWPose with pose_detect_resolution (detect on a bounded image, draw at the output
+size) against the full size path, by input size.
+
+    python tests/benchmark_dwpose_resolution.py [--image tests/pose.png] [--sizes 1024 2048 4096] [--pose-detect-resolution 1024]
+
+The test image is upscaled so that its longer side is each --size, like a large product or lifestyle photo.
+Accuracy compares the keypoints of both paths in input pixels: the mean distance over keypoints found by both,
+as a fraction of the person's bounding box diagonal, and the share of keypoints found by only one of them.
+"""
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+
+from custom_controlnet_aux.dwpose import DwposeDetector
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def keypoint_arrays(pose_dict):
+    people = []
+    for person in pose_dict["people"]:
+        parts = [person[key] for key in ("pose_keypoints_2d", "hand_left_keypoints_2d", "hand_right_keypoints_2d", "face_keypoints_2d")]
+        people.append(np.concatenate([np.reshape(part, (-1, 3)) if part else np.zeros((0, 3)) for part in parts]))
+    return people
+
+def compare(reference, result):
+    """Pairs people by the closest mean keypoint, returns (mean normalized error, mismatched keypoint share)."""
+    errors, mismatched, total = [], 0, 0
+    result = list(result)
+    for ref in reference:
+        visible = ref[:, 2] > 0
+        if not visible.any() or not result:
+            continue
+        center = ref[visible, :2].mean(axis=0)
+        other = min(result, key=lambda r: np.linalg.norm(r[r[:, 2] > 0, :2].mean(axis=0) - center) if (r[:, 2] > 0).any() else np.inf)
+        result.remove(other)
+        if len(other) != len(ref):
+            continue
+        both = visible & (other[:, 2] > 0)
+        diagonal = np.linalg.norm(ref[visible, :2].max(axis=0) - ref[visible, :2].min(axis=0)) or 1.0
+        errors.append(np.linalg.norm(ref[both, :2] - other[both, :2], axis=1) / diagonal)
+        mismatched += int((visible != (other[:, 2] > 0)).sum())
+        total += len(ref)
+    error = float(np.concatenate(errors).mean()) if errors else float("nan")
+    return error, mismatched / max(total, 1)
+
+def timed(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return result, min(times)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--image", default=os.path.join(HERE, "pose.png"))
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1024, 2048, 4096])
+    parser.add_argument("--pose-detect-resolution", type=int, default=1024)
+    parser.add_argument("--detect-resolution", type=int, default=512)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--bbox-detector", default="yolox_l.onnx")
+    parser.add_argument("--pose-estimator", default="dw-ll_ucoco_384.onnx")
+    args = parser.parse_args()
+
+    model = DwposeDetector.from_pretrained("yzd-v/DWPose", "yzd-v/DWPose", det_filename=args.bbox_detector, pose_filename=args.pose_estimator)
+    image = cv2.cvtColor(cv2.imread(args.image), cv2.COLOR_BGR2RGB)
+    common = dict(detect_resolution=args.detect_resolution, include_hand=True, include_face=True, output_type="np", image_and_json=True)
+
+    print(f"{'input':>11}{'full ms':>10}{'bounded ms':>12}{'speedup':>9}{'error':>9}{'mismatch':>10}")
+    for size in args.sizes:
+        k = size / max(image.shape[:2])
+        frame = cv2.resize(image, (round(image.shape[1] * k), round(image.shape[0] * k)), interpolation=cv2.INTER_CUBIC)
+        model(frame, **common) # warm up
+        (_, full_dict), full_seconds = timed(lambda: model(frame, **common), args.repeats)
+        (_, bounded_dict), bounded_seconds = timed(lambda: model(frame, pose_detect_resolution=args.pose_detect_resolution, **common), args.repeats)
+        error, mismatch = compare(keypoint_arrays(full_dict), keypoint_arrays(bounded_dict))
+        print(f"{frame.shape[1]:>5}x{frame.shape[0]:<5}{full_seconds * 1000:>10.1f}{bounded_seconds * 1000:>12.1f}{full_seconds / bounded_seconds:>9.2f}{error:>9.4f}{mismatch:>10.3f}")
+
+if __name__ == "__main__":
+    main()
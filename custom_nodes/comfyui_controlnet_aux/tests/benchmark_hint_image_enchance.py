@@ -0,0 +1,71 @@
+"""
+Frames/s of HintImageEnchance on a batch against the previous behaviour: one frame at a time, with the
+unique colour count done by get_unique_axis0 (a lexsort of every pixel).
+
+    python custom_nodes/comfyui_controlnet_aux/tests/benchmark_hint_image_enchance.py [--batches 16 64] [--size 512] [--target 1024]
+
+Run it from the ComfyUI root so that the node package and comfy import. Hints are synthetic one-pixel edges
+(binary, NMS + thinning), segmentation maps (INTER_NEAREST) and smooth photos (INTER_CUBIC / INTER_AREA).
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+import torch
+
+sys.path.insert(0, os.getcwd())
+import custom_nodes.comfyui_controlnet_aux.hint_image_enchance as hint_image_enchance
+from custom_nodes.comfyui_controlnet_aux.utils import get_unique_axis0
+
+def synthetic_hints(kind, batch, size, seed=0):
+    rng = np.random.default_rng(seed)
+    frames = np.zeros((batch, size, size, 3), dtype=np.uint8)
+    for frame in frames:
+        if kind == "edges":
+            for _ in range(60):
+                points = rng.integers(0, size, (3, 2)).astype(np.int32)
+                cv2.polylines(frame, [points], False, (255, 255, 255), 1)
+        elif kind == "seg":
+            for _ in range(30):
+                start, end = rng.integers(0, size, (2, 2))
+                cv2.rectangle(frame, tuple(int(v) for v in start), tuple(int(v) for v in end), tuple(int(v) for v in rng.integers(0, 256, 3)), -1)
+        else:
+            frame[:] = cv2.GaussianBlur(rng.integers(0, 256, (size, size, 3)).astype(np.uint8), (15, 15), 0)
+    return torch.from_numpy(frames.astype(np.float32) / 255.0)
+
+def legacy_execute(node, hints, width, height, resize_mode):
+    count_unique_colors = hint_image_enchance.count_unique_colors
+    hint_image_enchance.count_unique_colors = lambda x: len(get_unique_axis0(x.reshape(-1, x.shape[2])))
+    try:
+        return torch.cat([node.execute(hint[None], width, height, resize_mode)[0] for hint in hints])
+    finally:
+        hint_image_enchance.count_unique_colors = count_unique_colors
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batches", type=int, nargs="+", default=[16, 64])
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument("--target", type=int, default=1024)
+    parser.add_argument("--kinds", nargs="+", default=["edges", "seg", "photo"])
+    parser.add_argument("--resize-mode", default="Just Resize")
+    args = parser.parse_args()
+    node = hint_image_enchance.HintImageEnchance()
+
+    print(f"{'kind':>6}{'batch':>7}{'legacy fps':>12}{'batched fps':>13}{'speedup':>9}  identical")
+    for kind in args.kinds:
+        for batch in args.batches:
+            hints = synthetic_hints(kind, batch, args.size)
+            expected, legacy_seconds = timed(lambda: legacy_execute(node, hints, args.target, args.target, args.resize_mode))
+            (result,), batched_seconds = timed(lambda: node.execute(hints, args.target, args.target, args.resize_mode))
+            print(f"{kind:>6}{batch:>7}{batch / legacy_seconds:>12.2f}{batch / batched_seconds:>13.2f}{legacy_seconds / batched_seconds:>9.2f}  {torch.equal(expected, result)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Micro-benchmark of resize_image_with_pad (NumPy) against resize_image_with_pad_torch on 1024x1024 images.
+
+    python tests/benchmark_resize_image_with_pad.py [--batch 16] [--iterations 20]
+
+Throughput is input MB/s including remove_pad. Allocations are the number of blocks and the peak bytes
+allocated per image: tracemalloc for NumPy, the CUDA caching allocator for torch (not tracked on CPU).
+"""
+import argparse
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+import torch
+
+from custom_controlnet_aux.util import HWC3, pad64, get_upscale_method, resize_image_with_pad, resize_image_with_pad_torch
+
+def legacy_resize_image_with_pad(input_image, resolution, upscale_method=""):
+    # resize_image_with_pad before the copies were trimmed, for reference
+    img = HWC3(input_image)
+    H_raw, W_raw, _ = img.shape
+    k = float(resolution) / float(min(H_raw, W_raw))
+    H_target = int(np.round(float(H_raw) * k))
+    W_target = int(np.round(float(W_raw) * k))
+    img = cv2.resize(img, (W_target, H_target), interpolation=get_upscale_method(upscale_method) if k > 1 else cv2.INTER_AREA)
+    H_pad, W_pad = pad64(H_target), pad64(W_target)
+    img_padded = np.pad(img, [[0, H_pad], [0, W_pad], [0, 0]], mode='edge')
+    safer_memory = lambda x: np.ascontiguousarray(x.copy()).copy()
+    return safer_memory(img_padded), lambda x: safer_memory(x[:H_target, :W_target, ...])
+
+def numpy_case(fn, resolution):
+    image = np.random.randint(0, 256, (1024, 1024, 3), dtype=np.uint8)
+    def run():
+        padded, remove_pad = fn(image, resolution, "INTER_CUBIC")
+        return remove_pad(padded)
+    return run, image.nbytes
+
+def torch_case(device, resolution, batch):
+    images = torch.rand(batch, 1024, 1024, 3, device=device)
+    def run():
+        padded, remove_pad = resize_image_with_pad_torch(images, resolution, "INTER_CUBIC")
+        out = remove_pad(padded)
+        if device.type == "cuda":
+            torch.cuda.synchronize()
+        return out
+    return run, images[0].numel()
+
+def measure(run, iterations):
+    run()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        run()
+    return (time.perf_counter() - start) / iterations
+
+def numpy_allocations(run):
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = len(tracemalloc.take_snapshot().traces)
+    out = run()
+    blocks = len(tracemalloc.take_snapshot().traces) - before
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del out
+    return blocks, peak
+
+def cuda_allocations(run, batch):
+    torch.cuda.synchronize()
+    torch.cuda.reset_peak_memory_stats()
+    before = torch.cuda.memory_stats()["allocation.all.allocated"]
+    base = torch.cuda.memory_allocated()
+    out = run()
+    blocks = torch.cuda.memory_stats()["allocation.all.allocated"] - before
+    peak = torch.cuda.max_memory_allocated() - base
+    del out
+    return blocks / batch, peak / batch
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch", type=int, default=16)
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    devices = [torch.device("cpu")] + ([torch.device("cuda")] if torch.cuda.is_available() else [])
+    print(f"{'implementation':<26}{'resolution':>11}{'MB/s':>10}{'allocs/img':>12}{'peak MB/img':>13}")
+    for resolution in (512, 1000, 1024, 1536):
+        for name, fn in (("numpy (legacy)", legacy_resize_image_with_pad), ("numpy", resize_image_with_pad)):
+            run, nbytes = numpy_case(fn, resolution)
+            seconds = measure(run, args.iterations)
+            blocks, peak = numpy_allocations(run)
+            print(f"{name:<26}{resolution:>11}{nbytes / seconds / 2**20:>10.0f}{blocks:>12}{peak / 2**20:>13.1f}")
+        for device in devices:
+            # float32 on the device; MB/s counts the equivalent uint8 input so the numbers compare
+            run, nbytes = torch_case(device, resolution, args.batch)
+            seconds = measure(run, args.iterations) / args.batch
+            blocks, peak = cuda_allocations(run, args.batch) if device.type == "cuda" else ("-", None)
+            peak = f"{peak / 2**20:.1f}" if peak is not None else "-"
+            print(f"{'torch ' + device.type + f' (batch {args.batch})':<26}{resolution:>11}{nbytes / seconds / 2**20:>10.0f}{blocks:>12}{peak:>13}")
+
+if __name__ == "__main__":
+    main()
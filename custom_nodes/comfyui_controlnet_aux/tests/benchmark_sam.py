@@ -0,0 +1,110 @@
+"""
+Benchmark of SamDetector.generate_automatic_masks against the previous implementation, which ran the whole
+SAM model (image encoder included) for every batch of 16 grid points and cleaned each mask with skimage.
+
+    python tests/benchmark_sam.py [--model facebook/sam-vit-base] [--size 512x768] [--device cpu] [--iterations 1]
+
+The grid has 8 to 24 points per side depending on the image size, so the legacy path runs the image encoder
+4 times at 512x768 and 36 times from 1536x1536 up.
+
+--random-weights builds the model from the default SamConfig instead of downloading it, the masks are
+meaningless but the amount of work is the same as facebook/sam-vit-base.
+"""
+import argparse
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+
+from custom_controlnet_aux.sam.sam import SamDetector
+
+def legacy_postprocess_mask(mask):
+    from scipy import ndimage
+    from skimage import morphology
+    filled_mask = ndimage.binary_fill_holes(mask.astype(bool))
+    if not filled_mask.any():
+        return filled_mask
+    smoothed_mask = morphology.binary_closing(filled_mask, morphology.disk(5))
+    smoothed_mask = morphology.binary_opening(smoothed_mask, morphology.disk(3))
+    return morphology.binary_closing(smoothed_mask, morphology.disk(5))
+
+def legacy_generate_automatic_masks(detector, input_image):
+    # generate_automatic_masks before the image embeddings were shared between prompts, for reference
+    pil_image = Image.fromarray(input_image)
+    width, height = pil_image.size
+    points_per_side = max(8, min(24, width // 64, height // 64))
+    grid_points = []
+    for i in range(points_per_side):
+        for j in range(points_per_side):
+            x = int((j + 0.5) * width / points_per_side)
+            y = int((i + 0.5) * height / points_per_side)
+            x_offset = int((np.random.random() - 0.5) * (width / points_per_side * 0.3))
+            y_offset = int((np.random.random() - 0.5) * (height / points_per_side * 0.3))
+            grid_points.append([max(5, min(width - 5, x + x_offset)), max(5, min(height - 5, y + y_offset))])
+
+    all_masks = []
+    for i in range(0, len(grid_points), 16):
+        batch_points = grid_points[i:i + 16]
+        inputs = detector.processor(images=pil_image, input_points=[batch_points], return_tensors="pt").to(detector.device)
+        with torch.no_grad():
+            outputs = detector.model(**inputs)
+        masks = detector.processor.post_process_masks(outputs.pred_masks, inputs["original_sizes"], inputs["reshaped_input_sizes"])[0]
+        for j, mask in enumerate(masks.cpu().numpy()):
+            if int(mask[0].sum()) > 100:
+                cleaned_mask = legacy_postprocess_mask(mask[0])
+                all_masks.append({'segmentation': cleaned_mask, 'area': int(cleaned_mask.sum()), 'point_coords': batch_points[j % len(batch_points)]})
+    return all_masks
+
+def load_detector(model_name, random_weights):
+    if not random_weights:
+        return SamDetector(model_name)
+    from transformers import SamConfig, SamModel, SamProcessor
+    from transformers.models.sam.image_processing_sam import SamImageProcessor
+    detector = object.__new__(SamDetector)
+    detector.model_name = "random"
+    detector.processor = SamProcessor(SamImageProcessor())
+    detector.model = SamModel(SamConfig()).eval()
+    detector.device = "cpu"
+    detector.prompts_per_batch = 64
+    detector.stability_score_offset, detector.stability_score_thresh, detector.box_nms_thresh = 1.0, 0.95, 0.7
+    return detector
+
+def measure(fn, detector, image, iterations):
+    seconds = []
+    for _ in range(iterations):
+        np.random.seed(0)
+        start = time.perf_counter()
+        masks = fn(detector, image)
+        if detector.device != "cpu" and torch.cuda.is_available():
+            torch.cuda.synchronize()
+        seconds.append(time.perf_counter() - start)
+    return min(seconds), masks
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="facebook/sam-vit-base")
+    parser.add_argument("--random-weights", action="store_true")
+    parser.add_argument("--size", default="512x768", help="HxW of the test image")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--iterations", type=int, default=1)
+    args = parser.parse_args()
+
+    H, W = map(int, args.size.split("x"))
+    image = np.random.default_rng(0).integers(0, 256, (H, W, 3), dtype=np.uint8)
+    detector = load_detector(args.model, args.random_weights).to(args.device)
+
+    legacy_seconds, legacy_masks = measure(legacy_generate_automatic_masks, detector, image, args.iterations)
+    filtered_seconds, filtered_masks = measure(SamDetector.generate_automatic_masks, detector, image, args.iterations)
+    # Without the stability score and NMS filtering the masks are the legacy ones
+    detector.stability_score_thresh, detector.box_nms_thresh = 0.0, 1.0
+    seconds, masks = measure(SamDetector.generate_automatic_masks, detector, image, args.iterations)
+    same = len(masks) == len(legacy_masks) and all(np.array_equal(a['segmentation'], b['segmentation']) for a, b in zip(masks, legacy_masks))
+    print(f"{'implementation':<28}{'seconds':>10}{'masks':>8}")
+    print(f"{'per batch encoder (legacy)':<28}{legacy_seconds:>10.2f}{len(legacy_masks):>8}")
+    print(f"{'encode once, no filtering':<28}{seconds:>10.2f}{len(masks):>8}")
+    print(f"{'encode once':<28}{filtered_seconds:>10.2f}{len(filtered_masks):>8}")
+    print(f"speedup {legacy_seconds / seconds:.1f}x, same masks without filtering: {same}")
+
+if __name__ == "__main__":
+    main()
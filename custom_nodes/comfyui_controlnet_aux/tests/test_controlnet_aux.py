@@ -13,6 +13,7 @@ from custom_controlnet_aux import (CannyDetector, ContentShuffleDetector, HEDdet
                             MidasDetector, MLSDdetector, NormalBaeDetector,
                             OpenposeDetector, PidiNetDetector, SamDetector,
                             ZoeDetector, TileDetector)
+from custom_controlnet_aux.canny import TorchCannyDetector
 
 OUTPUT_DIR = "tests/outputs"
 
@@ -45,6 +46,16 @@ def test_canny(img):
     common("canny", canny, img)
     output("canny_img", canny(img=img))
 
+def test_canny_torch(img):
+    canny_torch = TorchCannyDetector()
+    common("canny_torch", canny_torch, img)
+    image = np.array(img, dtype=np.uint8)
+    for low_threshold, high_threshold in [(100, 200), (50, 100), (10, 30)]:
+        expected = CannyDetector()(image, low_threshold, high_threshold, output_type="np") > 0
+        result = canny_torch(image, low_threshold, high_threshold, output_type="np") > 0
+        iou = (expected & result).sum() / max((expected | result).sum(), 1)
+        assert iou > 0.99, f"edge-pixel IoU {iou:.4f} against OpenCV for thresholds {low_threshold}/{high_threshold}"
+
 def test_hed(img):
     hed = HEDdetector.from_pretrained("lllyasviel/Annotators")
     common("hed", hed, img)
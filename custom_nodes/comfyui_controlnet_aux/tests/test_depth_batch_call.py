@@ -0,0 +1,51 @@
+import cv2
+import numpy as np
+import pytest
+import torch
+
+from custom_controlnet_aux.depth_anything import DepthAnythingDetector
+from custom_controlnet_aux.midas.transformers import MidasDetector
+
+transformers = pytest.importorskip("transformers")
+
+# Small random DPT heads: batch_call against the per-image __call__ of the same weights on fixed frames
+TINY_DPT = dict(hidden_size=32, num_hidden_layers=4, num_attention_heads=2, intermediate_size=64, neck_hidden_sizes=[16, 32, 64, 64], fusion_hidden_size=16)
+
+def depth_frames():
+    rng = np.random.default_rng(0)
+    return np.stack([cv2.resize(rng.integers(0, 256, (12, 16, 3), dtype=np.uint8), (512, 384), interpolation=cv2.INTER_CUBIC) for _ in range(3)])
+
+def assert_batch_call_matches(detector, max_error, mean_error):
+    frames = depth_frames()
+    expected = np.stack([detector(frame, detect_resolution=512, output_type="np") for frame in frames]).astype(np.float32)
+    result = detector.batch_call(torch.from_numpy(frames).float() / 255, detect_resolution=512).numpy() * 255
+    assert result.shape == expected.shape
+    # only the resizes differ (OpenCV and PIL against torch), both paths normalize and truncate to 8 bit the same way
+    error = np.abs(result - expected)
+    assert error.max() <= max_error and error.mean() <= mean_error, f"max {error.max():.2f}, mean {error.mean():.3f}"
+
+def test_midas_batch_call():
+    torch.manual_seed(0)
+    midas = object.__new__(MidasDetector)
+    midas.model = transformers.DPTForDepthEstimation(transformers.DPTConfig(backbone_out_indices=[0, 1, 2, 3], image_size=384, **TINY_DPT)).eval()
+    midas.processor = transformers.DPTImageProcessor(size={"height": 384, "width": 384})
+    midas.device = "cpu"
+    assert_batch_call_matches(midas, max_error=4, mean_error=0.5)
+
+def test_depth_anything_batch_call():
+    torch.manual_seed(0)
+    backbone = transformers.Dinov2Config(hidden_size=32, num_hidden_layers=4, num_attention_heads=2, intermediate_size=64, out_features=["stage1", "stage2", "stage3", "stage4"], reshape_hidden_states=False, image_size=518, patch_size=14)
+    config = transformers.DepthAnythingConfig(backbone_config=backbone, neck_hidden_sizes=[16, 32, 64, 64], fusion_hidden_size=16, reassemble_hidden_size=32)
+    depth_anything = object.__new__(DepthAnythingDetector)
+    image_processor = transformers.DPTImageProcessor(size={"height": 518, "width": 518}, keep_aspect_ratio=True, ensure_multiple_of=14)
+    depth_anything.pipe = transformers.pipeline("depth-estimation", model=transformers.DepthAnythingForDepthEstimation(config).eval(), image_processor=image_processor, device="cpu")
+    depth_anything.device = "cpu"
+    assert_batch_call_matches(depth_anything, max_error=12, mean_error=1.0)
+
+def test_constant_depth_is_black():
+    # the per-image paths turn 0 / 0 into a black map, the batched normalization too
+    from custom_controlnet_aux.util import min_max_norm_torch, to_uint8_levels_torch
+    depth = torch.cat([torch.full((1, 1, 4, 4), 3.0), torch.arange(16.0).view(1, 1, 4, 4)])
+    out = to_uint8_levels_torch(min_max_norm_torch(depth))
+    assert torch.equal(out[0], torch.zeros(1, 4, 4))
+    assert out[1].min() == 0 and out[1].max() == 1
@@ -0,0 +1,61 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from custom_controlnet_aux.dwpose import draw_poses, draw_poses_batch, util
+from custom_controlnet_aux.dwpose.types import BodyResult, Keypoint, PoseResult
+
+def draw_poses_per_part(poses, H, W, draw_body=True, draw_hand=True, draw_face=True, xinsr_stick_scaling=False):
+    canvas = np.zeros((H, W, 3), dtype=np.uint8)
+    for pose in poses:
+        if draw_body:
+            canvas = util.draw_bodypose(canvas, pose.body.keypoints, xinsr_stick_scaling)
+        if draw_hand:
+            canvas = util.draw_handpose(canvas, pose.left_hand)
+            canvas = util.draw_handpose(canvas, pose.right_hand)
+        if draw_face:
+            canvas = util.draw_facepose(canvas, pose.face)
+    return canvas
+
+def random_poses(rng, count, H, W, normalized=False):
+    poses = []
+    for _ in range(count):
+        cx, cy, size = rng.uniform(0, W), rng.uniform(0, H), rng.uniform(0.05, 0.4) * min(H, W)
+        def part(n, spread, optional=True):
+            if optional and rng.random() < 0.2:
+                return None
+            keypoints = []
+            for i in range(n):
+                if rng.random() < 0.15:
+                    keypoints.append(None)
+                    continue
+                x, y = cx + rng.normal() * spread * size, cy + rng.normal() * spread * size
+                # some keypoints off the canvas or on its top and left borders
+                if rng.random() < 0.03:
+                    x = -x if rng.random() < 0.5 else x + W
+                if rng.random() < 0.02:
+                    y = 0.0
+                if normalized:
+                    x, y = x / W, y / H
+                keypoints.append(Keypoint(x, y, 1.0, i))
+            return keypoints
+        poses.append(PoseResult(BodyResult(part(18, 0.6, optional=False), 0.0, 18), part(21, 0.1), part(21, 0.1), part(70, 0.08)))
+    return poses
+
+@pytest.mark.parametrize("H, W", [(64, 48), (512, 768), (1080, 1920)])
+@pytest.mark.parametrize("normalized", [False, True])
+def test_draw_poses_matches_per_part_drawing(H, W, normalized):
+    rng = np.random.default_rng(H + normalized)
+    for count, flags, xinsr_stick_scaling in itertools.product((0, 1, 6), itertools.product((True, False), repeat=3), (False, True)):
+        poses = random_poses(rng, count, H, W, normalized)
+        expected = draw_poses_per_part(poses, H, W, *flags, xinsr_stick_scaling)
+        assert np.array_equal(draw_poses(poses, H, W, *flags, xinsr_stick_scaling), expected)
+
+def test_draw_poses_batch():
+    rng = np.random.default_rng(0)
+    poses_batch = [random_poses(rng, count, 512, 768) for count in (3, 0, 8)]
+    canvas = draw_poses_batch(poses_batch, 512, 768)
+    assert canvas.shape == (3, 512, 768, 3) and canvas.dtype == np.uint8
+    for frame, poses in zip(canvas, poses_batch):
+        assert np.array_equal(frame, draw_poses_per_part(poses, 512, 768))
@@ -0,0 +1,45 @@
+import os
+import sys
+
+import cv2
+import numpy as np
+import pytest
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lvminthin import lvmin_thin, lvmin_thin_hitmiss, lvmin_thin_torch
+
+def corpus(seed=0):
+    rng = np.random.default_rng(seed)
+    for i in range(40):
+        h, w = int(rng.integers(8, 300)), int(rng.integers(8, 300))
+        kind = i % 4
+        if kind == 0:
+            x = (rng.random((h, w)) > 0.5).astype(np.uint8) * 255
+        elif kind == 1:
+            x = np.zeros((h, w), np.uint8)
+            for _ in range(10):
+                start, end = rng.integers(0, max(h, w), (2, 2))
+                cv2.line(x, tuple(int(v) for v in start), tuple(int(v) for v in end), 255, int(rng.integers(1, 12)))
+        elif kind == 2:
+            # not binary, everything <= 127 counts as background
+            x = rng.integers(0, 256, (h, w)).astype(np.uint8)
+        else:
+            x = np.zeros((h, w), np.uint8)
+            for _ in range(8):
+                center = tuple(int(v) for v in rng.integers(0, max(h, w), 2))
+                cv2.circle(x, center, int(rng.integers(3, 80)), int(rng.integers(128, 256)), int(rng.integers(-1, 9)) or 1)
+        yield x
+
+@pytest.mark.parametrize("prunings", [True, False])
+def test_lvmin_thin_matches_hitmiss(prunings):
+    for x in corpus():
+        expected = lvmin_thin_hitmiss(x.copy(), prunings=prunings)
+        assert np.array_equal(lvmin_thin(x.copy(), prunings=prunings), expected)
+        assert np.array_equal(lvmin_thin_torch(torch.from_numpy(x)[None], prunings=prunings)[0].numpy(), expected)
+
+def test_lvmin_thin_in_place():
+    x = np.zeros((50, 50), np.uint8)
+    x[10:20, 5:45] = 255
+    assert lvmin_thin(x) is x
+    assert x.sum() < 255 * 40 * 10
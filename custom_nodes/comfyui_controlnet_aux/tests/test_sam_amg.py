@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+
+from custom_controlnet_aux.sam import SamDetector
+from custom_controlnet_aux.sam.utils.amg import mask_to_rle_pytorch, rle_to_mask
+
+def mask_to_rle_per_mask(tensor):
+    # mask_to_rle_pytorch before the run lengths of all masks were computed at once, for reference
+    b, h, w = tensor.shape
+    tensor = tensor.permute(0, 2, 1).flatten(1)
+    change_indices = (tensor[:, 1:] ^ tensor[:, :-1]).nonzero()
+    out = []
+    for i in range(b):
+        cur_idxs = change_indices[change_indices[:, 0] == i, 1]
+        cur_idxs = torch.cat([torch.tensor([0]), cur_idxs + 1, torch.tensor([h * w])])
+        counts = [] if tensor[i, 0] == 0 else [0]
+        counts.extend((cur_idxs[1:] - cur_idxs[:-1]).tolist())
+        out.append({"size": [h, w], "counts": counts})
+    return out
+
+def show_anns_paste(anns):
+    sorted_anns = sorted(anns, key=(lambda x: x['area']), reverse=True)
+    h, w = anns[0]['segmentation'].shape
+    final_img = Image.fromarray(np.zeros((h, w, 3), dtype=np.uint8), mode="RGB")
+    for ann in sorted_anns:
+        m = ann['segmentation']
+        img = np.empty((m.shape[0], m.shape[1], 3), dtype=np.uint8)
+        for i in range(3):
+            img[:, :, i] = np.random.randint(255, dtype=np.uint8)
+        final_img.paste(Image.fromarray(img, mode="RGB"), (0, 0), Image.fromarray(np.uint8(m * 255)))
+    return np.array(final_img, dtype=np.uint8)
+
+@pytest.mark.parametrize("b, h, w", [(0, 8, 8), (1, 1, 1), (5, 13, 7), (12, 64, 96)])
+def test_mask_to_rle_pytorch_matches_per_mask_encoding(b, h, w):
+    rng = np.random.default_rng(b)
+    masks = torch.from_numpy(rng.random((b, h, w)) > rng.uniform(0, 1, (b, 1, 1)))
+    if b > 2:
+        masks[0] = False
+        masks[1] = True
+    rles = mask_to_rle_pytorch(masks)
+    assert rles == mask_to_rle_per_mask(masks)
+    for rle, mask in zip(rles, masks):
+        assert np.array_equal(rle_to_mask(rle), mask.numpy())
+
+def test_show_anns_matches_paste_compositing():
+    rng = np.random.default_rng(0)
+    anns = []
+    for _ in range(20):
+        mask = rng.random((96, 128)) > rng.uniform(0.2, 0.98)
+        anns.append({'segmentation': mask, 'area': int(rng.integers(0, 5)) * 1000})
+    detector = object.__new__(SamDetector)
+    np.random.seed(0)
+    composite = detector.show_anns(anns)
+    np.random.seed(0)
+    assert np.array_equal(composite, show_anns_paste(anns))
+    assert detector.show_anns([]) is None
@@ -1,6 +1,7 @@
 import torch
 import numpy as np
 import os
+import sys
 import cv2
 import yaml
 from pathlib import Path
@@ -9,7 +10,10 @@ from .log import log
 import subprocess
 import threading
 import comfy
+import comfy.model_management as model_management
 import tempfile
+import functools
+from collections import OrderedDict
 
 here = Path(__file__).parent.resolve()
 
@@ -22,6 +26,12 @@ if os.path.exists(config_path):
     TEMP_DIR = config["custom_temp_path"]
     USE_SYMLINKS = config["USE_SYMLINKS"]
     ORT_PROVIDERS = config["EP_list"]
+    DETECTOR_CACHE_SIZE = config.get("detector_cache_size", 4)
+    ORT_INTRA_OP_THREADS = config.get("ort_intra_op_threads", 0)
+    ORT_INTER_OP_THREADS = config.get("ort_inter_op_threads", 0)
+    ORT_GRAPH_OPTIMIZATION_LEVEL = config.get("ort_graph_optimization_level", "all")
+    ORT_OPTIMIZED_MODEL_CACHE = config.get("ort_optimized_model_cache", True)
+    ORT_SESSION_CACHE_SIZE = config.get("ort_session_cache_size", 4)
 
     if USE_SYMLINKS is None or type(USE_SYMLINKS) != bool:
         log.error("USE_SYMLINKS must be a boolean. Using False by default.")
@@ -47,20 +57,156 @@ else:
     TEMP_DIR = tempfile.gettempdir()
     USE_SYMLINKS = False
     ORT_PROVIDERS = ["CUDAExecutionProvider", "DirectMLExecutionProvider", "OpenVINOExecutionProvider", "ROCMExecutionProvider", "CPUExecutionProvider", "CoreMLExecutionProvider"]
+    DETECTOR_CACHE_SIZE = 4
+    ORT_INTRA_OP_THREADS = 0
+    ORT_INTER_OP_THREADS = 0
+    ORT_GRAPH_OPTIMIZATION_LEVEL = "all"
+    ORT_OPTIMIZED_MODEL_CACHE = True
+    ORT_SESSION_CACHE_SIZE = 4
 
 os.environ['AUX_ANNOTATOR_CKPTS_PATH'] = os.getenv('AUX_ANNOTATOR_CKPTS_PATH', annotator_ckpts_path)
 os.environ['AUX_TEMP_DIR'] = os.getenv('AUX_TEMP_DIR', str(TEMP_DIR))
 os.environ['AUX_USE_SYMLINKS'] = os.getenv('AUX_USE_SYMLINKS', str(USE_SYMLINKS))
 os.environ['AUX_ORT_PROVIDERS'] = os.getenv('AUX_ORT_PROVIDERS', str(",".join(ORT_PROVIDERS)))
+os.environ['AUX_DETECTOR_CACHE_SIZE'] = os.getenv('AUX_DETECTOR_CACHE_SIZE', str(DETECTOR_CACHE_SIZE))
+os.environ['AUX_ORT_INTRA_OP_THREADS'] = os.getenv('AUX_ORT_INTRA_OP_THREADS', str(ORT_INTRA_OP_THREADS))
+os.environ['AUX_ORT_INTER_OP_THREADS'] = os.getenv('AUX_ORT_INTER_OP_THREADS', str(ORT_INTER_OP_THREADS))
+os.environ['AUX_ORT_GRAPH_OPTIMIZATION_LEVEL'] = os.getenv('AUX_ORT_GRAPH_OPTIMIZATION_LEVEL', str(ORT_GRAPH_OPTIMIZATION_LEVEL))
+os.environ['AUX_ORT_OPTIMIZED_MODEL_CACHE'] = os.getenv('AUX_ORT_OPTIMIZED_MODEL_CACHE', str(ORT_OPTIMIZED_MODEL_CACHE))
+os.environ['AUX_ORT_SESSION_CACHE_SIZE'] = os.getenv('AUX_ORT_SESSION_CACHE_SIZE', str(ORT_SESSION_CACHE_SIZE))
 
 log.info(f"Using ckpts path: {annotator_ckpts_path}")
 log.info(f"Using symlinks: {USE_SYMLINKS}")
 log.info(f"Using ort providers: {ORT_PROVIDERS}")
+log.debug(f"Using ort threads (intra/inter): {os.environ['AUX_ORT_INTRA_OP_THREADS']}/{os.environ['AUX_ORT_INTER_OP_THREADS']}, graph optimization: {os.environ['AUX_ORT_GRAPH_OPTIMIZATION_LEVEL']}")
+log.info(f"Using detector cache size: {os.environ['AUX_DETECTOR_CACHE_SIZE']}")
 
 # Sync with theoritical limit from Comfy base
 # https://github.com/comfyanonymous/ComfyUI/blob/eecd69b53a896343775bcb02a4f8349e7442ffd1/nodes.py#L45
 MAX_RESOLUTION=16384
 
+class DetectorCache:
+    """
+    Process-wide LRU cache of the loaded detectors, keyed by (detector class, from_pretrained arguments, device, dtype).
+    When ComfyUI needs memory on a device the cached detectors there are moved to the CPU first, and
+    they are dropped when ComfyUI unloads all its models. A max_size of 0 disables the cache.
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.detectors = OrderedDict()
+        self.devices = {}
+        self.stats = dict(hits=0, misses=0, evictions=0, offloads=0)
+
+    def get(self, detector_class, *args, device=None, dtype=None, **kwargs):
+        device = model_management.get_torch_device() if device is None else device
+        # dtype None keeps the precision of the checkpoint
+        key = (detector_class, args, tuple(sorted(kwargs.items(), key=lambda item: item[0])), str(device), str(dtype))
+
+        if key in self.detectors:
+            self.stats["hits"] += 1
+            self.detectors.move_to_end(key)
+            detector = self.detectors[key]
+            if self.devices[key] != device:
+                detector = detector.to(device)
+                self.devices[key] = device
+            return detector
+
+        self.stats["misses"] += 1
+        detector = detector_class.from_pretrained(*args, **kwargs)
+        if hasattr(detector, "to"):
+            detector = detector.to(device)
+        if dtype is not None:
+            # the detectors' own to() only moves them between devices
+            for module in vars(detector).values():
+                if isinstance(module, torch.nn.Module):
+                    module.to(dtype)
+        if self.max_size <= 0:
+            return detector
+
+        self.detectors[key] = detector
+        self.devices[key] = device
+        while len(self.detectors) > self.max_size:
+            evicted, _ = self.detectors.popitem(last=False)
+            del self.devices[evicted]
+            self.stats["evictions"] += 1
+        log.debug(f"Detector cache: {self.stats}")
+        return detector
+
+    def offload(self, device, memory_required=0):
+        # least recently used first, only as many as needed to free memory_required
+        for key, detector in self.detectors.items():
+            if memory_required > 0 and model_management.get_free_memory(device) >= memory_required:
+                break
+            if str(self.devices[key]) == str(device) and not model_management.is_device_cpu(device) and hasattr(detector, "to"):
+                self.detectors[key] = detector.to(model_management.unet_offload_device())
+                self.devices[key] = model_management.unet_offload_device()
+                self.stats["offloads"] += 1
+        model_management.soft_empty_cache()
+
+    def clear(self):
+        self.stats["evictions"] += len(self.detectors)
+        self.detectors.clear()
+        self.devices.clear()
+
+DETECTOR_CACHE = DetectorCache(int(os.environ['AUX_DETECTOR_CACHE_SIZE']))
+
+def load_detector(detector_class, *args, device=None, dtype=None, **kwargs):
+    return DETECTOR_CACHE.get(detector_class, *args, device=device, dtype=dtype, **kwargs)
+
+# let ComfyUI reclaim the memory of the cached detectors like it does for its own models
+def _wrap_model_management(name, before):
+    original = getattr(model_management, name, None)
+    if original is None or getattr(original, "_aux_detector_cache", False):
+        return
+    @functools.wraps(original)
+    def wrapper(*args, **kwargs):
+        before(*args, **kwargs)
+        return original(*args, **kwargs)
+    wrapper._aux_detector_cache = True
+    setattr(model_management, name, wrapper)
+
+def _unload_all_models(*args, **kwargs):
+    DETECTOR_CACHE.clear()
+    # the DWPose/AnimalPose onnx sessions, only if they were ever loaded
+    session = sys.modules.get("custom_controlnet_aux.dwpose.dw_onnx.session")
+    if session is not None:
+        session.clear_onnx_sessions()
+
+_wrap_model_management("free_memory", lambda memory_required, device, *args, **kwargs: DETECTOR_CACHE.offload(device, memory_required))
+_wrap_model_management("unload_all_models", _unload_all_models)
+
+def get_batch_chunk_size(model, tensor_image, detect_resolution):
+    """
+    How many images of tensor_image fit in one forward of model.batch_call, from the free memory on the model's device.
+    Detectors can set batch_bytes_per_pixel (working memory per padded input pixel) to refine the estimate.
+    """
+    device = torch.device(getattr(model, "device", None) or model_management.get_torch_device())
+    H, W = tensor_image.shape[1:3]
+    k = float(detect_resolution) / float(min(H, W))
+    H_padded, W_padded = (int(np.ceil(round(H * k) / 64.0) * 64), int(np.ceil(round(W * k) / 64.0) * 64))
+    per_image = H_padded * W_padded * getattr(model, "batch_bytes_per_pixel", 8192)
+    return max(1, min(tensor_image.shape[0], int(model_management.get_free_memory(device) * 0.5) // per_image))
+
+def batched_annotator_call(model, tensor_image, detect_resolution, show_pbar=True, **kwargs):
+    """
+    Batched protocol: model.batch_call takes a [B, H, W, C] float tensor in [0, 1] and returns a [B, H', W', C'] one,
+    resizing, padding and inferring on its own device in one forward per chunk. It raises NotImplementedError
+    before doing any work for options it only supports per image, and common_annotator_call then loops instead.
+    """
+    batch_size = tensor_image.shape[0]
+    chunk_size = get_batch_chunk_size(model, tensor_image, detect_resolution)
+    if show_pbar:
+        pbar = comfy.utils.ProgressBar(batch_size)
+    out_tensor = None
+    for i in range(0, batch_size, chunk_size):
+        out = model.batch_call(tensor_image[i:i + chunk_size], detect_resolution=detect_resolution, **kwargs)
+        if out_tensor is None:
+            out_tensor = torch.zeros(batch_size, *out.shape[1:], dtype=torch.float32)
+        out_tensor[i:i + chunk_size] = out
+        if show_pbar:
+            pbar.update(out.shape[0])
+    return out_tensor
+
 def common_annotator_call(model, tensor_image, input_batch=False, show_pbar=True, **kwargs):
     if "detect_resolution" in kwargs:
         del kwargs["detect_resolution"] #Prevent weird case?
@@ -76,6 +222,12 @@ def common_annotator_call(model, tensor_image, input_batch=False, show_pbar=True
         np_results = model(np_images, output_type="np", detect_resolution=detect_resolution, **kwargs)
         return torch.from_numpy(np_results.astype(np.float32) / 255.0)
 
+    if hasattr(model, "batch_call"):
+        try:
+            return batched_annotator_call(model, tensor_image, detect_resolution, show_pbar, **kwargs)
+        except NotImplementedError:
+            pass
+
     batch_size = tensor_image.shape[0]
     if show_pbar:
         pbar = comfy.utils.ProgressBar(batch_size)
@@ -23,11 +23,66 @@ class Attn2Replace:
 
         for i, callback in enumerate(self.callback):
             if sigma <= self.kwargs[i]["sigma_start"] and sigma >= self.kwargs[i]["sigma_end"]:
-                out = out + callback(out, q, k, v, extra_options, **self.kwargs[i])
+                out_ip = callback(out, q, k, v, extra_options, **self.kwargs[i])
+                # callbacks return 0 when they don't apply to the current batch
+                if isinstance(out_ip, torch.Tensor):
+                    out = out + out_ip
         
         return out.to(dtype=dtype)
 
-def ipadapter_attention(out, q, k, v, extra_options, module_key='', ipadapter=None, weight=1.0, cond=None, cond_alt=None, uncond=None, weight_type="linear", mask=None, sigma_start=0.0, sigma_end=1.0, unfold_batch=False, embeds_scaling='V only', **kwargs):
+class AttnMaskPyramid:
+    """
+    Attention mask resized once for every sequence length the UNet cross attention runs at.
+    The mask is either [B, H, W] or [B, tiles, H, W] for tiled IPAdapters. Levels are stored as
+    [B, seq, tiles] so they can be broadcast over the channels of the attention output.
+    """
+    def __init__(self, mask):
+        self.mask = mask
+        self.levels = {}
+
+    @property
+    def shape(self):
+        return self.mask.shape
+
+    def get(self, seq_len, oh, ow):
+        key = (seq_len, oh, ow)
+        if key not in self.levels:
+            # build the whole pyramid for this latent size at once, the UNet halves the resolution at each level
+            h, w = oh, ow
+            for _ in range(4):
+                level_len = h * w
+                if (level_len, oh, ow) not in self.levels:
+                    self.levels[(level_len, oh, ow)] = self.resize(level_len, oh, ow)
+                h, w = (h + 1) // 2, (w + 1) // 2
+            # unusual architectures might use a sequence length we didn't predict
+            if key not in self.levels:
+                self.levels[key] = self.resize(seq_len, oh, ow)
+
+        return self.levels[key]
+
+    def resize(self, seq_len, oh, ow):
+        mask_h = oh / math.sqrt(oh * ow / seq_len)
+        mask_h = int(mask_h) + int((seq_len % int(mask_h)) != 0)
+        mask_w = seq_len // mask_h
+
+        mask = self.mask.unsqueeze(1) if self.mask.dim() == 3 else self.mask
+        mask = F.interpolate(mask, size=(mask_h, mask_w), mode="bilinear")
+        mask = mask.view(mask.shape[0], mask.shape[1], -1).transpose(1, 2)
+
+        # covers cases where extreme aspect ratios can cause the mask to have a wrong size
+        mask_len = mask_h * mask_w
+        if mask_len < seq_len:
+            pad_len = seq_len - mask_len
+            pad1 = pad_len // 2
+            pad2 = pad_len - pad1
+            mask = F.pad(mask, (0, 0, pad1, pad2), value=0.0)
+        elif mask_len > seq_len:
+            crop_start = (mask_len - seq_len) // 2
+            mask = mask[:, crop_start:crop_start+seq_len, :]
+
+        return mask
+
+def ipadapter_attention(out, q, k, v, extra_options, module_key='', ipadapter=None, weight=1.0, cond=None, cond_alt=None, uncond=None, weight_type="linear", mask=None, sigma_start=0.0, sigma_end=1.0, unfold_batch=False, embeds_scaling='V only', num_tiles=1, **kwargs):
     dtype = q.dtype
     cond_or_uncond = extra_options["cond_or_uncond"]
     block_type = extra_options["block"][0]
@@ -126,7 +181,15 @@ def ipadapter_attention(out, q, k, v, extra_options, module_key='', ipadapter=No
 
     ip_k = torch.cat([(k_cond, k_uncond)[i] for i in cond_or_uncond], dim=0)
     ip_v = torch.cat([(v_cond, v_uncond)[i] for i in cond_or_uncond], dim=0)
-    
+
+    if num_tiles > 1:
+        # tiles are stacked along the tokens, move them to the batch dimension so that they are all attended in one call
+        ip_k = ip_k.view(ip_k.shape[0], num_tiles, -1, ip_k.shape[2]).transpose(0, 1).reshape(-1, ip_k.shape[1] // num_tiles, ip_k.shape[2])
+        ip_v = ip_v.view(ip_v.shape[0], num_tiles, -1, ip_v.shape[2]).transpose(0, 1).reshape(-1, ip_v.shape[1] // num_tiles, ip_v.shape[2])
+        q = q.repeat(num_tiles, 1, 1)
+        if isinstance(weight, torch.Tensor):
+            weight = weight.repeat(num_tiles, 1, 1)
+
     if embeds_scaling == 'K+mean(V) w/ C penalty':
         scaling = float(ip_k.shape[2]) / 1280.0
         weight = weight * scaling
@@ -151,40 +214,30 @@ def ipadapter_attention(out, q, k, v, extra_options, module_key='', ipadapter=No
         out_ip = out_ip * weight # I'm doing this to get the same results as before
 
     if mask is not None:
-        mask_h = oh / math.sqrt(oh * ow / seq_len)
-        mask_h = int(mask_h) + int((seq_len % int(mask_h)) != 0)
-        mask_w = seq_len // mask_h
+        # the mask pyramid holds the mask already resized to this block's sequence length as [B, seq, tiles]
+        mask = mask.get(seq_len, oh, ow) if isinstance(mask, AttnMaskPyramid) else AttnMaskPyramid(mask).resize(seq_len, oh, ow)
 
         # check if using AnimateDiff and sliding context window
         if (mask.shape[0] > 1 and ad_params is not None and ad_params["sub_idxs"] is not None):
             # if mask length matches or exceeds full_length, get sub_idx masks
             if mask.shape[0] >= ad_params["full_length"]:
-                mask = torch.Tensor(mask[ad_params["sub_idxs"]])
-                mask = F.interpolate(mask.unsqueeze(1), size=(mask_h, mask_w), mode="bilinear").squeeze(1)
+                mask = mask[ad_params["sub_idxs"]]
             else:
-                mask = F.interpolate(mask.unsqueeze(1), size=(mask_h, mask_w), mode="bilinear").squeeze(1)
                 mask = tensor_to_size(mask, ad_params["full_length"])
                 mask = mask[ad_params["sub_idxs"]]
         else:
-            mask = F.interpolate(mask.unsqueeze(1), size=(mask_h, mask_w), mode="bilinear").squeeze(1)
             mask = tensor_to_size(mask, batch_prompt)
 
+        # broadcast along the channel dimension instead of materializing it
         mask = mask.repeat(len(cond_or_uncond), 1, 1)
-        mask = mask.view(mask.shape[0], -1, 1).repeat(1, 1, out.shape[2])
-
-        # covers cases where extreme aspect ratios can cause the mask to have a wrong size
-        mask_len = mask_h * mask_w
-        if mask_len < seq_len:
-            pad_len = seq_len - mask_len
-            pad1 = pad_len // 2
-            pad2 = pad_len - pad1
-            mask = F.pad(mask, (0, 0, pad1, pad2), value=0.0)
-        elif mask_len > seq_len:
-            crop_start = (mask_len - seq_len) // 2
-            mask = mask[:, crop_start:crop_start+seq_len, :]
+        if num_tiles > 1:
+            mask = mask.permute(2, 0, 1).reshape(-1, mask.shape[1], 1)
 
         out_ip = out_ip * mask
 
+    if num_tiles > 1:
+        out_ip = out_ip.view(num_tiles, -1, out_ip.shape[1], out_ip.shape[2]).sum(dim=0)
+
     #out = out + out_ip
 
     return out_ip.to(dtype=dtype)
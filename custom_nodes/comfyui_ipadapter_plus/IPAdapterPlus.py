@@ -10,14 +10,13 @@ from comfy.sd import load_lora_for_models
 import comfy.utils
 
 import torch.nn as nn
-from PIL import Image
 try:
     import torchvision.transforms.v2 as T
 except ImportError:
     import torchvision.transforms as T
 
 from .image_proj_models import MLPProjModel, MLPProjModelFaceId, ProjModelFaceIdPlus, Resampler, ImageProjModel
-from .CrossAttentionPatch import Attn2Replace, ipadapter_attention
+from .CrossAttentionPatch import Attn2Replace, AttnMaskPyramid, ipadapter_attention
 from .utils import (
     encode_image_masked,
     tensor_to_size,
@@ -26,9 +25,16 @@ from .utils import (
     image_to_tensor,
     ipadapter_model_loader,
     insightface_loader,
-    get_clipvision_file,
-    get_ipadapter_file,
-    get_lora_file,
+    analyze_faces,
+    MODEL_FILES_INDEX,
+    EMBEDS_FILES_INDEX,
+    EMBEDS_STORAGE_DTYPES,
+    save_embeds,
+    load_embeds,
+    load_safetensors_mmap,
+    image_hash,
+    merge_embeds,
+    resize_image,
 )
 
 # set the models directory
@@ -38,6 +44,13 @@ else:
     current_paths, _ = folder_paths.folder_names_and_paths["ipadapter"]
 folder_paths.folder_names_and_paths["ipadapter"] = (current_paths, folder_paths.supported_pt_extensions)
 
+# precomputed embeds library, one file per product (SKU)
+if "ipadapter_embeds" not in folder_paths.folder_names_and_paths:
+    current_paths = [os.path.join(folder_paths.models_dir, "ipadapter_embeds")]
+else:
+    current_paths, _ = folder_paths.folder_names_and_paths["ipadapter_embeds"]
+folder_paths.folder_names_and_paths["ipadapter_embeds"] = (current_paths, {".ipadpt"})
+
 WEIGHT_TYPES = ["linear", "ease in", "ease out", 'ease in-out', 'reverse in-out', 'weak input', 'weak output', 'weak middle', 'strong middle', 'style transfer', 'composition', 'strong style transfer']
 
 """
@@ -125,25 +138,21 @@ class IPAdapter(nn.Module):
         elif batch_size > clip_embed.shape[0]:
             batch_size = clip_embed.shape[0]
 
-        clip_embed = torch.split(clip_embed, batch_size, dim=0)
-        clip_embed_zeroed = torch.split(clip_embed_zeroed, batch_size, dim=0)
-
-        image_prompt_embeds = []
-        uncond_image_prompt_embeds = []
+        image_prompt_embeds = None
+        uncond_image_prompt_embeds = None
 
-        for ce, cez in zip(clip_embed, clip_embed_zeroed):
-            image_prompt_embeds.append(self.image_proj_model(ce.to(torch_device)).to(intermediate_device))
-            uncond_image_prompt_embeds.append(self.image_proj_model(cez.to(torch_device)).to(intermediate_device))
-        
-        del clip_embed, clip_embed_zeroed
+        # the outputs are allocated once, each chunk is projected and copied in place
+        for start in range(0, clip_embed.shape[0], batch_size):
+            cond = self.image_proj_model(clip_embed[start:start+batch_size].to(torch_device))
+            uncond = self.image_proj_model(clip_embed_zeroed[start:start+batch_size].to(torch_device))
+            if image_prompt_embeds is None:
+                image_prompt_embeds = torch.empty((clip_embed.shape[0], *cond.shape[1:]), dtype=cond.dtype, device=intermediate_device)
+                uncond_image_prompt_embeds = torch.empty((clip_embed.shape[0], *uncond.shape[1:]), dtype=uncond.dtype, device=intermediate_device)
+            image_prompt_embeds[start:start+batch_size] = cond
+            uncond_image_prompt_embeds[start:start+batch_size] = uncond
 
-        image_prompt_embeds = torch.cat(image_prompt_embeds, dim=0)
-        uncond_image_prompt_embeds = torch.cat(uncond_image_prompt_embeds, dim=0)
-        
-        torch.cuda.empty_cache()
+        del clip_embed, clip_embed_zeroed, cond, uncond
 
-        #image_prompt_embeds = self.image_proj_model(clip_embed)
-        #uncond_image_prompt_embeds = self.image_proj_model(clip_embed_zeroed)
         return image_prompt_embeds, uncond_image_prompt_embeds
 
     @torch.inference_mode()
@@ -157,18 +166,15 @@ class IPAdapter(nn.Module):
         elif batch_size > clip_embed.shape[0]:
             batch_size = clip_embed.shape[0]
         
-        face_embed_batch = torch.split(face_embed, batch_size, dim=0)
-        clip_embed_batch = torch.split(clip_embed, batch_size, dim=0)
-
-        embeds = []
-        for face_embed, clip_embed in zip(face_embed_batch, clip_embed_batch):
-            embeds.append(self.image_proj_model(face_embed.to(torch_device), clip_embed.to(torch_device), scale=s_scale, shortcut=shortcut).to(intermediate_device))
+        embeds = None
+        for start in range(0, clip_embed.shape[0], batch_size):
+            out = self.image_proj_model(face_embed[start:start+batch_size].to(torch_device), clip_embed[start:start+batch_size].to(torch_device), scale=s_scale, shortcut=shortcut)
+            if embeds is None:
+                embeds = torch.empty((clip_embed.shape[0], *out.shape[1:]), dtype=out.dtype, device=intermediate_device)
+            embeds[start:start+batch_size] = out
 
-        del face_embed_batch, clip_embed_batch
+        del face_embed, clip_embed, out
 
-        embeds = torch.cat(embeds, dim=0)
-        torch.cuda.empty_cache()
-        #embeds = self.image_proj_model(face_embed, clip_embed, scale=s_scale, shortcut=shortcut)
         return embeds
 
 class To_KV(nn.Module):
@@ -180,6 +186,47 @@ class To_KV(nn.Module):
             self.to_kvs[key.replace(".weight", "").replace(".", "_")] = nn.Linear(value.shape[1], value.shape[0], bias=False)
             self.to_kvs[key.replace(".weight", "").replace(".", "_")].weight.data = value
 
+def get_block_patch_kwargs(patch_kwargs, t_idx, layers, block_type):
+    """
+    Resolves the weight type of a transformer block once at patch time, returns the kwargs of its patch
+    with a plain weight and "linear" weight type, or None if the block doesn't need to be patched
+    """
+    weight = patch_kwargs["weight"]
+    weight_type = patch_kwargs["weight_type"]
+    cond = patch_kwargs["cond"]
+    cond_alt = patch_kwargs["cond_alt"]
+
+    if weight_type == 'ease in':
+        weight = weight * (0.05 + 0.95 * (1 - t_idx / layers))
+    elif weight_type == 'ease out':
+        weight = weight * (0.05 + 0.95 * (t_idx / layers))
+    elif weight_type == 'ease in-out':
+        weight = weight * (0.05 + 0.95 * (1 - abs(t_idx - (layers/2)) / (layers/2)))
+    elif weight_type == 'reverse in-out':
+        weight = weight * (0.05 + 0.95 * (abs(t_idx - (layers/2)) / (layers/2)))
+    elif weight_type == 'weak input' and block_type == 'input':
+        weight = weight * 0.2
+    elif weight_type == 'weak middle' and block_type == 'middle':
+        weight = weight * 0.2
+    elif weight_type == 'weak output' and block_type == 'output':
+        weight = weight * 0.2
+    elif weight_type == 'strong middle' and (block_type == 'input' or block_type == 'output'):
+        weight = weight * 0.2
+    elif isinstance(weight, dict):
+        if t_idx not in weight:
+            return None
+        weight = weight[t_idx]
+        if cond_alt is not None and t_idx in cond_alt:
+            cond = cond_alt[t_idx]
+
+    if isinstance(weight, torch.Tensor):
+        if torch.all(weight == 0):
+            return None
+    elif weight == 0:
+        return None
+
+    return { **patch_kwargs, "weight": weight, "weight_type": "linear", "cond": cond, "cond_alt": None }
+
 def set_model_patch_replace(model, patch_kwargs, key):
     to = model.model_options["transformer_options"].copy()
     if "patches_replace" not in to:
@@ -218,7 +265,8 @@ def ipadapter_execute(model,
                       unfold_batch=False,
                       embeds_scaling='V only',
                       layer_weights=None,
-                      encode_batch_size=0,):
+                      encode_batch_size=0,
+                      num_tiles=1,):
     device = model_management.get_torch_device()
     dtype = model_management.unet_dtype()
     if dtype not in [torch.float32, torch.float16, torch.bfloat16]:
@@ -280,27 +328,22 @@ def ipadapter_execute(model,
 
         from insightface.utils import face_align
 
-        insightface.det_model.input_size = (640,640) # reset the detection size
         image_iface = tensor_to_image(image)
         face_cond_embeds = []
         image = []
 
-        for i in range(image_iface.shape[0]):
-            for size in [(size, size) for size in range(640, 256, -64)]:
-                insightface.det_model.input_size = size # TODO: hacky but seems to be working
-                face = insightface.get(image_iface[i])
-                if face:
-                    if not is_portrait_unnorm:
-                        face_cond_embeds.append(torch.from_numpy(face[0].normed_embedding).unsqueeze(0))
-                    else:
-                        face_cond_embeds.append(torch.from_numpy(face[0].embedding).unsqueeze(0))
-                    image.append(image_to_tensor(face_align.norm_crop(image_iface[i], landmark=face[0].kps, image_size=256 if is_sdxl else 224)))
-
-                    if 640 not in size:
-                        print(f"\033[33mINFO: InsightFace detection resolution lowered to {size}.\033[0m")
-                    break
-            else:
+        for i, (face, size) in enumerate(analyze_faces(insightface, image_iface)):
+            if face is None:
                 raise Exception('InsightFace: No face detected.')
+
+            if not is_portrait_unnorm:
+                face_cond_embeds.append(torch.from_numpy(face.normed_embedding).unsqueeze(0))
+            else:
+                face_cond_embeds.append(torch.from_numpy(face.embedding).unsqueeze(0))
+            image.append(image_to_tensor(face_align.norm_crop(image_iface[i], landmark=face.kps, image_size=256 if is_sdxl else 224)))
+
+            if 640 not in size:
+                print(f"\033[33mINFO: InsightFace detection resolution lowered to {size}.\033[0m")
         face_cond_embeds = torch.stack(face_cond_embeds).to(device, dtype=dtype)
         image = torch.stack(image)
         del image_iface, face
@@ -342,46 +385,28 @@ def ipadapter_execute(model,
         raise Exception("Images or Embeds are required")
 
     # ensure that cond and uncond have the same batch size
-    img_uncond_embeds = tensor_to_size(img_uncond_embeds, img_cond_embeds.shape[0])
+    img_uncond_embeds = tensor_to_size(img_uncond_embeds, img_cond_embeds.shape[0] // num_tiles)
+    if num_tiles > 1:
+        # all the tiles share the same negative
+        img_uncond_embeds = img_uncond_embeds.repeat(num_tiles, *[1] * (img_uncond_embeds.dim() - 1))
 
     img_cond_embeds = img_cond_embeds.to(device, dtype=dtype)
     img_uncond_embeds = img_uncond_embeds.to(device, dtype=dtype)
     if img_comp_cond_embeds is not None:
         img_comp_cond_embeds = img_comp_cond_embeds.to(device, dtype=dtype)
 
-    # combine the embeddings if needed
-    if combine_embeds != "concat" and img_cond_embeds.shape[0] > 1 and not unfold_batch:
-        if combine_embeds == "add":
-            img_cond_embeds = torch.sum(img_cond_embeds, dim=0).unsqueeze(0)
-            if face_cond_embeds is not None:
-                face_cond_embeds = torch.sum(face_cond_embeds, dim=0).unsqueeze(0)
-            if img_comp_cond_embeds is not None:
-                img_comp_cond_embeds = torch.sum(img_comp_cond_embeds, dim=0).unsqueeze(0)
-        elif combine_embeds == "subtract":
-            img_cond_embeds = img_cond_embeds[0] - torch.mean(img_cond_embeds[1:], dim=0)
-            img_cond_embeds = img_cond_embeds.unsqueeze(0)
-            if face_cond_embeds is not None:
-                face_cond_embeds = face_cond_embeds[0] - torch.mean(face_cond_embeds[1:], dim=0)
-                face_cond_embeds = face_cond_embeds.unsqueeze(0)
-            if img_comp_cond_embeds is not None:
-                img_comp_cond_embeds = img_comp_cond_embeds[0] - torch.mean(img_comp_cond_embeds[1:], dim=0)
-                img_comp_cond_embeds = img_comp_cond_embeds.unsqueeze(0)
-        elif combine_embeds == "average":
-            img_cond_embeds = torch.mean(img_cond_embeds, dim=0).unsqueeze(0)
-            if face_cond_embeds is not None:
-                face_cond_embeds = torch.mean(face_cond_embeds, dim=0).unsqueeze(0)
-            if img_comp_cond_embeds is not None:
-                img_comp_cond_embeds = torch.mean(img_comp_cond_embeds, dim=0).unsqueeze(0)
-        elif combine_embeds == "norm average":
-            img_cond_embeds = torch.mean(img_cond_embeds / torch.norm(img_cond_embeds, dim=0, keepdim=True), dim=0).unsqueeze(0)
-            if face_cond_embeds is not None:
-                face_cond_embeds = torch.mean(face_cond_embeds / torch.norm(face_cond_embeds, dim=0, keepdim=True), dim=0).unsqueeze(0)
-            if img_comp_cond_embeds is not None:
-                img_comp_cond_embeds = torch.mean(img_comp_cond_embeds / torch.norm(img_comp_cond_embeds, dim=0, keepdim=True), dim=0).unsqueeze(0)
-        img_uncond_embeds = img_uncond_embeds[0].unsqueeze(0) # TODO: better strategy for uncond could be to average them
+    # combine the embeddings if needed, tiles are combined separately
+    if combine_embeds != "concat" and img_cond_embeds.shape[0] > num_tiles and not unfold_batch:
+        img_cond_embeds = torch.cat([merge_embeds(e, combine_embeds) for e in img_cond_embeds.chunk(num_tiles)], dim=0)
+        if face_cond_embeds is not None:
+            face_cond_embeds = torch.cat([merge_embeds(e, combine_embeds) for e in face_cond_embeds.chunk(num_tiles)], dim=0)
+        if img_comp_cond_embeds is not None:
+            img_comp_cond_embeds = torch.cat([merge_embeds(e, combine_embeds) for e in img_comp_cond_embeds.chunk(num_tiles)], dim=0)
+        img_uncond_embeds = tensor_to_size(img_uncond_embeds[:1], num_tiles) # TODO: better strategy for uncond could be to average them
 
     if attn_mask is not None:
-        attn_mask = attn_mask.to(device, dtype=dtype)
+        # the mask is resized only once per latent size and then shared by all the attention blocks
+        attn_mask = AttnMaskPyramid(attn_mask.to(device, dtype=dtype))
 
     ipa = IPAdapter(
         ipadapter,
@@ -408,6 +433,12 @@ def ipadapter_execute(model,
     cond = cond.to(device, dtype=dtype)
     uncond = uncond.to(device, dtype=dtype)
 
+    if num_tiles > 1:
+        # the image batch is made of all the tiles one after the other, stack them along the tokens instead
+        # so a single patch can attend all of them. The attention moves them back to the batch dimension
+        cond = cond.view(num_tiles, -1, *cond.shape[1:]).transpose(0, 1).flatten(1, 2)
+        uncond = uncond.view(num_tiles, -1, *uncond.shape[1:]).transpose(0, 1).flatten(1, 2)
+
     cond_alt = None
     if img_comp_cond_embeds is not None:
         cond_alt = { 3: cond_comp.to(device, dtype=dtype) }
@@ -429,36 +460,40 @@ def ipadapter_execute(model,
         "sigma_end": sigma_end,
         "unfold_batch": unfold_batch,
         "embeds_scaling": embeds_scaling,
+        "num_tiles": num_tiles,
     }
 
+    # the weight of each block is known in advance, only the blocks with a non-zero weight get patched.
+    # t_idx is the order the UNet runs the transformers in: input blocks, middle block, output blocks
+    layers = 11 if '101_to_k_ip' in ipa.ip_layers.to_kvs else 16
+    def patch_block(key, number, t_idx):
+        block_kwargs = get_block_patch_kwargs(patch_kwargs, t_idx, layers, key[0])
+        if block_kwargs is not None:
+            block_kwargs["module_key"] = str(number*2+1)
+            set_model_patch_replace(model, block_kwargs, key)
+
     number = 0
     if not is_sdxl:
-        for id in [1,2,4,5,7,8]: # id of input_blocks that have cross attention
-            patch_kwargs["module_key"] = str(number*2+1)
-            set_model_patch_replace(model, patch_kwargs, ("input", id))
+        for t_idx, id in enumerate([1,2,4,5,7,8]): # id of input_blocks that have cross attention
+            patch_block(("input", id), number, t_idx)
             number += 1
-        for id in [3,4,5,6,7,8,9,10,11]: # id of output_blocks that have cross attention
-            patch_kwargs["module_key"] = str(number*2+1)
-            set_model_patch_replace(model, patch_kwargs, ("output", id))
+        for t_idx, id in enumerate([3,4,5,6,7,8,9,10,11], start=7): # id of output_blocks that have cross attention
+            patch_block(("output", id), number, t_idx)
             number += 1
-        patch_kwargs["module_key"] = str(number*2+1)
-        set_model_patch_replace(model, patch_kwargs, ("middle", 0))
+        patch_block(("middle", 0), number, 6)
     else:
-        for id in [4,5,7,8]: # id of input_blocks that have cross attention
+        for t_idx, id in enumerate([4,5,7,8]): # id of input_blocks that have cross attention
             block_indices = range(2) if id in [4, 5] else range(10) # transformer_depth
             for index in block_indices:
-                patch_kwargs["module_key"] = str(number*2+1)
-                set_model_patch_replace(model, patch_kwargs, ("input", id, index))
+                patch_block(("input", id, index), number, t_idx)
                 number += 1
         for id in range(6): # id of output_blocks that have cross attention
             block_indices = range(2) if id in [3, 4, 5] else range(10) # transformer_depth
             for index in block_indices:
-                patch_kwargs["module_key"] = str(number*2+1)
-                set_model_patch_replace(model, patch_kwargs, ("output", id, index))
+                patch_block(("output", id, index), number, id + 5)
                 number += 1
         for index in range(10):
-            patch_kwargs["module_key"] = str(number*2+1)
-            set_model_patch_replace(model, patch_kwargs, ("middle", 0, index))
+            patch_block(("middle", 0, index), number, 4)
             number += 1
 
     return (model, image)
@@ -495,8 +530,11 @@ class IPAdapterUnifiedLoader:
         if ipadapter is not None:
             pipeline = ipadapter
 
+        is_sdxl = isinstance(model.model, (comfy.model_base.SDXL, comfy.model_base.SDXLRefiner, comfy.model_base.SDXL_instructpix2pix))
+        files = MODEL_FILES_INDEX.resolve(preset, is_sdxl)
+
         # 1. Load the clipvision model
-        clipvision_file = get_clipvision_file(preset)
+        clipvision_file = files['clipvision']
         if clipvision_file is None:
             raise Exception("ClipVision model not found.")
 
@@ -509,8 +547,7 @@ class IPAdapterUnifiedLoader:
                 self.clipvision = pipeline['clipvision']
 
         # 2. Load the ipadapter model
-        is_sdxl = isinstance(model.model, (comfy.model_base.SDXL, comfy.model_base.SDXLRefiner, comfy.model_base.SDXL_instructpix2pix))
-        ipadapter_file, is_insightface, lora_pattern = get_ipadapter_file(preset, is_sdxl)
+        ipadapter_file, is_insightface, lora_pattern = files['ipadapter'], files['is_insightface'], files['lora_pattern']
         if ipadapter_file is None:
             raise Exception("IPAdapter model not found.")
 
@@ -524,7 +561,7 @@ class IPAdapterUnifiedLoader:
 
         # 3. Load the lora model if needed
         if lora_pattern is not None:
-            lora_file = get_lora_file(lora_pattern)
+            lora_file = files['lora']
             lora_model = None
             if lora_file is None:
                 raise Exception("LoRA model not found.")
@@ -936,14 +973,8 @@ class IPAdapterTiled:
         else:
             resize = (int(tile_size * ow / oh), tile_size) if oh < ow else (tile_size, int(tile_size * oh / ow))
 
-         # using PIL for better results
-        imgs = []
-        for img in image:
-            img = T.ToPILImage()(img)
-            img = img.resize(resize, resample=Image.Resampling['LANCZOS'])
-            imgs.append(T.ToTensor()(img))
-        image = torch.stack(imgs)
-        del imgs, img
+        # using the same lanczos filter as PIL for better results
+        image = resize_image(image.to(model_management.get_torch_device()), resize, "LANCZOS")
 
         # we don't need a high quality resize for the mask
         attn_mask = T.Resize(resize[::-1], interpolation=T.InterpolationMode.BICUBIC, antialias=True)(attn_mask)
@@ -959,7 +990,7 @@ class IPAdapterTiled:
         if sharpening > 0:
             image = contrast_adaptive_sharpening(image, sharpening)
 
-        image = image.permute([0,2,3,1])
+        image = image.permute([0,2,3,1]).to(model_management.intermediate_device())
 
         _, oh, ow, _ = image.shape
 
@@ -984,24 +1015,22 @@ class IPAdapterTiled:
                 masks.append(mask)
         del mask
 
-        # 3. Apply the ipadapter to each group of tiles
-        model = model.clone()
-        for i in range(len(tiles)):
-            ipa_args = {
-                "image": tiles[i],
-                "image_negative": image_negative,
-                "weight": weight,
-                "weight_type": weight_type,
-                "combine_embeds": combine_embeds,
-                "start_at": start_at,
-                "end_at": end_at,
-                "attn_mask": masks[i],
-                "unfold_batch": self.unfold_batch,
-                "embeds_scaling": embeds_scaling,
-                "encode_batch_size": encode_batch_size,
-            }
-            # apply the ipadapter to the model without cloning it
-            model, _ = ipadapter_execute(model, ipadapter_model, clip_vision, **ipa_args)
+        # 3. Apply the ipadapter to all the tiles at once, they are encoded in a single batch and attended by a single patch
+        ipa_args = {
+            "image": torch.cat(tiles),
+            "image_negative": image_negative,
+            "weight": weight,
+            "weight_type": weight_type,
+            "combine_embeds": combine_embeds,
+            "start_at": start_at,
+            "end_at": end_at,
+            "attn_mask": torch.stack(masks, dim=1),
+            "unfold_batch": self.unfold_batch,
+            "embeds_scaling": embeds_scaling,
+            "encode_batch_size": encode_batch_size,
+            "num_tiles": len(tiles),
+        }
+        model, _ = ipadapter_execute(model.clone(), ipadapter_model, clip_vision, **ipa_args)
 
         return (model, torch.cat(tiles), torch.cat(masks), )
 
@@ -1370,18 +1399,13 @@ class PrepImageForClipVision:
 
             output = output[:, :, y:y2, x:x2]
 
-        imgs = []
-        for img in output:
-            img = T.ToPILImage()(img) # using PIL for better results
-            img = img.resize(size, resample=Image.Resampling[interpolation])
-            imgs.append(T.ToTensor()(img))
-        output = torch.stack(imgs, dim=0)
-        del imgs, img
+        # same filters as PIL, but the whole batch is resized at once on the GPU
+        output = resize_image(output.to(model_management.get_torch_device()), size, interpolation)
 
         if sharpening > 0:
             output = contrast_adaptive_sharpening(output, sharpening)
 
-        output = output.permute([0,2,3,1])
+        output = output.permute([0,2,3,1]).to(model_management.intermediate_device())
 
         return (output, )
 
@@ -1395,6 +1419,11 @@ class IPAdapterSaveEmbeds:
             "embeds": ("EMBEDS",),
             "filename_prefix": ("STRING", {"default": "IP_embeds"})
             },
+            "optional": {
+                "storage": (list(EMBEDS_STORAGE_DTYPES.keys()), { "default": "float32" }),
+                "source_model": ("STRING", {"default": ""}),
+                "image": ("IMAGE",),
+            }
         }
 
     RETURN_TYPES = ()
@@ -1402,20 +1431,23 @@ class IPAdapterSaveEmbeds:
     OUTPUT_NODE = True
     CATEGORY = "ipadapter/embeds"
 
-    def save(self, embeds, filename_prefix):
+    def save(self, embeds, filename_prefix, storage="float32", source_model="", image=None):
         full_output_folder, filename, counter, subfolder, filename_prefix = folder_paths.get_save_image_path(filename_prefix, self.output_dir)
         file = f"{filename}_{counter:05}.ipadpt"
         file = os.path.join(full_output_folder, file)
 
-        torch.save(embeds, file)
+        metadata = { "source_model": source_model }
+        if image is not None:
+            metadata["image_hash"] = image_hash(image)
+
+        save_embeds(file, embeds, metadata, storage)
         return (None, )
 
 class IPAdapterLoadEmbeds:
     @classmethod
     def INPUT_TYPES(s):
-        input_dir = folder_paths.get_input_directory()
-        files = [os.path.relpath(os.path.join(root, file), input_dir) for root, dirs, files in os.walk(input_dir) for file in files if file.endswith('.ipadpt')]
-        return {"required": {"embeds": [sorted(files), ]}, }
+        files = EMBEDS_FILES_INDEX.list(folder_paths.get_input_directory())
+        return {"required": {"embeds": [files, ]}, }
 
     RETURN_TYPES = ("EMBEDS", )
     FUNCTION = "load"
@@ -1423,7 +1455,75 @@ class IPAdapterLoadEmbeds:
 
     def load(self, embeds):
         path = folder_paths.get_annotated_filepath(embeds)
-        return (torch.load(path).cpu(), )
+        return (load_embeds(path), )
+
+def get_sku_embeds_file(sku):
+    sku = sku.strip().replace("\\", "/")
+    if not sku or os.path.isabs(sku) or ".." in sku.split("/"):
+        raise Exception(f"Invalid SKU '{sku}'.")
+    return sku
+
+class IPAdapterSaveSKUEmbeds:
+    @classmethod
+    def INPUT_TYPES(s):
+        return {"required": {
+            "pos_embed": ("EMBEDS",),
+            "neg_embed": ("EMBEDS",),
+            "sku": ("STRING", {"default": ""}),
+            },
+            "optional": {
+                "storage": (list(EMBEDS_STORAGE_DTYPES.keys()), { "default": "float16" }),
+                "source_model": ("STRING", {"default": ""}),
+                "image": ("IMAGE",),
+            }
+        }
+
+    RETURN_TYPES = ()
+    FUNCTION = "save"
+    OUTPUT_NODE = True
+    CATEGORY = "ipadapter/embeds"
+
+    def save(self, pos_embed, neg_embed, sku, storage="float16", source_model="", image=None):
+        sku = get_sku_embeds_file(sku)
+        file = os.path.join(folder_paths.get_folder_paths("ipadapter_embeds")[0], f"{sku}.ipadpt")
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+
+        metadata = { "sku": sku, "source_model": source_model }
+        if image is not None:
+            metadata["image_hash"] = image_hash(image)
+
+        save_embeds(file, pos_embed, metadata, storage, negative=neg_embed)
+        return (None, )
+
+class IPAdapterLoadSKUEmbeds:
+    @classmethod
+    def INPUT_TYPES(s):
+        return {"required": { "sku": ("STRING", {"default": ""}), }, }
+
+    RETURN_TYPES = ("EMBEDS", "EMBEDS",)
+    RETURN_NAMES = ("pos_embed", "neg_embed",)
+    FUNCTION = "load"
+    CATEGORY = "ipadapter/embeds"
+
+    @classmethod
+    def IS_CHANGED(s, sku):
+        # the library can be updated while the server is running
+        file = EMBEDS_FILES_INDEX.find(folder_paths.get_folder_paths("ipadapter_embeds"), get_sku_embeds_file(sku))
+        return os.path.getmtime(file) if file is not None else ""
+
+    def load(self, sku):
+        file = EMBEDS_FILES_INDEX.find(folder_paths.get_folder_paths("ipadapter_embeds"), get_sku_embeds_file(sku))
+        if file is None:
+            raise Exception(f"No embeds found for SKU '{sku}'.")
+
+        embeds = load_safetensors_mmap(file)
+        return (embeds["embeds"], embeds.get("negative"), )
+
+def select_frames(image, index):
+    # consecutive indices are returned as a view, everything else is gathered in a single copy
+    if index.shape[0] > 0 and torch.equal(index, torch.arange(index[0], index[0] + index.shape[0])):
+        return image[index[0]:index[0] + index.shape[0]]
+    return image.index_select(0, index.to(image.device))
 
 class IPAdapterWeights:
     @classmethod
@@ -1448,8 +1548,6 @@ class IPAdapterWeights:
     CATEGORY = "ipadapter/weights"
 
     def weights(self, weights='', timing='custom', frames=0, start_frame=0, end_frame=9999, add_starting_frames=0, add_ending_frames=0, method='full batch', weights_strategy=None, image=None):
-        import random
-
         frame_count = image.shape[0] if image is not None else 0
         if weights_strategy is not None:
             weights = weights_strategy["weights"]
@@ -1486,80 +1584,78 @@ class IPAdapterWeights:
             if len(weights) > 0:
                 start = weights[0]
                 end = weights[-1]
-            
-            weights = []
 
             end_frame = min(end_frame, frames)
-            duration = end_frame - start_frame
-            if start_frame > 0:
-                weights.extend([start] * start_frame)
-
-            for i in range(duration):
-                n = duration - 1
-                if timing == "linear":
-                    weights.append(start + (end - start) * i / n)
-                elif timing == "ease_in_out":
-                    weights.append(start + (end - start) * (1 - math.cos(i / n * math.pi)) / 2)
-                elif timing == "ease_in":
-                    weights.append(start + (end - start) * math.sin(i / n * math.pi / 2))
-                elif timing == "ease_out":
-                    weights.append(start + (end - start) * (1 - math.cos(i / n * math.pi / 2)))
-                elif timing == "random":
-                    weights.append(random.uniform(start, end))
-
-            weights[-1] = end if timing != "random" else weights[-1]
-            if end_frame < frames:
-                weights.extend([end] * (frames - end_frame))
-
-        if len(weights) == 0:
-            weights = [0.0]
-
-        frames = len(weights)
-        
-        # repeat the images for cross fade
+            duration = max(end_frame - start_frame, 0)
+
+            # the whole curve is computed at once, t goes from 0 to 1 over the duration
+            t = torch.arange(duration, dtype=torch.float64) / max(duration - 1, 1)
+            if timing == "linear":
+                curve = t
+            elif timing == "ease_in_out":
+                curve = (1 - torch.cos(t * math.pi)) / 2
+            elif timing == "ease_in":
+                curve = torch.sin(t * math.pi / 2)
+            elif timing == "ease_out":
+                curve = 1 - torch.cos(t * math.pi / 2)
+            else:
+                curve = torch.rand(duration, dtype=torch.float64)
+
+            weights = torch.cat([
+                torch.full((start_frame,), start, dtype=torch.float64),
+                start + (end - start) * curve,
+                torch.full((max(frames - end_frame, 0),), end, dtype=torch.float64),
+            ])
+            if start_frame + duration > 0 and timing != "random":
+                weights[start_frame + duration - 1] = end
+        else:
+            weights = torch.tensor(weights, dtype=torch.float64)
+
+        if weights.shape[0] == 0:
+            weights = torch.zeros(1, dtype=torch.float64)
+
+        frames = weights.shape[0]
+
+        # the images are paired by index and gathered only once at the end
         image_1 = None
         image_2 = None
         if image is not None:
             if "shift" in method:
-                image_1 = image[:-1]
-                image_2 = image[1:]
-                
-                weights = weights * image_1.shape[0]
-                image_1 = image_1.repeat_interleave(frames, 0)
-                image_2 = image_2.repeat_interleave(frames, 0)
+                pairs = torch.arange(image.shape[0] - 1)
+                index_1 = pairs
+                index_2 = pairs + 1
+                weights = weights.repeat(pairs.shape[0])
             elif "alternate" in method:
-                image_1 = image[::2].repeat_interleave(2, 0)
-                image_1 = image_1[1:]
-                image_2 = image[1::2].repeat_interleave(2, 0)
-
-                mew_weights = weights + [1.0 - w for w in weights]
-                mew_weights = mew_weights * (image_1.shape[0] // 2)
-                if image.shape[0] % 2:
-                    image_1 = image_1[:-1]
-                else:
-                    image_2 = image_2[:-1]
-                    mew_weights = mew_weights + weights
-
-                weights = mew_weights
-                image_1 = image_1.repeat_interleave(frames, 0)
-                image_2 = image_2.repeat_interleave(frames, 0)
+                # pairs (0,1) (2,1) (2,3) (4,3)... the weights are inverted every other pair
+                pairs = torch.arange(image.shape[0] - 1)
+                index_1 = (pairs + 1) // 2 * 2
+                index_2 = pairs // 2 * 2 + 1
+                weights = torch.where((pairs % 2 == 0).unsqueeze(1), weights, 1.0 - weights).flatten()
             else:
-                weights = weights * image.shape[0]
-                image_1 = image.repeat_interleave(frames, 0)
+                index_1 = torch.arange(image.shape[0])
+                index_2 = None
+                weights = weights.repeat(image.shape[0])
+
+            index_1 = index_1.repeat_interleave(frames)
+            index_2 = index_2.repeat_interleave(frames) if index_2 is not None else None
 
             # add starting and ending frames
             if add_starting_frames > 0:
-                weights = [weights[0]] * add_starting_frames + weights
-                image_1 = torch.cat([image[:1].repeat(add_starting_frames, 1, 1, 1), image_1], dim=0)
-                if image_2 is not None:
-                    image_2 = torch.cat([image[:1].repeat(add_starting_frames, 1, 1, 1), image_2], dim=0)
+                weights = torch.cat([weights[:1].repeat(add_starting_frames), weights])
+                index_1 = torch.cat([torch.zeros(add_starting_frames, dtype=torch.long), index_1])
+                if index_2 is not None:
+                    index_2 = torch.cat([torch.zeros(add_starting_frames, dtype=torch.long), index_2])
             if add_ending_frames > 0:
-                weights = weights + [weights[-1]] * add_ending_frames
-                image_1 = torch.cat([image_1, image[-1:].repeat(add_ending_frames, 1, 1, 1)], dim=0)
-                if image_2 is not None:
-                    image_2 = torch.cat([image_2, image[-1:].repeat(add_ending_frames, 1, 1, 1)], dim=0)
+                weights = torch.cat([weights, weights[-1:].repeat(add_ending_frames)])
+                index_1 = torch.cat([index_1, torch.full((add_ending_frames,), image.shape[0] - 1)])
+                if index_2 is not None:
+                    index_2 = torch.cat([index_2, torch.full((add_ending_frames,), image.shape[0] - 1)])
+
+            image_1 = select_frames(image, index_1)
+            image_2 = select_frames(image, index_2) if index_2 is not None else None
 
-        weights_invert = [1.0 - w for w in weights]
+        weights_invert = (1.0 - weights).tolist()
+        weights = weights.tolist()
 
         frame_count = len(weights)
 
@@ -1764,6 +1860,8 @@ NODE_CLASS_MAPPINGS = {
     "PrepImageForClipVision": PrepImageForClipVision,
     "IPAdapterSaveEmbeds": IPAdapterSaveEmbeds,
     "IPAdapterLoadEmbeds": IPAdapterLoadEmbeds,
+    "IPAdapterSaveSKUEmbeds": IPAdapterSaveSKUEmbeds,
+    "IPAdapterLoadSKUEmbeds": IPAdapterLoadSKUEmbeds,
     "IPAdapterWeights": IPAdapterWeights,
     "IPAdapterCombineWeights": IPAdapterCombineWeights,
     "IPAdapterWeightsFromStrategy": IPAdapterWeightsFromStrategy,
@@ -1802,6 +1900,8 @@ NODE_DISPLAY_NAME_MAPPINGS = {
     "PrepImageForClipVision": "Prep Image For ClipVision",
     "IPAdapterSaveEmbeds": "IPAdapter Save Embeds",
     "IPAdapterLoadEmbeds": "IPAdapter Load Embeds",
+    "IPAdapterSaveSKUEmbeds": "IPAdapter Save SKU Embeds",
+    "IPAdapterLoadSKUEmbeds": "IPAdapter Load SKU Embeds",
     "IPAdapterWeights": "IPAdapter Weights",
     "IPAdapterWeightsFromStrategy": "IPAdapter Weights From Strategy",
     "IPAdapterPromptScheduleFromWeightsStrategy": "Prompt Schedule From Weights Strategy",
@@ -1,6 +1,7 @@
 import math
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 from einops import rearrange
 from einops.layers.torch import Rearrange
 
@@ -27,6 +28,12 @@ def reshape_tensor(x, heads):
     return x
 
 
+def use_sdpa(x):
+    # only float32 is verified to match the manual attention. In half precision SDPA can fall back to its math
+    # kernel, which doesn't have the split scale that keeps f16 from overflowing
+    return hasattr(F, "scaled_dot_product_attention") and x.dtype == torch.float32
+
+
 class PerceiverAttention(nn.Module):
     def __init__(self, *, dim, dim_head=64, heads=8):
         super().__init__()
@@ -64,10 +71,13 @@ class PerceiverAttention(nn.Module):
         v = reshape_tensor(v, self.heads)
 
         # attention
-        scale = 1 / math.sqrt(math.sqrt(self.dim_head))
-        weight = (q * scale) @ (k * scale).transpose(-2, -1)  # More stable with f16 than dividing afterwards
-        weight = torch.softmax(weight.float(), dim=-1).type(weight.dtype)
-        out = weight @ v
+        if use_sdpa(q):
+            out = F.scaled_dot_product_attention(q, k, v)
+        else:
+            scale = 1 / math.sqrt(math.sqrt(self.dim_head))
+            weight = (q * scale) @ (k * scale).transpose(-2, -1)  # More stable with f16 than dividing afterwards
+            weight = torch.softmax(weight.float(), dim=-1).type(weight.dtype)
+            out = weight @ v
 
         out = out.permute(0, 2, 1, 3).reshape(b, l, -1)
 
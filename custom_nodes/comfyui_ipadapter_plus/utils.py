@@ -1,7 +1,15 @@
 import re
+import math
+import json
+import mmap
+import struct
+import hashlib
+import functools
 import torch
 import os
 import folder_paths
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from comfy.clip_vision import clip_preprocess, Output
 import comfy.utils
 import comfy.model_management as model_management
@@ -10,23 +18,86 @@ try:
 except ImportError:
     import torchvision.transforms as T
 
+class ModelFilesIndex:
+    """
+    Index of the models used by the presets. The folders are listed and every pattern and preset is resolved
+    only once, everything is rebuilt when any of the indexed directories changes (mtime).
+    """
+    folder_names = ("clip_vision", "ipadapter", "loras")
+
+    def __init__(self):
+        self.mtimes = None
+        self.files = {}
+        self.matches = {}
+        self.presets = {}
+
+    @staticmethod
+    def get_mtime(path):
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return None
+
+    def refresh(self):
+        if self.mtimes is not None and all(self.get_mtime(path) == mtime for path, mtime in self.mtimes.items()):
+            return
+
+        self.files = { name: folder_paths.get_filename_list(name) for name in self.folder_names }
+        dirs = set()
+        for name in self.folder_names:
+            for root in folder_paths.get_folder_paths(name):
+                dirs.add(root)
+                dirs.update(os.path.join(root, os.path.dirname(file)) for file in self.files[name])
+        self.mtimes = { path: self.get_mtime(path) for path in dirs }
+        self.matches = {}
+        self.presets = {}
+
+    def find(self, folder_name, pattern):
+        key = (folder_name, pattern)
+        if key not in self.matches:
+            files = [e for e in self.files[folder_name] if re.search(pattern, e, re.IGNORECASE)]
+            if len(files) > 1:
+                print(f"\033[33mINFO: multiple {folder_name} models match the preset: {', '.join(files)}. Using {files[0]}.\033[0m")
+            self.matches[key] = folder_paths.get_full_path(folder_name, files[0]) if files else None
+
+        return self.matches[key]
+
+    def resolve(self, preset, is_sdxl):
+        self.refresh()
+        key = (preset.lower(), is_sdxl)
+        if key not in self.presets:
+            ipadapter_file, is_insightface, lora_pattern = get_ipadapter_file(preset, is_sdxl)
+            self.presets[key] = {
+                "clipvision": get_clipvision_file(preset),
+                "ipadapter": ipadapter_file,
+                "is_insightface": is_insightface,
+                "lora": get_lora_file(lora_pattern) if lora_pattern is not None else None,
+                "lora_pattern": lora_pattern,
+            }
+            missing = [k for k in ("clipvision", "ipadapter") if self.presets[key][k] is None]
+            if lora_pattern is not None and self.presets[key]["lora"] is None:
+                missing.append("lora")
+            if missing:
+                print(f"\033[33mINFO: preset '{preset}' is missing the following models: {', '.join(missing)}.\033[0m")
+
+        return self.presets[key]
+
+MODEL_FILES_INDEX = ModelFilesIndex()
+
 def get_clipvision_file(preset):
     preset = preset.lower()
-    clipvision_list = folder_paths.get_filename_list("clip_vision")
+    MODEL_FILES_INDEX.refresh()
 
     if preset.startswith("vit-g"):
         pattern = r'(ViT.bigG.14.*39B.b160k|ipadapter.*sdxl|sdxl.*model\.(bin|safetensors))'
     else:
         pattern = r'(ViT.H.14.*s32B.b79K|ipadapter.*sd15|sd1.?5.*model\.(bin|safetensors))'
-    clipvision_file = [e for e in clipvision_list if re.search(pattern, e, re.IGNORECASE)]
-
-    clipvision_file = folder_paths.get_full_path("clip_vision", clipvision_file[0]) if clipvision_file else None
 
-    return clipvision_file
+    return MODEL_FILES_INDEX.find("clip_vision", pattern)
 
 def get_ipadapter_file(preset, is_sdxl):
     preset = preset.lower()
-    ipadapter_list = folder_paths.get_filename_list("ipadapter")
+    MODEL_FILES_INDEX.refresh()
     is_insightface = False
     lora_pattern = None
 
@@ -35,7 +106,7 @@ def get_ipadapter_file(preset, is_sdxl):
             raise Exception("light model is not supported for SDXL")
         pattern = r'sd15.light.v11\.(safetensors|bin)$'
         # if v11 is not found, try with the old version
-        if not [e for e in ipadapter_list if re.search(pattern, e, re.IGNORECASE)]:
+        if MODEL_FILES_INDEX.find("ipadapter", pattern) is None:
             pattern = r'sd15.light\.(safetensors|bin)$'
     elif preset.startswith("standard"):
         if is_sdxl:
@@ -67,7 +138,7 @@ def get_ipadapter_file(preset, is_sdxl):
         else:
             pattern = r'portrait.v11.sd15\.(safetensors|bin)$'
             # if v11 is not found, try with the old version
-            if not [e for e in ipadapter_list if re.search(pattern, e, re.IGNORECASE)]:
+            if MODEL_FILES_INDEX.find("ipadapter", pattern) is None:
                 pattern = r'portrait.sd15\.(safetensors|bin)$'
         is_insightface = True
     elif preset.startswith("faceid portrait unnorm"):
@@ -107,22 +178,139 @@ def get_ipadapter_file(preset, is_sdxl):
     else:
         raise Exception(f"invalid type '{preset}'")
 
-    ipadapter_file = [e for e in ipadapter_list if re.search(pattern, e, re.IGNORECASE)]
-    ipadapter_file = folder_paths.get_full_path("ipadapter", ipadapter_file[0]) if ipadapter_file else None
+    ipadapter_file = MODEL_FILES_INDEX.find("ipadapter", pattern)
 
     return ipadapter_file, is_insightface, lora_pattern
 
 def get_lora_file(pattern):
-    lora_list = folder_paths.get_filename_list("loras")
-    lora_file = [e for e in lora_list if re.search(pattern, e, re.IGNORECASE)]
-    lora_file = folder_paths.get_full_path("loras", lora_file[0]) if lora_file else None
-
-    return lora_file
+    MODEL_FILES_INDEX.refresh()
+    return MODEL_FILES_INDEX.find("loras", pattern)
+
+SAFETENSORS_DTYPES = {
+    "F64": torch.float64, "F32": torch.float32, "F16": torch.float16, "BF16": torch.bfloat16,
+    "I64": torch.int64, "I32": torch.int32, "I16": torch.int16, "I8": torch.int8, "U8": torch.uint8, "BOOL": torch.bool,
+}
+
+def load_safetensors_mmap(file, return_metadata=False):
+    # the tensors are views onto the memory mapped file, only the pages that are actually used get loaded
+    # and the OS shares them between processes. The mapping is copy-on-write so the file is never modified
+    with open(file, "rb") as f:
+        header_size = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_size))
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    data_start = 8 + header_size
+    state_dict = {}
+    for key, info in header.items():
+        if key == "__metadata__":
+            continue
+        dtype = SAFETENSORS_DTYPES[info["dtype"]]
+        start, end = info["data_offsets"]
+        if end == start:
+            state_dict[key] = torch.empty(info["shape"], dtype=dtype)
+            continue
+        count = (end - start) // torch.tensor([], dtype=dtype).element_size()
+        state_dict[key] = torch.frombuffer(buffer, dtype=dtype, count=count, offset=data_start + start).view(info["shape"])
+
+    if return_metadata:
+        return state_dict, header.get("__metadata__", {})
+    return state_dict
+
+EMBEDS_STORAGE_DTYPES = { "float32": torch.float32, "float16": torch.float16, "bfloat16": torch.bfloat16 }
+
+def save_embeds(file, embeds, metadata=None, storage="float32", negative=None):
+    from safetensors.torch import save_file
+
+    metadata = { k: str(v) for k, v in (metadata or {}).items() }
+    metadata["format"] = "ipadapter_embeds"
+    metadata["dtype"] = str(embeds.dtype).replace("torch.", "")
+    metadata["variant"] = "penultimate_hidden_states" if embeds.dim() == 3 else "image_embeds"
+    tensors = { "embeds": embeds.to("cpu", dtype=EMBEDS_STORAGE_DTYPES[storage]).contiguous() }
+    if negative is not None:
+        tensors["negative"] = negative.to("cpu", dtype=EMBEDS_STORAGE_DTYPES[storage]).contiguous()
+    save_file(tensors, file, metadata=metadata)
+
+def load_embeds(file, return_metadata=False):
+    with open(file, "rb") as f:
+        magic = f.read(2)
+
+    # files saved before the safetensors format are zip or plain pickles
+    if magic == b"PK" or magic[:1] == b"\x80":
+        embeds, metadata = torch.load(file).cpu(), {}
+    else:
+        state_dict, metadata = load_safetensors_mmap(file, return_metadata=True)
+        embeds = state_dict["embeds"]
+
+    if return_metadata:
+        return embeds, metadata
+    return embeds
+
+class EmbedsFilesIndex:
+    """
+    Cached listing of the embeds files under a directory. The tree is walked again only when the mtime
+    of one of its directories changes, which happens whenever a file or subdirectory is added or removed.
+    """
+    extensions = (".ipadpt",)
+
+    def __init__(self):
+        self.roots = {}
+
+    def refresh(self, root):
+        if root in self.roots:
+            mtimes, files, names = self.roots[root]
+            if all(ModelFilesIndex.get_mtime(path) == mtime for path, mtime in mtimes.items()):
+                return self.roots[root]
+
+        mtimes = {}
+        files = []
+        for path, dirs, filenames in os.walk(root, followlinks=True):
+            mtimes[path] = ModelFilesIndex.get_mtime(path)
+            files.extend(os.path.relpath(os.path.join(path, name), root) for name in filenames if name.endswith(self.extensions))
+        files = sorted(files)
+        # the name of an entry is its relative path without extension, always with forward slashes
+        names = { os.path.splitext(file)[0].replace(os.sep, "/"): os.path.join(root, file) for file in files }
+        self.roots[root] = (mtimes, files, names)
+
+        return self.roots[root]
+
+    def list(self, root):
+        return self.refresh(root)[1]
+
+    def find(self, roots, name):
+        for root in roots:
+            path = self.refresh(root)[2].get(name)
+            if path is not None:
+                return path
+        return None
+
+EMBEDS_FILES_INDEX = EmbedsFilesIndex()
+
+# process wide LRU cache of the loaded models, shared by all the loader nodes. { path: (mtime, model) }
+# It is cleared when ComfyUI unloads all its models, a size of 0 disables it
+IPADAPTER_MODELS_CACHE_SIZE = int(os.environ.get("IPADAPTER_MODELS_CACHE_SIZE", "4"))
+IPADAPTER_MODELS_CACHE = OrderedDict()
+
+def _clear_models_cache_on_unload():
+    original = getattr(model_management, "unload_all_models", None)
+    if original is None or getattr(original, "_ipadapter_models_cache", False):
+        return
+    @functools.wraps(original)
+    def unload_all_models(*args, **kwargs):
+        IPADAPTER_MODELS_CACHE.clear()
+        return original(*args, **kwargs)
+    unload_all_models._ipadapter_models_cache = True
+    model_management.unload_all_models = unload_all_models
+
+_clear_models_cache_on_unload()
 
 def ipadapter_model_loader(file):
-    model = comfy.utils.load_torch_file(file, safe_load=True)
+    mtime = os.path.getmtime(file)
+    if file in IPADAPTER_MODELS_CACHE and IPADAPTER_MODELS_CACHE[file][0] == mtime:
+        IPADAPTER_MODELS_CACHE.move_to_end(file)
+        return IPADAPTER_MODELS_CACHE[file][1]
 
     if file.lower().endswith(".safetensors"):
+        model = load_safetensors_mmap(file)
         st_model = {"image_proj": {}, "ip_adapter": {}}
         for key in model.keys():
             if key.startswith("image_proj."):
@@ -131,6 +319,8 @@ def ipadapter_model_loader(file):
                 st_model["ip_adapter"][key.replace("ip_adapter.", "")] = model[key]
         model = st_model
         del st_model
+    else:
+        model = comfy.utils.load_torch_file(file, safe_load=True)
 
     if not "ip_adapter" in model.keys() or not model["ip_adapter"]:
         raise Exception("invalid IPAdapter model {}".format(file))
@@ -141,6 +331,12 @@ def ipadapter_model_loader(file):
     if 'unnorm' in file.lower():
         model["portraitunnorm"] = True
 
+    if IPADAPTER_MODELS_CACHE_SIZE > 0:
+        IPADAPTER_MODELS_CACHE[file] = (mtime, model)
+        IPADAPTER_MODELS_CACHE.move_to_end(file)
+        while len(IPADAPTER_MODELS_CACHE) > IPADAPTER_MODELS_CACHE_SIZE:
+            IPADAPTER_MODELS_CACHE.popitem(last=False)
+
     return model
 
 def insightface_loader(provider):
@@ -154,39 +350,136 @@ def insightface_loader(provider):
     model.prepare(ctx_id=0, det_size=(640, 640))
     return model
 
+def image_hash(image):
+    if isinstance(image, torch.Tensor):
+        image = image.detach().cpu().contiguous().numpy()
+    return hashlib.sha1(image.tobytes()).hexdigest()
+
+# detection sizes tried in order until a face is found
+FACE_DETECTION_SIZES = [(size, size) for size in range(640, 256, -64)]
+FACE_ANALYSIS_CACHE_SIZE = 256
+FACE_ANALYSIS_CACHE = OrderedDict()
+
+def analyze_face(insightface, image):
+    """
+    Detects the faces in a BGR uint8 image and returns the best one along with the detection size that found it,
+    or (None, None). Only detection is retried at lower resolutions and only the chosen face goes through
+    recognition, the other analysis models (landmarks, genderage) are never run. Results are cached by image hash.
+    """
+    from insightface.app.common import Face
+
+    key = (id(insightface), image.shape, image_hash(image))
+    if key in FACE_ANALYSIS_CACHE:
+        FACE_ANALYSIS_CACHE.move_to_end(key)
+        return FACE_ANALYSIS_CACHE[key]
+
+    result = (None, None)
+    for size in FACE_DETECTION_SIZES:
+        # passing the size instead of setting det_model.input_size keeps the model state untouched across threads
+        bboxes, kpss = insightface.det_model.detect(image, input_size=size, max_num=0, metric='default')
+        if bboxes.shape[0] > 0:
+            face = Face(bbox=bboxes[0, 0:4], kps=kpss[0] if kpss is not None else None, det_score=bboxes[0, 4])
+            insightface.models['recognition'].get(image, face)
+            result = (face, size)
+            break
+
+    FACE_ANALYSIS_CACHE[key] = result
+    if len(FACE_ANALYSIS_CACHE) > FACE_ANALYSIS_CACHE_SIZE:
+        FACE_ANALYSIS_CACHE.popitem(last=False)
+    return result
+
+def analyze_faces(insightface, images):
+    """ Runs analyze_face on a batch of images in parallel, onnxruntime releases the GIL during inference """
+    if len(images) == 1:
+        return [analyze_face(insightface, images[0])]
+
+    with ThreadPoolExecutor(max_workers=min(len(images), os.cpu_count() or 1)) as executor:
+        return list(executor.map(lambda image: analyze_face(insightface, image), images))
+
+# rough peak memory needed to encode a single image with the largest clip vision models
+ENCODE_MEMORY_PER_IMAGE = 64 * 1024 * 1024
+
+def auto_batch_size(device, total, memory_per_item=ENCODE_MEMORY_PER_IMAGE):
+    free_memory = model_management.get_free_memory(device)
+    return max(1, min(total, int(free_memory * 0.8 // memory_per_item)))
+
+# where CLIP vision runs: "gpu" always loads it on the GPU, "cpu" encodes on the CPU (unless the model is already
+# on the GPU) so the UNet is never evicted
+# and "auto" uses the GPU only if the model is already there or fits in the free VRAM
+CLIP_VISION_POLICY = os.environ.get("IPADAPTER_CLIPVISION_DEVICE", "gpu").lower()
+CLIP_VISION_CPU_DTYPE = torch.bfloat16 if os.environ.get("IPADAPTER_CLIPVISION_CPU_DTYPE", "float32").lower() in ("bf16", "bfloat16") else torch.float32
+
+def get_clip_vision_device(clip_vision):
+    load_device = clip_vision.load_device
+    if CLIP_VISION_POLICY == "gpu" or load_device.type == "cpu":
+        return load_device, torch.float32
+    # nothing gets evicted if the model is already on the GPU
+    if any(loaded.model is clip_vision.patcher for loaded in model_management.current_loaded_models):
+        return load_device, torch.float32
+    if CLIP_VISION_POLICY == "auto":
+        required = clip_vision.patcher.model_size() + ENCODE_MEMORY_PER_IMAGE + model_management.minimum_inference_memory()
+        if model_management.get_free_memory(load_device) > required:
+            return load_device, torch.float32
+
+    # the weights are cast to the input layer by layer (manual_cast), no copy of the model is made
+    return torch.device("cpu"), CLIP_VISION_CPU_DTYPE
+
 def encode_image_masked(clip_vision, image, mask=None, batch_size=0):
-    model_management.load_model_gpu(clip_vision.patcher)
+    device, dtype = get_clip_vision_device(clip_vision)
+    if device == clip_vision.load_device:
+        model_management.load_model_gpu(clip_vision.patcher)
     outputs = Output()
+    intermediate_device = model_management.intermediate_device()
+    total = image.shape[0]
 
     if batch_size == 0:
-        batch_size = image.shape[0]
-    elif batch_size > image.shape[0]:
-        batch_size = image.shape[0]
-
-    image_batch = torch.split(image, batch_size, dim=0)
+        batch_size = auto_batch_size(device, total)
+    elif batch_size > total:
+        batch_size = total
+
+    # on CUDA the next chunk is uploaded from pinned memory on a side stream while the current one is encoded
+    copy_stream = torch.cuda.Stream(device) if device.type == "cuda" and image.device.type == "cpu" else None
+
+    def load_chunk(start):
+        chunk = image[start:start+batch_size]
+        if copy_stream is None:
+            return chunk.to(device)
+        with torch.cuda.stream(copy_stream):
+            return chunk.pin_memory().to(device, non_blocking=True)
+
+    # TODO: support for multiple masks
+    if mask is not None:
+        mask = mask.to(device)
+
+    next_img = load_chunk(0)
+    for start in range(0, total, batch_size):
+        img = next_img
+        if copy_stream is not None:
+            torch.cuda.current_stream(device).wait_stream(copy_stream)
+            img.record_stream(torch.cuda.current_stream(device))
+        if start + batch_size < total:
+            next_img = load_chunk(start + batch_size)
+
+        pixel_values = clip_preprocess(img).float()
 
-    for img in image_batch:
-        img = img.to(clip_vision.load_device)
-
-        pixel_values = clip_preprocess(img.to(clip_vision.load_device)).float()
-
-        # TODO: support for multiple masks
         if mask is not None:
-            pixel_values = pixel_values * mask.to(clip_vision.load_device)
+            pixel_values = pixel_values * mask
 
-        out = clip_vision.model(pixel_values=pixel_values, intermediate_output=-2)
+        with torch.autocast(device.type, dtype=dtype, enabled=dtype != torch.float32):
+            out = clip_vision.model(pixel_values=pixel_values, intermediate_output=-2)
+        out = { "last_hidden_state": out[0], "image_embeds": out[2], "penultimate_hidden_states": out[1] }
 
+        # the outputs are allocated once, the chunks are copied in place
         if not hasattr(outputs, "last_hidden_state"):
-            outputs["last_hidden_state"] = out[0].to(model_management.intermediate_device())
-            outputs["image_embeds"] = out[2].to(model_management.intermediate_device())
-            outputs["penultimate_hidden_states"] = out[1].to(model_management.intermediate_device())
-        else:
-            outputs["last_hidden_state"] = torch.cat((outputs["last_hidden_state"], out[0].to(model_management.intermediate_device())), dim=0)
-            outputs["image_embeds"] = torch.cat((outputs["image_embeds"], out[2].to(model_management.intermediate_device())), dim=0)
-            outputs["penultimate_hidden_states"] = torch.cat((outputs["penultimate_hidden_states"], out[1].to(model_management.intermediate_device())), dim=0)
+            for key, value in out.items():
+                outputs[key] = torch.empty((total, *value.shape[1:]), dtype=value.dtype, device=intermediate_device, pin_memory=copy_stream is not None and intermediate_device.type == "cpu")
+        for key, value in out.items():
+            outputs[key][start:start+img.shape[0]].copy_(value, non_blocking=copy_stream is not None)
+
+    if copy_stream is not None:
+        torch.cuda.current_stream(device).synchronize()
 
-    del img, pixel_values, out
-    torch.cuda.empty_cache()
+    del img, next_img, pixel_values, out
 
     return outputs
 
@@ -203,6 +496,19 @@ def tensor_to_size(source, dest_size):
 
     return source
 
+def merge_embeds(embeds, method):
+    if method == "add":
+        embeds = torch.sum(embeds, dim=0).unsqueeze(0)
+    elif method == "subtract":
+        embeds = embeds[0] - torch.mean(embeds[1:], dim=0)
+        embeds = embeds.unsqueeze(0)
+    elif method == "average":
+        embeds = torch.mean(embeds, dim=0).unsqueeze(0)
+    elif method == "norm average":
+        embeds = torch.mean(embeds / torch.norm(embeds, dim=0, keepdim=True), dim=0).unsqueeze(0)
+
+    return embeds
+
 def min_(tensor_list):
     # return the element-wise min of the tensor list.
     x = torch.stack(tensor_list)
@@ -215,9 +521,85 @@ def max_(tensor_list):
     mx = x.max(axis=0)[0]
     return torch.clamp(mx, max=1)
 
+# Same filters used by PIL
+def box_filter(x):
+    return ((x > -0.5) & (x <= 0.5)).to(x.dtype)
+
+def bilinear_filter(x):
+    return torch.clamp(1.0 - x.abs(), min=0.0)
+
+def hamming_filter(x):
+    return torch.where(x.abs() < 1.0, torch.sinc(x) * (0.54 + 0.46 * torch.cos(math.pi * x)), torch.zeros_like(x))
+
+def bicubic_filter(x, a=-0.5):
+    x = x.abs()
+    return torch.where(x < 1.0, ((a + 2.0) * x - (a + 3.0)) * x * x + 1.0, torch.where(x < 2.0, (((x - 5.0) * x + 8.0) * x - 4.0) * a, torch.zeros_like(x)))
+
+def lanczos_filter(x):
+    return torch.where(x.abs() < 3.0, torch.sinc(x) * torch.sinc(x / 3.0), torch.zeros_like(x))
+
+# (support, filter)
+RESAMPLE_FILTERS = {
+    "BOX": (0.5, box_filter),
+    "BILINEAR": (1.0, bilinear_filter),
+    "HAMMING": (1.0, hamming_filter),
+    "BICUBIC": (2.0, bicubic_filter),
+    "LANCZOS": (3.0, lanczos_filter),
+}
+
+def resample_weights(in_size, out_size, interpolation, device):
+    # builds the [out_size, in_size] interpolation matrix the same way PIL computes its coefficients
+    support, fn = RESAMPLE_FILTERS[interpolation]
+    scale = in_size / out_size
+    filterscale = max(scale, 1.0)
+    support = support * filterscale
+
+    center = (torch.arange(out_size, device=device, dtype=torch.float64) + 0.5) * scale
+    xmin = torch.clamp((center - support + 0.5).trunc(), min=0)
+    xmax = torch.clamp((center + support + 0.5).trunc(), max=in_size)
+    x = torch.arange(in_size, device=device, dtype=torch.float64)
+
+    weights = fn((x[None, :] - center[:, None] + 0.5) / filterscale)
+    weights = weights * ((x[None, :] >= xmin[:, None]) & (x[None, :] < xmax[:, None]))
+    weights = weights / weights.sum(dim=1, keepdim=True)
+
+    return weights
+
+def nearest_indices(in_size, out_size):
+    # PIL accumulates the source coordinate pixel by pixel, doing the same gives identical rounding
+    scale = in_size / out_size
+    coords = torch.full((out_size,), scale, dtype=torch.float64)
+    coords[0] = scale * 0.5
+    return coords.cumsum(0).long().clamp(max=in_size - 1)
+
+def resize_image(image, size, interpolation="LANCZOS"):
+    """
+    Batched replacement for PIL's resize on [B, C, H, W] tensors, it runs on the image's device.
+    size is (width, height) like in PIL.
+    """
+    out_w, out_h = size
+    _, _, in_h, in_w = image.shape
+
+    if (in_h, in_w) == (out_h, out_w):
+        return image
+
+    if interpolation == "NEAREST":
+        return image[:, :, nearest_indices(in_h, out_h).to(image.device)][:, :, :, nearest_indices(in_w, out_w).to(image.device)]
+
+    dtype = image.dtype if image.dtype in [torch.float32, torch.float64] else torch.float32
+    output = image.to(dtype)
+    if in_w != out_w:
+        output = output @ resample_weights(in_w, out_w, interpolation, image.device).to(dtype).T
+        # PIL clips the overshoot of the horizontal pass before the vertical one
+        output = output.clamp(0, 1)
+    if in_h != out_h:
+        output = resample_weights(in_h, out_h, interpolation, image.device).to(dtype) @ output
+
+    return output.clamp(0, 1).to(image.dtype)
+
 # From https://github.com/Jamy-L/Pytorch-Contrast-Adaptive-Sharpening/
 def contrast_adaptive_sharpening(image, amount):
-    img = T.functional.pad(image, (1, 1, 1, 1)).cpu()
+    img = T.functional.pad(image, (1, 1, 1, 1))
 
     a = img[..., :-2, :-2]
     b = img[..., :-2, 1:-1]
@@ -0,0 +1,40 @@
+"""
+IPAdapter Modules - Import single modules of the bundled ComfyUI_IPAdapter_plus outside of ComfyUI
+
+Used by the tests and benchmarks. utils.py imports ComfyUI's comfy package and folder_paths, they are
+taken from the ComfyUI installation at COMFYUI_PATH.
+"""
+import importlib.util
+import os
+import sys
+
+COMFYUI_PATH = os.getenv("COMFYUI_PATH", "/app/ComfyUI")
+IPADAPTER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "custom_nodes", "comfyui_ipadapter_plus")
+
+
+def load_ipadapter_module(name: str, comfyui_path: str = COMFYUI_PATH):
+    """
+    Import custom_nodes/comfyui_ipadapter_plus/<name>.py on its own, without the node package
+
+    Args:
+        name: Module name, e.g. "utils" or "image_proj_models"
+        comfyui_path: ComfyUI installation providing comfy and folder_paths
+
+    Returns:
+        The module, registered as ipadapter_<name>
+    """
+    module_name = f"ipadapter_{name}"
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+
+    if comfyui_path not in sys.path:
+        sys.path.append(comfyui_path)
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(IPADAPTER_DIR, f"{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[module_name]
+        raise
+    return module
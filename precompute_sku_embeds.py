@@ -0,0 +1,89 @@
+"""
+Precompute SKU Embeddings - Encode every product image once into the IP-Adapter embeddings library
+
+Each image in the source directory is saved by ComfyUI as models/ipadapter_embeds/<sku>.ipadpt,
+where the SKU id is the image path relative to the directory without extension. Generation
+workflows can then reference the product with WorkflowLoader.use_sku() instead of uploading it.
+"""
+import argparse
+import os
+import shutil
+from typing import Dict
+
+from workflow_loader import WorkflowLoader
+from comfyui_client import ComfyUIClient
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+
+def find_sku_images(images_dir: str) -> Dict[str, str]:
+    """
+    Find the product images in a directory tree
+    
+    Args:
+        images_dir: Directory containing one image per SKU
+        
+    Returns:
+        Dictionary mapping SKU id to image path
+    """
+    images = {}
+    for root, dirs, files in os.walk(images_dir):
+        for file in sorted(files):
+            if file.lower().endswith(IMAGE_EXTENSIONS):
+                path = os.path.join(root, file)
+                sku = os.path.splitext(os.path.relpath(path, images_dir))[0].replace(os.sep, '/')
+                images[sku] = path
+    return images
+
+
+def precompute(images_dir: str, workflow_name: str = "basic.json", server_address: str = "127.0.0.1:8188",
+               input_dir: str = "input", storage: str = "float16", timeout: int = 300) -> Dict[str, bool]:
+    """
+    Queue one embedding job per SKU image and wait for all of them
+    
+    Args:
+        images_dir: Directory containing one image per SKU
+        workflow_name: Workflow whose image side (background removal, IP-Adapter, CLIP vision) is used
+        server_address: ComfyUI server address
+        input_dir: ComfyUI input directory the images are copied to
+        storage: Storage dtype of the embeddings (float32, float16 or bfloat16)
+        timeout: Maximum time to wait for each job in seconds
+        
+    Returns:
+        Dictionary mapping SKU id to success
+    """
+    loader = WorkflowLoader(workflows_dir="workflows")
+    client = ComfyUIClient(server_address)
+    workflow = loader.load_workflow(workflow_name)
+    os.makedirs(input_dir, exist_ok=True)
+    
+    # all the jobs are queued first, ComfyUI keeps the models loaded between them
+    prompt_ids = {}
+    for sku, path in find_sku_images(images_dir).items():
+        image_filename = f"sku_{sku.replace('/', '_')}{os.path.splitext(path)[1]}"
+        shutil.copyfile(path, os.path.join(input_dir, image_filename))
+        
+        job = loader.build_sku_embeds_workflow(workflow, sku, storage)
+        job = loader.update_image(job, image_filename)
+        prompt_ids[sku] = client.queue_prompt(loader.workflow_to_api_format(job))
+    
+    results = {}
+    for sku, prompt_id in prompt_ids.items():
+        success, history = client.wait_for_completion(prompt_id, timeout=timeout)
+        results[sku] = success
+        print(f"{'✅' if success else '❌'} {sku}")
+    
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute the IP-Adapter embeddings of every product image")
+    parser.add_argument("images_dir", help="Directory containing one image per SKU")
+    parser.add_argument("--workflow", default="basic.json", help="Workflow the products are generated with")
+    parser.add_argument("--server", default=os.getenv("COMFYUI_SERVER", "127.0.0.1:8188"), help="ComfyUI server address")
+    parser.add_argument("--input-dir", default=os.getenv("COMFYUI_INPUT_DIR", "input"), help="ComfyUI input directory")
+    parser.add_argument("--storage", default="float16", choices=["float32", "float16", "bfloat16"])
+    args = parser.parse_args()
+    
+    results = precompute(args.images_dir, args.workflow, args.server, args.input_dir, args.storage)
+    print(f"\n{sum(results.values())}/{len(results)} SKUs precomputed")
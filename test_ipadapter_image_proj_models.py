@@ -0,0 +1,70 @@
+"""
+Tests of the bundled IPAdapter image projection models
+
+    python -m pytest test_ipadapter_image_proj_models.py
+"""
+import pytest
+import torch
+
+from ipadapter_modules import load_ipadapter_module
+
+image_proj_models = load_ipadapter_module("image_proj_models")
+
+# init_proj_plus of the SD1.5 and SDXL plus models
+RESAMPLER_CONFIGS = {
+    "sd15": dict(dim=768, depth=4, dim_head=64, heads=12, num_queries=16, embedding_dim=1280, output_dim=768, ff_mult=4),
+    "sdxl": dict(dim=1280, depth=4, dim_head=64, heads=20, num_queries=16, embedding_dim=1280, output_dim=2048, ff_mult=4),
+}
+
+
+def resampler(config, device="cpu", dtype=torch.float32):
+    torch.manual_seed(0)
+    return image_proj_models.Resampler(**RESAMPLER_CONFIGS[config]).eval().to(device, dtype)
+
+
+def run(model, x, sdpa, monkeypatch):
+    # forces PerceiverAttention on SDPA or on the manual fp16-stable attention
+    monkeypatch.setattr(image_proj_models, "use_sdpa", lambda _: sdpa)
+    with torch.inference_mode():
+        return model(x)
+
+
+def test_use_sdpa_only_for_float32():
+    assert image_proj_models.use_sdpa(torch.zeros(1)) == hasattr(torch.nn.functional, "scaled_dot_product_attention")
+    assert not image_proj_models.use_sdpa(torch.zeros(1, dtype=torch.float16))
+    assert not image_proj_models.use_sdpa(torch.zeros(1, dtype=torch.bfloat16))
+
+
+@pytest.mark.parametrize("config", RESAMPLER_CONFIGS)
+def test_resampler_sdpa_matches_manual_attention(config, monkeypatch):
+    model = resampler(config)
+    x = torch.randn(3, 257, 1280)
+    manual = run(model, x, False, monkeypatch)
+    sdpa = run(model, x, True, monkeypatch)
+    assert (sdpa - manual).abs().max() < 1e-4
+
+
+def test_face_perceiver_resampler_sdpa_matches_manual_attention(monkeypatch):
+    torch.manual_seed(0)
+    model = image_proj_models.FacePerceiverResampler(dim=768, depth=4, dim_head=64, heads=12, embedding_dim=1280, output_dim=768).eval()
+    latents, x = torch.randn(2, 4, 768), torch.randn(2, 257, 1280)
+    monkeypatch.setattr(image_proj_models, "use_sdpa", lambda _: False)
+    with torch.inference_mode():
+        manual = model(latents, x)
+    monkeypatch.setattr(image_proj_models, "use_sdpa", lambda _: True)
+    with torch.inference_mode():
+        sdpa = model(latents, x)
+    assert (sdpa - manual).abs().max() < 1e-4
+
+
+@pytest.mark.skipif(not torch.cuda.is_available(), reason="needs CUDA")
+@pytest.mark.parametrize("dtype", [torch.float16, torch.bfloat16])
+def test_resampler_sdpa_half_on_cuda(dtype, monkeypatch):
+    # what use_sdpa would need before enabling SDPA in half precision: no worse than the manual attention
+    x = torch.randn(8, 257, 1280, device="cuda") * 4
+    reference = run(resampler("sdxl", "cuda"), x, False, monkeypatch).float()
+    model = resampler("sdxl", "cuda", dtype)
+    manual = run(model, x.to(dtype), False, monkeypatch).float()
+    sdpa = run(model, x.to(dtype), True, monkeypatch).float()
+    assert torch.isfinite(sdpa).all()
+    assert (sdpa - reference).abs().max() <= 2 * (manual - reference).abs().max() + 1e-3
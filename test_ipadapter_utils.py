@@ -0,0 +1,80 @@
+"""
+Tests of the bundled IPAdapter utils, they need ComfyUI at COMFYUI_PATH and are skipped otherwise
+
+    COMFYUI_PATH=/app/ComfyUI python -m pytest test_ipadapter_utils.py
+"""
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+
+from ipadapter_modules import load_ipadapter_module
+
+try:
+    utils = load_ipadapter_module("utils")
+except ImportError as e:
+    pytest.skip(f"ComfyUI is needed for the IPAdapter utils: {e}", allow_module_level=True)
+
+INTERPOLATIONS = ["LANCZOS", "BICUBIC", "HAMMING", "BILINEAR", "BOX", "NEAREST"]
+# (height, width) of the input and (width, height) of the output like PIL's resize
+RESIZES = [((512, 512), (224, 224)), ((333, 800), (224, 224)), ((100, 150), (224, 224)), ((768, 1024), (512, 384)), ((224, 224), (224, 225)), ((7, 9), (3, 3))]
+
+
+def pil_resize(image, size, interpolation):
+    # the PIL path PrepImageForClipVision used before resize_image, on the 8 bit image
+    return torch.stack([torch.from_numpy(np.asarray(Image.fromarray(img).resize(size, resample=Image.Resampling[interpolation]))) for img in image])
+
+
+@pytest.mark.parametrize("interpolation", INTERPOLATIONS)
+@pytest.mark.parametrize("in_size, size", RESIZES)
+def test_resize_image_matches_pil(interpolation, in_size, size):
+    # noise is the worst case: every lanczos and bicubic overshoot gets clipped
+    image = np.random.default_rng(0).integers(0, 256, (2, *in_size, 3), dtype=np.uint8)
+    expected = pil_resize(image, size, interpolation).double()
+    out = utils.resize_image(torch.from_numpy(image).permute(0, 3, 1, 2).float() / 255, size, interpolation)
+    error = (out.permute(0, 2, 3, 1).double() * 255 - expected).abs()
+    assert out.shape == (2, 3, size[1], size[0])
+    # PIL rounds to 8 bit after each pass, resize_image only once at the end
+    assert error.max() <= 1.5
+    assert error.mean() <= 0.6
+    if interpolation == "NEAREST":
+        # the same pixels, up to the float32 round trip
+        assert error.max() < 1e-4
+
+
+def test_box_filter_support_like_pil():
+    # PIL's box filter is x > -0.5 && x <= 0.5
+    x = torch.tensor([-0.5, -0.25, 0.0, 0.5, 0.75], dtype=torch.float64)
+    assert utils.box_filter(x).tolist() == [0.0, 1.0, 1.0, 1.0, 0.0]
+
+
+def save_ipadapter(path, value):
+    from safetensors.torch import save_file
+    save_file({"ip_adapter.1.to_k_ip.weight": torch.full((2, 2), value), "image_proj.proj.weight": torch.zeros(2, 2)}, path)
+    return str(path)
+
+
+def test_ipadapter_models_cache_is_lru(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "IPADAPTER_MODELS_CACHE_SIZE", 2)
+    monkeypatch.setattr(utils, "IPADAPTER_MODELS_CACHE", OrderedDict())
+    files = [save_ipadapter(tmp_path / f"ip-adapter_{i}.safetensors", float(i)) for i in range(3)]
+
+    model = utils.ipadapter_model_loader(files[0])
+    utils.ipadapter_model_loader(files[1])
+    assert utils.ipadapter_model_loader(files[0]) is model
+    utils.ipadapter_model_loader(files[2])
+    # files[1] was the least recently used
+    assert list(utils.IPADAPTER_MODELS_CACHE) == [files[0], files[2]]
+    assert utils.ipadapter_model_loader(files[2])["ip_adapter"]["1.to_k_ip.weight"][0, 0] == 2.0
+
+
+def test_ipadapter_models_cache_cleared_on_unload(tmp_path, monkeypatch):
+    if not hasattr(utils.model_management, "unload_all_models"):
+        pytest.skip("this ComfyUI has no unload_all_models")
+    monkeypatch.setattr(utils, "IPADAPTER_MODELS_CACHE", OrderedDict())
+    utils.ipadapter_model_loader(save_ipadapter(tmp_path / "ip-adapter.safetensors", 1.0))
+    assert len(utils.IPADAPTER_MODELS_CACHE) == 1
+    utils.model_management.unload_all_models()
+    assert len(utils.IPADAPTER_MODELS_CACHE) == 0
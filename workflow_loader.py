@@ -1,6 +1,7 @@
 """
 Workflow Loader - Load and modify ComfyUI workflow JSON files programmatically
 """
+import copy
 import json
 import os
 from typing import Dict, Any, Optional
@@ -101,7 +102,7 @@ class WorkflowLoader:
             node_type = node.get('type')
             
             # Update IP-Adapter weight
-            if node_type == 'IPAdapterAdvanced' and ipadapter_weight is not None:
+            if node_type in ('IPAdapterAdvanced', 'IPAdapterEmbeds') and ipadapter_weight is not None:
                 if 'widgets_values' in node and len(node['widgets_values']) > 0:
                     node['widgets_values'][0] = ipadapter_weight
             
@@ -126,6 +127,212 @@ class WorkflowLoader:
         
         return workflow
     
+    def use_sku(self, workflow: Dict[str, Any], sku: str) -> Dict[str, Any]:
+        """
+        Use the precomputed IP-Adapter embeddings of a product instead of its image
+        
+        Every IPAdapterAdvanced node is turned into an IPAdapterEmbeds node fed by an
+        IPAdapterLoadSKUEmbeds node. The nodes that only prepared the image for the
+        IP-Adapter (LoadImage, background removal, CLIP vision) are removed, the ones
+        still used by other nodes (e.g. the ControlNet preprocessor) are kept.
+        
+        Args:
+            workflow: Workflow dictionary
+            sku: SKU id of the embeddings in the ipadapter_embeds library
+            
+        Returns:
+            Modified workflow dictionary
+        """
+        loader_id = None
+        
+        for node in list(workflow.get('nodes', [])):
+            if node.get('type') != 'IPAdapterAdvanced':
+                continue
+            
+            if loader_id is None:
+                loader_id = self._add_node(workflow, 'IPAdapterLoadSKUEmbeds',
+                                           inputs=[self._widget_input('sku', 'STRING')],
+                                           outputs=[('pos_embed', 'EMBEDS'), ('neg_embed', 'EMBEDS')],
+                                           widgets_values=[sku])
+            
+            inputs = {inp['name']: inp for inp in node.get('inputs', [])}
+            for name in ('image', 'clip_vision', 'image_negative', 'attn_mask'):
+                if name in inputs and inputs[name].get('link') is not None:
+                    self._remove_link(workflow, inputs[name]['link'])
+            
+            # IPAdapterAdvanced: weight, weight_type, combine_embeds, start_at, end_at, embeds_scaling
+            widgets = node.get('widgets_values', [])
+            node['type'] = 'IPAdapterEmbeds'
+            node['inputs'] = [
+                {"name": "model", "type": "MODEL", "link": inputs['model'].get('link') if 'model' in inputs else None},
+                {"name": "ipadapter", "type": "IPADAPTER", "link": inputs['ipadapter'].get('link') if 'ipadapter' in inputs else None},
+                {"name": "pos_embed", "type": "EMBEDS", "link": None},
+                {"name": "neg_embed", "type": "EMBEDS", "link": None},
+                self._widget_input('weight', 'FLOAT'),
+                self._widget_input('weight_type', 'COMBO'),
+                self._widget_input('start_at', 'FLOAT'),
+                self._widget_input('end_at', 'FLOAT'),
+                self._widget_input('embeds_scaling', 'COMBO'),
+            ]
+            node['widgets_values'] = [widgets[i] for i in (0, 1, 3, 4, 5)] if len(widgets) >= 6 else [1.0, 'linear', 0, 1, 'V only']
+            
+            # the model and ipadapter links keep their slots, only their target slot index is refreshed
+            for slot, inp in enumerate(node['inputs']):
+                for link in workflow.get('links', []):
+                    if link[0] == inp.get('link'):
+                        link[4] = slot
+            
+            self._add_link(workflow, loader_id, 0, node['id'], 2, 'EMBEDS')
+            self._add_link(workflow, loader_id, 1, node['id'], 3, 'EMBEDS')
+        
+        self._remove_unused_nodes(workflow)
+        return workflow
+    
+    def build_sku_embeds_workflow(self, workflow: Dict[str, Any], sku: str, storage: str = "float16") -> Dict[str, Any]:
+        """
+        Build the workflow that precomputes the IP-Adapter embeddings of a product image
+        
+        The image side of the first IPAdapterAdvanced node (image loading and preparation,
+        IP-Adapter and CLIP vision loaders) is copied and connected to an IPAdapterEncoder
+        whose embeddings are saved under the SKU id by IPAdapterSaveSKUEmbeds. Use
+        update_image() on the result to set the product image.
+        
+        Args:
+            workflow: Workflow dictionary the product photos are generated with
+            sku: SKU id the embeddings are saved as
+            storage: Storage dtype of the embeddings (float32, float16 or bfloat16)
+            
+        Returns:
+            New workflow dictionary
+        """
+        ipadapter = next((n for n in workflow.get('nodes', []) if n.get('type') == 'IPAdapterAdvanced'), None)
+        if ipadapter is None:
+            raise ValueError("The workflow has no IPAdapterAdvanced node")
+        
+        nodes = {node['id']: node for node in workflow['nodes']}
+        links = {link[0]: link for link in workflow.get('links', [])}
+        sources = {}
+        for inp in ipadapter.get('inputs', []):
+            if inp['name'] in ('ipadapter', 'image', 'clip_vision') and inp.get('link') in links:
+                sources[inp['name']] = links[inp['link']]
+        if 'ipadapter' not in sources or 'image' not in sources:
+            raise ValueError("The IPAdapterAdvanced node has no image or ipadapter connected")
+        
+        # collect all the nodes upstream of the image side inputs
+        keep = set()
+        pending = [link[1] for link in sources.values()]
+        while pending:
+            node_id = pending.pop()
+            if node_id in keep:
+                continue
+            keep.add(node_id)
+            pending.extend(links[inp['link']][1] for inp in nodes[node_id].get('inputs', []) if inp.get('link') in links)
+        
+        result = {
+            'last_node_id': workflow.get('last_node_id', 0),
+            'last_link_id': workflow.get('last_link_id', 0),
+            'nodes': [copy.deepcopy(nodes[node_id]) for node_id in sorted(keep)],
+            'links': [copy.deepcopy(link) for link in links.values() if link[1] in keep and link[3] in keep],
+            'version': workflow.get('version'),
+        }
+        kept_links = {link[0] for link in result['links']}
+        for node in result['nodes']:
+            for out in node.get('outputs', []):
+                if out.get('links'):
+                    out['links'] = [link for link in out['links'] if link in kept_links]
+        
+        encoder_id = self._add_node(result, 'IPAdapterEncoder',
+                                    inputs=[
+                                        {"name": "ipadapter", "type": "IPADAPTER", "link": None},
+                                        {"name": "image", "type": "IMAGE", "link": None},
+                                        {"name": "clip_vision", "type": "CLIP_VISION", "link": None},
+                                        self._widget_input('weight', 'FLOAT'),
+                                    ],
+                                    outputs=[('pos_embed', 'EMBEDS'), ('neg_embed', 'EMBEDS')],
+                                    widgets_values=[1.0])
+        for slot, name in enumerate(('ipadapter', 'image', 'clip_vision')):
+            if name in sources:
+                self._add_link(result, sources[name][1], sources[name][2], encoder_id, slot, sources[name][5])
+        
+        source_node = nodes[sources['ipadapter'][1]]
+        source_model = source_node['widgets_values'][0] if source_node.get('type') == 'IPAdapterModelLoader' else ""
+        save_id = self._add_node(result, 'IPAdapterSaveSKUEmbeds',
+                                 inputs=[
+                                     {"name": "pos_embed", "type": "EMBEDS", "link": None},
+                                     {"name": "neg_embed", "type": "EMBEDS", "link": None},
+                                     self._widget_input('sku', 'STRING'),
+                                     self._widget_input('storage', 'COMBO'),
+                                     self._widget_input('source_model', 'STRING'),
+                                 ],
+                                 outputs=[],
+                                 widgets_values=[sku, storage, source_model])
+        self._add_link(result, encoder_id, 0, save_id, 0, 'EMBEDS')
+        self._add_link(result, encoder_id, 1, save_id, 1, 'EMBEDS')
+        
+        return result
+    
+    @staticmethod
+    def _widget_input(name: str, input_type: str) -> Dict[str, Any]:
+        """Input slot of a widget, kept unlinked so its value comes from widgets_values"""
+        return {"name": name, "type": input_type, "widget": {"name": name}, "link": None}
+    
+    @staticmethod
+    def _add_node(workflow: Dict[str, Any], node_type: str, inputs: list, outputs: list, widgets_values: list) -> int:
+        """Append a node to the workflow and return its id"""
+        node_id = max([workflow.get('last_node_id', 0)] + [node['id'] for node in workflow.get('nodes', [])]) + 1
+        workflow['last_node_id'] = node_id
+        workflow.setdefault('nodes', []).append({
+            "id": node_id,
+            "type": node_type,
+            "inputs": inputs,
+            "outputs": [{"name": name, "type": output_type, "links": []} for name, output_type in outputs],
+            "widgets_values": widgets_values,
+        })
+        return node_id
+    
+    @staticmethod
+    def _add_link(workflow: Dict[str, Any], src_node: int, src_slot: int, dst_node: int, dst_slot: int, link_type: str) -> int:
+        """Connect an output slot to an input slot and return the link id"""
+        link_id = max([workflow.get('last_link_id', 0)] + [link[0] for link in workflow.get('links', [])]) + 1
+        workflow['last_link_id'] = link_id
+        workflow.setdefault('links', []).append([link_id, src_node, src_slot, dst_node, dst_slot, link_type])
+        
+        for node in workflow['nodes']:
+            if node['id'] == src_node:
+                output = node['outputs'][src_slot]
+                output['links'] = (output.get('links') or []) + [link_id]
+            if node['id'] == dst_node:
+                node['inputs'][dst_slot]['link'] = link_id
+        
+        return link_id
+    
+    @staticmethod
+    def _remove_link(workflow: Dict[str, Any], link_id: int) -> None:
+        """Disconnect a link from both its source and target nodes"""
+        workflow['links'] = [link for link in workflow.get('links', []) if link[0] != link_id]
+        
+        for node in workflow.get('nodes', []):
+            for out in node.get('outputs', []):
+                if out.get('links') and link_id in out['links']:
+                    out['links'] = [link for link in out['links'] if link != link_id]
+            for inp in node.get('inputs', []):
+                if inp.get('link') == link_id:
+                    inp['link'] = None
+    
+    def _remove_unused_nodes(self, workflow: Dict[str, Any]) -> None:
+        """Remove the nodes whose outputs are no longer connected, output nodes have no outputs and are kept"""
+        while True:
+            unused = [node for node in workflow.get('nodes', [])
+                      if node.get('outputs') and not any(out.get('links') for out in node['outputs'])]
+            if not unused:
+                return
+            
+            for node in unused:
+                for inp in node.get('inputs', []):
+                    if inp.get('link') is not None:
+                        self._remove_link(workflow, inp['link'])
+                workflow['nodes'].remove(node)
+    
     def workflow_to_api_format(self, workflow: Dict[str, Any]) -> Dict[str, Any]:
         """
         Convert workflow JSON to ComfyUI API format